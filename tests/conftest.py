@@ -0,0 +1,33 @@
+"""测试公共设置：把程序目录加入导入路径，并提供模拟名单"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from 性能测试 import make_roster  # noqa: E402
+
+
+def pytest_addoption(parser):
+    parser.addoption('--perf', action='store_true', help='同时运行 10 万人名单的耗时测试')
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'perf: 依赖机器速度的耗时测试，默认跳过，加 --perf 运行')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--perf'):
+        return
+    skip = pytest.mark.skip(reason='耗时测试，加 --perf 运行')
+    for item in items:
+        if 'perf' in item.keywords:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope='session')
+def roster():
+    """10 万人的模拟名单（与性能测试相同的生成方式）"""
+    return make_roster(100_000)
@@ -0,0 +1,132 @@
+"""部门分布限制（select_with_quotas / DrawConstraints）的正确性和耗时"""
+
+import time
+
+import numpy as np
+import pytest
+
+from 抽签核心 import (
+    DrawConstraints, DrawError, DrawSession, draw_positions, round_rng, select_by_random_keys,
+    select_with_quotas,
+)
+
+# 10 万人抽签池单轮抽取的耗时上限（秒），留有余量，避免在较慢的机器上误报
+LATENCY_LIMIT = 0.5
+
+
+@pytest.fixture(scope='module')
+def session(roster):
+    return DrawSession(roster)
+
+
+@pytest.fixture(scope='module')
+def pool(session):
+    return session.eligible([(province, level) for province, level, *_ in session.provinces])
+
+
+def test_no_limits_same_as_plain_draw():
+    rng = np.random.default_rng(1)
+    keys = rng.random(1000)
+    eligible = rng.random(1000) < 0.7
+    expected = select_by_random_keys(keys, eligible, 30)
+    assert sorted(select_with_quotas(keys, eligible, 30)) == sorted(expected)
+
+
+def test_single_pass_in_key_order():
+    """结果就是“去掉超出上限的人后随机键最小的 k 人”，没有抽完再重抽"""
+    rng = np.random.default_rng(2)
+    keys = rng.random(500)
+    eligible = np.ones(500, dtype=bool)
+    groups = rng.integers(0, 20, 500)
+    chosen = select_with_quotas(keys, eligible, 15, (groups, 1, '同一部门'))
+
+    taken, expected = set(), []
+    for position in np.argsort(keys):
+        if groups[position] not in taken:
+            taken.add(groups[position])
+            expected.append(position)
+    assert list(chosen) == expected[:15]
+
+
+def test_max_per_caps_every_department(session, pool):
+    fourth = session.tree.groups('四级部门')
+    constraints = DrawConstraints(('四级部门', 2))
+    for serial in range(1, 21):
+        positions = draw_positions(round_rng(0, serial), pool, 30, constraints, session.tree)
+        assert len(positions) == 30
+        assert len(np.unique(positions)) == 30
+        assert pool[positions].all()
+        assert np.bincount(fourth[positions]).max() <= 2
+
+
+def test_min_per_covers_every_department(session, pool):
+    third = session.tree.groups('三级部门')
+    constraints = DrawConstraints(('四级部门', 2), ('三级部门', 1))
+    for serial in range(1, 21):
+        positions = draw_positions(round_rng(0, serial), pool, 30, constraints, session.tree)
+        assert len(positions) == 30
+        assert set(third[positions]) == set(third[pool])
+
+
+def test_max_per_shortfall_reported():
+    keys = np.arange(10, dtype=float)
+    eligible = np.ones(10, dtype=bool)
+    groups = np.array([0, 0, 0, 0, 1, 1, 1, 1, 2, 2])
+    with pytest.raises(DrawError, match='最多只能抽取 6 人'):
+        select_with_quotas(keys, eligible, 7, (groups, 2, '同一部门'))
+
+
+def test_min_per_shortfall_reported():
+    keys = np.arange(10, dtype=float)
+    eligible = np.ones(10, dtype=bool)
+    groups = np.array([0, 0, 0, 0, 1, 1, 1, 1, 2, 3])
+    with pytest.raises(DrawError, match='有 2 个部门可抽人数不足 2 人'):
+        select_with_quotas(keys, eligible, 8, None, (groups, 2, '每个部门'))
+
+
+def test_min_per_more_than_count_reported():
+    keys = np.arange(10, dtype=float)
+    eligible = np.ones(10, dtype=bool)
+    groups = np.arange(10) % 5
+    with pytest.raises(DrawError, match='共需抽取 5 人，超过本轮抽取人数 3 人'):
+        select_with_quotas(keys, eligible, 3, None, (groups, 1, '每个部门'))
+
+
+def test_failed_draw_not_recorded(roster):
+    session = DrawSession(roster)
+    provinces = [(province, level) for province, level, *_ in session.provinces]
+    with pytest.raises(DrawError):
+        session.draw(provinces, 1000, constraints=DrawConstraints(('三级部门', 1)))
+    assert session.draw_count == 0
+    assert session.drawn_total == 0
+
+
+def test_constraints_round_trip():
+    constraints = DrawConstraints(('四级部门', 2), ('三级部门', 1))
+    restored = DrawConstraints.from_dict(constraints.as_dict())
+    assert (restored.max_per, restored.min_per) == (('四级部门', 2), ('三级部门', 1))
+    assert DrawConstraints.from_dict({}) is None
+    assert DrawConstraints.from_dict(None) is None
+
+
+@pytest.mark.parametrize('data', [{'max_per': ['职级', 2]}, {'min_per': ['三级部门', 0]}, {'max_per': ['四级部门']}])
+def test_invalid_constraints_rejected(data):
+    with pytest.raises(DrawError):
+        DrawConstraints.from_dict(data)
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize('constraints', [
+    None,
+    DrawConstraints(('四级部门', 2)),
+    DrawConstraints(None, ('三级部门', 1)),
+    DrawConstraints(('四级部门', 2), ('三级部门', 1)),
+])
+def test_latency_on_100k_pool(session, pool, constraints):
+    samples = []
+    for serial in range(1, 11):
+        start = time.perf_counter()
+        draw_positions(round_rng(0, serial), pool, 30, constraints, session.tree)
+        samples.append(time.perf_counter() - start)
+    assert pool.sum() > 90_000
+    assert np.median(samples) < LATENCY_LIMIT
@@ -0,0 +1,32 @@
+"""名单读取：不同格式读取同一名单的结果一致"""
+
+import pandas as pd
+import pytest
+
+from 抽签核心 import DrawSession, convert_to_arrow, read_roster, roster_fingerprint
+
+pytest.importorskip('pyarrow')
+
+
+def test_arrow_round_trip_keeps_fingerprint(tmp_path):
+    """部门列在 Arrow 名单中为分类列，含空部门时指纹仍与源文件一致"""
+    df = pd.DataFrame({
+        '员工 ID': [1001, 1002, 1003, 1004],
+        '姓名': ['张三', '李四', '王五', '赵六'],
+        '三级部门': ['华东大区', '华东大区', '华南大区', None],
+        '四级部门': ['江苏省区', None, '广东省区', '西南独立省区'],
+    })
+    source = tmp_path / '名单.xlsx'
+    df.to_excel(source, index=False, engine='openpyxl')
+    output, rows, _ = convert_to_arrow(str(source))
+
+    original, _, _ = read_roster(str(source))
+    converted, backend, _ = read_roster(output)
+    assert backend == 'arrow' and rows == 4
+    assert isinstance(converted['四级部门'].dtype, pd.CategoricalDtype)
+    assert roster_fingerprint(converted) == roster_fingerprint(original)
+
+    session = DrawSession(converted, file_path=output)
+    session.draw([(province, level) for province, level, *_ in session.provinces], 2)
+    session.export(str(tmp_path / '结果.arrow'))
+    assert (tmp_path / '结果_抽签记录.json').exists()
@@ -0,0 +1,45 @@
+"""导出：手动导出保留源表格式，自动更新走 pandas 快速写出"""
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from 抽签核心 import HIGHLIGHT_COLOR, DrawSession, read_roster
+
+
+def _session(tmp_path):
+    df = pd.DataFrame({
+        '员工 ID': [1001, 1002, 1003, 1004],
+        '姓名': ['张三', '李四', '王五', '赵六'],
+        '入职日期': pd.to_datetime(['2020-01-01', '2021-02-03', '2022-03-04', '2023-04-05']),
+        '三级部门': ['华东大区', '华东大区', '华南大区', '华南大区'],
+        '四级部门': ['江苏省区', '江苏省区', '广东省区', '广东省区'],
+    })
+    source = tmp_path / '名单.xlsx'
+    df.to_excel(source, index=False, engine='openpyxl')
+    roster, backend, _ = read_roster(str(source))
+    session = DrawSession(roster, file_path=str(source), backend=backend, seed=1)
+    session.draw([(province, level) for province, level, *_ in session.provinces], 1)
+    return session
+
+
+def test_export_keeps_source_format(tmp_path):
+    session = _session(tmp_path)
+    output = tmp_path / '结果.xlsx'
+    assert session.export(str(output)) == 4
+
+    sheet = load_workbook(output).active
+    assert sheet['C2'].number_format == 'YYYY-MM-DD HH:MM:SS'
+    for row, drawn in enumerate(session.drawn_mask, start=2):
+        assert (sheet.cell(row, 6).value == '是') == bool(drawn)
+        colour = sheet.cell(row, 1).fill.fgColor.rgb if sheet.cell(row, 1).fill.fill_type else None
+        assert (colour is not None and colour.endswith(HIGHLIGHT_COLOR)) == bool(drawn)
+
+
+def test_auto_update_export_skips_formatting(tmp_path):
+    session = _session(tmp_path)
+    output = tmp_path / '自动更新.xlsx'
+    assert session.export(str(output), keep_format=False) == 4
+
+    sheet = load_workbook(output).active
+    assert [sheet.cell(row, 6).value == '是' for row in range(2, 6)] == list(session.drawn_mask)
+    assert all(sheet.cell(row, 1).fill.fill_type is None for row in range(2, 6))
@@ -0,0 +1,43 @@
+"""抽签小程序界面：快捷键"""
+
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('PyQt6')
+
+from PyQt6.QtCore import Qt  # noqa: E402
+from PyQt6.QtTest import QTest  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+
+import 抽签小程序  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def window(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(抽签小程序.RandomDrawApp, 'undo_draw', lambda self: calls.append('undo'))
+    monkeypatch.setattr(抽签小程序.RandomDrawApp, 'redo_draw', lambda self: calls.append('redo'))
+    window = 抽签小程序.RandomDrawApp()
+    window.show()
+    window.activateWindow()
+    QTest.qWaitForWindowExposed(window)
+    window.calls = calls
+    yield window
+    window.close()
+
+
+@pytest.mark.parametrize('key, modifiers, expected', [
+    (Qt.Key.Key_Z, Qt.KeyboardModifier.ControlModifier, 'undo'),
+    (Qt.Key.Key_Y, Qt.KeyboardModifier.ControlModifier, 'redo'),
+    (Qt.Key.Key_Z, Qt.KeyboardModifier.ControlModifier | Qt.KeyboardModifier.ShiftModifier, 'redo'),
+])
+def test_undo_redo_shortcuts(window, key, modifiers, expected):
+    QTest.keyClick(window, key, modifiers)
+    assert window.calls == [expected]
@@ -0,0 +1,50 @@
+"""抽签服务：加载名单、抽签和查询"""
+
+import asyncio
+
+import pytest
+
+from 性能测试 import write_roster
+from 抽签核心 import ExclusionIndex
+from 抽签服务 import DrawService, HttpError
+
+
+@pytest.fixture
+def directory(tmp_path):
+    write_roster(2000, tmp_path, '.csv', seed=1)
+    write_roster(3000, tmp_path, '.csv', seed=2)
+    return tmp_path
+
+
+@pytest.fixture
+def exclusion_index(directory):
+    index = ExclusionIndex(str(directory / '抽签历史.db'))
+    index.add(['100001', '100002', '100003'], '2099-01-01', 6)
+    yield index
+    index.close()
+
+
+def test_load_rosters_with_history(directory, exclusion_index):
+    """往期排除库在后台线程中读取，连续多次加载（落在不同线程上）都应成功"""
+    async def run():
+        service = DrawService(exclusion_index, root=str(directory))
+        results = []
+        for name in ['模拟名单_2000.csv', '模拟名单_3000.csv'] * 3:
+            results.append(await service.load({'path': name}))
+        draw = await service.dispatch('POST', '/draw', {'provinces': ['*'], 'count': 5})
+        return results, draw
+
+    results, draw = asyncio.run(run())
+    assert [result['total'] for result in results] == [2000, 3000] * 3
+    assert all(result['excluded'] == 3 for result in results)
+    assert [result['resumed'] for result in results] == [False, False, True, True, True, True]
+    assert len(draw['winners']) == 5
+
+
+@pytest.mark.parametrize('path', ['/etc/passwd', '../模拟名单_2000.csv', 'a/../../x.csv', ''])
+def test_paths_outside_root_rejected(directory, path):
+    async def run():
+        await DrawService(root=str(directory)).load({'path': path})
+
+    with pytest.raises(HttpError):
+        asyncio.run(run())
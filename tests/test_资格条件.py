@@ -0,0 +1,136 @@
+"""资格条件（EligibilityRule / BitmapIndex）的正确性和耗时"""
+
+import time
+
+import numpy as np
+import pytest
+
+from 抽签核心 import BitmapIndex, DrawError, DrawSession, EligibilityRule, popcount, replay_session
+
+# 10 万人名单单次条件运算的耗时上限（秒），留有余量，避免在较慢的机器上误报
+LATENCY_LIMIT = 0.05
+
+CASES = [
+    {'column': '职级', 'values': ['P5', 'P6']},
+    {'and': [{'column': '职级', 'values': ['P5', 'P6']}, {'not': {'column': '是否驻场', 'values': ['是']}}]},
+    {'or': [
+        {'and': [{'column': '职级', 'values': ['M1', 'M2']}, {'column': '入职日期', 'values': ['2015', '2016']}]},
+        {'and': [{'column': '三级部门', 'values': ['华东大区']}, {'not': {'column': '是否驻场', 'values': ['是']}}]},
+    ]},
+]
+
+
+def expected_mask(df, expression):
+    """逐列筛选得到的参照结果"""
+    if 'column' in expression:
+        values = df[expression['column']]
+        if values.dtype.kind == 'M':
+            values = values.dt.year
+        return values.astype(str).isin(expression['values']).to_numpy()
+    if 'not' in expression:
+        return ~expected_mask(df, expression['not'])
+    op = 'and' if 'and' in expression else 'or'
+    masks = [expected_mask(df, item) for item in expression[op]]
+    return np.logical_and.reduce(masks) if op == 'and' else np.logical_or.reduce(masks)
+
+
+@pytest.fixture(scope='module')
+def index(roster):
+    return BitmapIndex(roster)
+
+
+@pytest.mark.parametrize('expression', CASES)
+def test_mask_matches_column_filter(roster, index, expression):
+    assert (index.mask(EligibilityRule(expression)) == expected_mask(roster, expression)).all()
+
+
+@pytest.mark.parametrize('rows', [1, 7, 9, 16])
+def test_not_clears_padding_bits(roster, rows):
+    index = BitmapIndex(roster.iloc[:rows])
+    bits = index.bits({'not': {'column': '职级', 'values': ['不存在的职级']}})
+    assert popcount(bits) == rows
+
+
+def test_columns_lists_values_with_counts(roster, index):
+    columns = dict(index.columns())
+    assert '员工 ID' not in columns and '姓名' not in columns
+    assert dict(columns['职级']) == roster['职级'].value_counts().to_dict()
+    assert set(dict(columns['入职日期'])) == {str(year) for year in range(2015, 2025)}
+
+
+def test_unusable_columns_rejected(roster):
+    index = BitmapIndex(roster, max_values=8)
+    with pytest.raises(DrawError, match='没有可用作资格条件'):
+        index.mask(EligibilityRule({'column': '工号', 'values': ['1']}))
+    with pytest.raises(DrawError, match='取值超过 8 种'):
+        index.mask(EligibilityRule({'column': '四级部门', 'values': ['江苏省区']}))
+
+
+@pytest.mark.parametrize('expression', [
+    None, {}, {'column': '职级'}, {'column': '职级', 'values': []}, {'and': []},
+    {'xor': [{'column': '职级', 'values': ['P5']}]}, {'not': {'column': '职级', 'values': ['P5']}, 'and': []},
+])
+def test_invalid_rules_rejected(expression):
+    with pytest.raises(DrawError):
+        EligibilityRule(expression)
+
+
+def test_rule_round_trip():
+    rule = EligibilityRule(CASES[2])
+    assert EligibilityRule.from_dict(rule.as_dict()).expression == rule.expression
+    assert EligibilityRule.from_dict(None) is None
+
+
+def test_draw_only_picks_matching_people(roster):
+    session = DrawSession(roster, seed=1)
+    provinces = [(province, level) for province, level, *_ in session.provinces]
+    rule = EligibilityRule(CASES[1])
+    matching = expected_mask(roster, CASES[1])
+    for _ in range(5):
+        positions = session.draw(provinces, 50, rule=rule)
+        assert matching[positions].all()
+    assert session.rule_counts(rule) == (int(matching.sum()), int(matching.sum()) - 250)
+
+
+def test_shortfall_reported_and_not_recorded(roster):
+    session = DrawSession(roster.iloc[:200])
+    provinces = [(province, level) for province, level, *_ in session.provinces]
+    rule = EligibilityRule({'and': [{'column': '职级', 'values': ['M2']}, {'column': '是否驻场', 'values': ['是']}]})
+    with pytest.raises(DrawError, match='符合资格条件'):
+        session.draw(provinces, 150, rule=rule)
+    assert session.draw_count == 0
+
+
+def test_available_bits_follow_undo_and_redo(roster):
+    session = DrawSession(roster.iloc[:5000], seed=2)
+    provinces = [(province, level) for province, level, *_ in session.provinces]
+    rule = EligibilityRule(CASES[0])
+    for _ in range(3):
+        session.draw(provinces, 40, rule=rule)
+    session.undo()
+    session.undo()
+    session.redo()
+    assert (np.unpackbits(session.available_bits, count=5000).view(bool) == ~session.drawn_mask).all()
+
+
+def test_replay_with_rule(roster):
+    session = DrawSession(roster.iloc[:5000], seed=3)
+    provinces = [(province, level) for province, level, *_ in session.provinces]
+    session.draw(provinces, 20, rule=EligibilityRule(CASES[2]))
+    session.draw(provinces, 20)
+    for _, recorded, replayed in replay_session(session.df, session.journal()):
+        assert recorded == replayed
+
+
+@pytest.mark.perf
+@pytest.mark.parametrize('expression', CASES)
+def test_latency_on_100k_rows(roster, expression):
+    session = DrawSession(roster)
+    rule = EligibilityRule(expression)
+    session.rule_counts(rule)  # 建立用到的列的位图
+    samples = []
+    for _ in range(20):
+        start = time.perf_counter()
+        session.rule_counts(rule)
+        samples.append(time.perf_counter() - start)
+    assert np.median(samples) < LATENCY_LIMIT
@@ -0,0 +1,272 @@
+"""
+抽签公平性审计工具
+使用与抽签小程序相同的抽签流程（省区筛选 → 资格条件 → 排除往期及本场已中签人员 → 随机键抽取），
+对整场多轮抽签做大规模蒙特卡洛模拟，统计每个人的中签频率并做卡方检验
+
+用法示例：
+    python 公平性审计.py 工作簿1.xlsx --round "江苏省区,浙江省区:5" --round "*:10" --sessions 1000000
+    python 公平性审计.py 工作簿1.xlsx --round "*:10" --rule '{"column": "职级", "values": ["P5", "P6"]}'
+
+说明：
+- 每个 --round 为一轮抽签，格式为 “省区1,省区2:人数”，省区名称支持 * ? 通配符，* 表示全部省区
+- --rule 为各轮共用的资格条件（JSON，格式与抽签服务的 rule 相同）
+- 参与轮次完全相同的人员构成一个分组，同组人员中签概率应当相等，卡方检验在组内进行
+- 不模拟部门分布限制（每部门最多 / 至少抽取人数）：使用分布限制时同组人员的中签概率本就不等，
+  审计结果不适用于此类抽签
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import fnmatch
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from 抽签核心 import (
+    BitmapIndex, EligibilityRule, ExclusionIndex, employee_keys, detect_provinces, province_mask,
+    select_by_random_keys, read_roster
+)
+
+# 每批模拟的随机键个数上限（批大小 × 候选人数），控制单个进程的内存占用
+BATCH_CELLS = 2_000_000
+
+# 子进程共享的模拟参数，由 _init_worker 设置
+_round_masks = None
+_round_counts = None
+
+
+def _init_worker(round_masks, round_counts):
+    global _round_masks, _round_counts
+    _round_masks = round_masks
+    _round_counts = round_counts
+
+
+def simulate_sessions(round_masks, round_counts, sessions, seed):
+    """模拟若干场抽签，返回每个候选人的累计中签次数
+
+    round_masks: (轮数, 候选人数) 布尔数组，已扣除往期排除人员
+    round_counts: 每轮抽取人数
+    """
+    rng = np.random.default_rng(seed)
+    pool_size = round_masks.shape[1]
+    counts = np.zeros(pool_size, dtype=np.int64)
+    batch = max(1, BATCH_CELLS // max(pool_size, 1))
+
+    done = 0
+    while done < sessions:
+        size = min(batch, sessions - done)
+        drawn = np.zeros((size, pool_size), dtype=bool)
+        rows = np.arange(size)[:, None]
+
+        for mask, k in zip(round_masks, round_counts):
+            eligible = mask & ~drawn
+            if (eligible.sum(axis=1) < k).any():
+                raise ValueError(f'某些模拟场次中符合条件的人数不足 {k} 人，抽签方案无法完成')
+            keys = rng.random((size, pool_size))
+            drawn[rows, select_by_random_keys(keys, eligible, k)] = True
+
+        counts += drawn.sum(axis=0)
+        done += size
+
+    return counts
+
+
+def _simulate_task(sessions, seed):
+    return simulate_sessions(_round_masks, _round_counts, sessions, seed)
+
+
+def chi_square_sf(statistic, dof):
+    """卡方分布上侧概率（p 值）；无 scipy 时使用 Wilson-Hilferty 正态近似"""
+    if dof <= 0:
+        return float('nan')
+    try:
+        from scipy.stats import chi2
+        return float(chi2.sf(statistic, dof))
+    except ImportError:
+        z = ((statistic / dof) ** (1 / 3) - (1 - 2 / (9 * dof))) / math.sqrt(2 / (9 * dof))
+        return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def parse_round(spec, provinces):
+    """解析轮次参数 “省区1,省区2:人数”，返回 ([(省区名称, 所在列), ...], 人数)"""
+    try:
+        patterns, count = spec.rsplit(':', 1)
+        count = int(count)
+    except ValueError:
+        raise ValueError(f'轮次格式错误：{spec}（应为 “省区1,省区2:人数”）')
+    if count < 1:
+        raise ValueError(f'抽取人数必须大于 0：{spec}')
+
+    selected = []
+    for pattern in patterns.split(','):
+        pattern = pattern.strip()
+        matched = [
+            (province, level) for province, level, _, _ in provinces
+            if fnmatch.fnmatchcase(province, pattern)
+        ]
+        if not matched:
+            raise ValueError(f'没有匹配 “{pattern}” 的省区')
+        selected.extend(p for p in matched if p not in selected)
+    return selected, count
+
+
+def run_audit(df, rounds, sessions, workers, seed=None, excluded=None, rule=None):
+    """执行审计，返回 (逐人结果 DataFrame, 分组检验结果 DataFrame)
+
+    rounds: [([(省区名称, 所在列), ...], 人数), ...]
+    excluded: 往期排除掩码（与名单等长），为 None 时不排除
+    rule: 各轮共用的资格条件（EligibilityRule），为 None 时不限制
+    """
+    if excluded is None:
+        excluded = np.zeros(len(df), dtype=bool)
+    allowed = ~excluded
+    if rule is not None:
+        allowed = allowed & BitmapIndex(df).mask(rule)
+
+    # 只模拟至少在一轮中有资格的人员
+    full_masks = np.array([province_mask(df, provinces) & allowed for provinces, _ in rounds])
+    pool = np.flatnonzero(full_masks.any(axis=0))
+    round_masks = full_masks[:, pool]
+    round_counts = [count for _, count in rounds]
+
+    # 按进程数拆分任务，每个任务使用独立的随机数序列
+    tasks = max(workers * 4, 1)
+    per_task = [sessions // tasks + (1 if i < sessions % tasks else 0) for i in range(tasks)]
+    seeds = np.random.SeedSequence(seed).spawn(tasks)
+
+    counts = np.zeros(len(pool), dtype=np.int64)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(round_masks, round_counts)
+    ) as executor:
+        futures = [
+            executor.submit(_simulate_task, n, s)
+            for n, s in zip(per_task, seeds) if n > 0
+        ]
+        for future in futures:
+            counts += future.result()
+
+    # 参与轮次相同的人员为一组，组内中签概率应相等
+    signatures = np.packbits(round_masks.T, axis=1)
+    _, group_ids = np.unique(signatures, axis=0, return_inverse=True)
+    group_ids = group_ids.ravel()
+
+    result = pd.DataFrame({
+        'Excel行号': pool + 2,
+        '员工 ID': df['员工 ID'].to_numpy()[pool],
+        '姓名': df['姓名'].to_numpy()[pool],
+        '分组': group_ids + 1,
+        '中签次数': counts,
+        '中签频率': counts / sessions,
+    })
+    group_mean = result.groupby('分组')['中签次数'].transform('mean')
+    result['期望频率'] = group_mean / sessions
+    result['相对偏差'] = np.where(group_mean > 0, counts / group_mean - 1, 0.0)
+
+    groups = []
+    for group, members in result.groupby('分组'):
+        observed = members['中签次数'].to_numpy(dtype=float)
+        expected = observed.mean()
+        # 每人中签次数服从二项分布 B(场次, p)，方差为 E(1-p)（p 较大时明显小于泊松近似的 E）；
+        # 组内中签总数固定时各人次数负相关，再乘 (n-1)/n，统计量服从自由度 n-1 的卡方分布
+        variance = expected * (1 - expected / sessions)
+        size = len(observed)
+        statistic = float(((observed - expected) ** 2).sum() / variance * (size - 1) / size) if variance > 0 else 0.0
+        dof = size - 1
+        rounds_in = [str(i + 1) for i in np.flatnonzero(round_masks[:, members.index[0]])]
+        groups.append({
+            '分组': group,
+            '参与轮次': ','.join(rounds_in),
+            '人数': len(observed),
+            '期望频率': expected / sessions,
+            '卡方值': statistic,
+            '自由度': dof,
+            'p值': chi_square_sf(statistic, dof),
+        })
+
+    return result, pd.DataFrame(groups)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='抽签公平性审计（蒙特卡洛模拟 + 卡方检验）')
+    parser.add_argument('roster', help='名单文件（Excel 或 CSV）')
+    parser.add_argument('--round', dest='rounds', action='append', required=True,
+                        help='一轮抽签，格式 “省区1,省区2:人数”，可重复指定多轮')
+    parser.add_argument('--sessions', type=int, default=1_000_000, help='模拟场次（默认 1000000）')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='进程数')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子（用于复现审计结果）')
+    parser.add_argument('--rule', default=None, help='各轮共用的资格条件（JSON）')
+    parser.add_argument('--history', default=None, help='往期中签排除库（如 抽签历史.db）')
+    parser.add_argument('--output', default=None, help='逐人结果输出文件（.csv 或 .xlsx）')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("   抽签公平性审计")
+    print("=" * 60)
+
+    try:
+        df, _, _ = read_roster(args.roster)
+        provinces = detect_provinces(df)
+        rounds = [parse_round(spec, provinces) for spec in args.rounds]
+        rule = EligibilityRule.from_dict(json.loads(args.rule)) if args.rule else None
+        if rule is not None:
+            BitmapIndex(df).mask(rule)  # 提前检查条件中的列和取值
+    except json.JSONDecodeError as e:
+        print(f"❌ 资格条件不是有效的 JSON: {e}")
+        return 1
+    except Exception as e:
+        print(f"❌ 准备审计失败: {e}")
+        return 1
+
+    excluded = None
+    if args.history:
+        excluded = ExclusionIndex(args.history).mask_for(employee_keys(df['员工 ID']))
+        print(f"🚫 往期排除：{int(excluded.sum())} 人")
+
+    for i, (selected, count) in enumerate(rounds, 1):
+        names = ', '.join(province for province, _ in selected)
+        print(f"🎯 第 {i} 轮：从 {names} 中抽取 {count} 人")
+    if rule is not None:
+        print(f"📋 资格条件：{rule.describe()}")
+    print(f"🔁 模拟场次：{args.sessions}，进程数：{args.workers}")
+
+    start = time.perf_counter()
+    try:
+        result, groups = run_audit(df, rounds, args.sessions, args.workers, args.seed, excluded, rule)
+    except ValueError as e:
+        print(f"❌ 审计失败: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    print(f"\n✅ 模拟完成，用时 {elapsed:.1f} 秒")
+    print(f"👥 参与人数：{len(result)}，分组数：{len(groups)}\n")
+    print(groups.to_string(index=False, float_format=lambda v: f'{v:.6g}'))
+    print(f"\n📈 最大相对偏差：{result['相对偏差'].abs().max():.4%}")
+
+    min_p = groups['p值'].min()
+    if min_p < 0.01 / len(groups):
+        print("⚠️  存在组内中签频率显著不均的分组，请检查抽签流程")
+    else:
+        print("✅ 各分组组内中签频率无显著差异")
+    print("ℹ️  本审计不模拟部门分布限制，结果不适用于设置了每部门最多 / 至少抽取人数的抽签")
+
+    if args.output:
+        if args.output.lower().endswith('.csv'):
+            result.to_csv(args.output, index=False, encoding='utf-8-sig')
+        else:
+            result.to_excel(args.output, index=False, engine='openpyxl')
+        print(f"📁 逐人结果已保存到：{args.output}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
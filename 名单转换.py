@@ -0,0 +1,53 @@
+"""
+名单格式转换工具
+把 Excel / CSV 名单一次性转换为 Arrow 名单（*.arrow），抽签小程序以内存映射方式打开，
+百万级名单也能在一秒内加载，且只读入抽签实际用到的列
+
+用法示例：
+    python 名单转换.py 集团名单.xlsx
+    python 名单转换.py 集团名单.xlsx -o 集团名单_2025.arrow
+
+说明：
+- 需要安装 pyarrow（pip install pyarrow）
+- 转换后的名单行序与源文件一致，抽签记录可照常用 抽签重放.py 核验
+- 导出结果时仍可选择 xlsx；名单超过 Excel 行数上限（约 104 万行）时请导出为 csv 或 arrow
+"""
+
+import sys
+import time
+import argparse
+
+from 抽签核心 import convert_to_arrow, read_roster
+
+
+def main():
+    parser = argparse.ArgumentParser(description='把 Excel / CSV 名单转换为 Arrow 名单')
+    parser.add_argument('source', help='源名单文件（Excel 或 CSV）')
+    parser.add_argument('-o', '--output', default=None, help='输出文件（默认与源文件同名的 .arrow）')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("   名单格式转换")
+    print("=" * 60)
+
+    try:
+        output, rows, seconds = convert_to_arrow(args.source, args.output)
+    except ImportError:
+        print("❌ 未安装 pyarrow，请先执行：pip install pyarrow")
+        return 1
+    except Exception as e:
+        print(f"❌ 转换失败: {e}")
+        return 1
+
+    print(f"📄 源名单：{args.source}（{rows} 人）")
+    print(f"✅ 已转换：{output}（{seconds:.2f} 秒）")
+
+    # 打开一次转换结果，确认可以读取
+    start = time.perf_counter()
+    df, backend, _ = read_roster(output)
+    print(f"⚡ 打开 Arrow 名单：{len(df)} 人，{len(df.columns)} 列，{(time.perf_counter() - start) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,655 @@
+"""
+抽签小程序性能测试
+功能：生成模拟名单，测量各项功能在不同名单规模下的耗时
+
+用法示例：
+    python 性能测试.py service --rows 100000 --clients 50 --requests 200
+    python 性能测试.py readers --rows 10000 100000
+    python 性能测试.py split --rows 200000
+    python 性能测试.py parse --rows 500000 --workers 1 2 4 8
+    python 性能测试.py quota --rows 100000 --count 30
+    python 性能测试.py rules --rows 1000000
+    python 性能测试.py export --rows 10000 100000
+    python 性能测试.py gui --rows 1000 10000 50000 --output 界面耗时_新版.json --baseline 界面耗时_旧版.json
+
+子命令：
+    readers   名单读取：各读取后端（calamine / openpyxl / csv / arrow）读取不同规模名单的耗时
+    service   抽签服务压力测试：多个并发客户端同时查询和抽签，统计请求延迟
+    export    导出结果：流式导出与 pandas 导出的耗时和峰值内存
+    split     分省区导出：单进程与多进程写出各省区工作簿的耗时
+    parse     并行解析工作簿：不同进程数并行解析同一个大工作表的耗时和加速比，与单进程读取后端对比
+    quota     部门分布限制抽签：无限制与各类限制下单轮抽取的耗时，并核对结果满足限制
+    rules     资格条件：建立位图索引的耗时、各类条件组合的位图运算和人数统计耗时，并与逐列筛选核对
+    style     界面样式：主窗口构建耗时、状态标签切换并重绘的耗时
+    gui       界面端到端耗时：加载到省区列表填充、点击抽签到结果表格绘制、导出，可保存报告与旧版本对比
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 模拟名单的部门结构：三级部门 → 四级部门
+DEPARTMENTS = {
+    '华东大区': ['江苏省区', '浙江省区', '上海省区', '安徽省区', '华东市场部'],
+    '华南大区': ['广东省区', '广西省区', '福建省区', '海南省区'],
+    '华北大区': ['北京省区', '河北省区', '山西省区', '华北综合部'],
+    '华中大区': ['湖北省区', '湖南省区', '河南省区'],
+    '西南独立省区': ['成都一部', '重庆一部', '昆明一部'],
+    '东北独立省区': ['沈阳组', '长春组'],
+}
+
+
+def make_roster(rows, seed=0):
+    """生成模拟名单 DataFrame（列与正式名单一致）"""
+    rng = np.random.default_rng(seed)
+    third = np.array(list(DEPARTMENTS), dtype=object)
+    third_col = third[rng.integers(0, len(third), rows)]
+    fourth_col = np.empty(rows, dtype=object)
+    for dept, children in DEPARTMENTS.items():
+        idx = np.flatnonzero(third_col == dept)
+        fourth_col[idx] = np.array(children, dtype=object)[rng.integers(0, len(children), len(idx))]
+    return pd.DataFrame({
+        '员工 ID': np.arange(100001, 100001 + rows),
+        '姓名': [f'员工{i:06d}' for i in range(rows)],
+        '三级部门': third_col,
+        '四级部门': fourth_col,
+        '职级': rng.choice(['P4', 'P5', 'P6', 'P7', 'M1', 'M2'], rows),
+        '入职日期': pd.Timestamp('2015-01-01') + pd.to_timedelta(rng.integers(0, 3650, rows), unit='D'),
+        '是否驻场': rng.choice(['是', '否'], rows),
+    })
+
+
+def write_roster(rows, directory, suffix='.xlsx', seed=0):
+    """生成模拟名单文件，返回文件路径"""
+    path = os.path.join(directory, f'模拟名单_{rows}{suffix}')
+    df = make_roster(rows, seed)
+    if suffix == '.csv':
+        df.to_csv(path, index=False)
+    elif suffix == '.arrow':
+        from 抽签核心 import write_arrow
+        write_arrow(path, df)
+    else:
+        df.to_excel(path, index=False, engine='openpyxl')
+    return path
+
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'count': len(samples),
+        'p50': np.percentile(samples, 50),
+        'p95': np.percentile(samples, 95),
+        'p99': np.percentile(samples, 99),
+        'max': samples.max(),
+    }
+
+
+def print_latency(title, samples):
+    stats = percentiles(samples)
+    print(f"  {title:<10} 次数 {stats['count']:>6}  "
+          f"p50 {stats['p50']:7.2f} ms  p95 {stats['p95']:7.2f} ms  "
+          f"p99 {stats['p99']:7.2f} ms  max {stats['max']:7.2f} ms")
+
+
+# ---------- 名单读取 ----------
+
+def bench_readers(args):
+    from 抽签核心 import available_backends, read_roster
+
+    print("📊 名单读取（每项取最快一次）")
+    suffixes = ('.xlsx', '.csv') + (('.arrow',) if available_backends('名单.arrow') else ())
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            for suffix in suffixes:
+                path = write_roster(rows, directory, suffix)
+                size = os.path.getsize(path) / 1024 / 1024
+                for backend in available_backends(path):
+                    best = min(read_roster(path, backend)[2] for _ in range(args.repeat))
+                    print(f"  {rows:>8} 人  {suffix:<5} {size:6.1f} MB  {backend:<9} {best * 1000:9.1f} ms")
+    return 0
+
+
+# ---------- 导出结果 ----------
+
+def bench_export(args):
+    import tracemalloc
+    from 抽签核心 import DrawSession, stream_export
+
+    print("📊 导出结果" + ("（峰值内存为导出过程中新增的 Python 内存，跟踪内存会明显拖慢耗时）" if args.memory else ""))
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in args.rows:
+            path = write_roster(rows, directory, '.xlsx')
+            session = DrawSession.from_file(path)
+            session.draw([(p, level) for p, level, *_ in session.provinces], max(1, rows // 100))
+            exporters = {
+                '流式导出': lambda: stream_export(path, os.path.join(directory, 'stream.xlsx'), session.drawn_mask),
+                'pandas': lambda: session.export_frame().to_excel(
+                    os.path.join(directory, 'pandas.xlsx'), index=False, engine='openpyxl'),
+            }
+            for name, export in exporters.items():
+                if args.memory:
+                    tracemalloc.start()
+                start = time.perf_counter()
+                export()
+                seconds = time.perf_counter() - start
+                line = f"  {rows:>8} 人  {name:<6} {seconds:8.2f} 秒"
+                if args.memory:
+                    line += f"  峰值 {tracemalloc.get_traced_memory()[1] / 1024 / 1024:8.1f} MB"
+                    tracemalloc.stop()
+                print(line)
+    return 0
+
+
+# ---------- 分省区导出 ----------
+
+def bench_split(args):
+    from 抽签核心 import DrawSession, write_workbook
+
+    session = DrawSession(make_roster(args.rows))
+    session.draw([(p, level) for p, level, *_ in session.provinces], max(1, args.rows // 100))
+    workers = args.workers or os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        # 最大省区单独写出的耗时，即并行导出的理论下限
+        labels = session.labels
+        values, counts = np.unique(labels, return_counts=True)
+        largest = values[counts.argmax()]
+        start = time.perf_counter()
+        write_workbook(os.path.join(directory, 'largest.xlsx'),
+                       session.export_frame()[labels == largest])
+        largest_seconds = time.perf_counter() - start
+
+        timings = {}
+        for n in sorted({1, workers}):
+            start = time.perf_counter()
+            manifest = session.export_by_province(os.path.join(directory, f'w{n}'), workers=n)
+            timings[n] = time.perf_counter() - start
+
+    print(f"📊 分省区导出：名单 {args.rows} 人，{len(manifest)} 个文件，最大省区 {largest}（{counts.max()} 人）")
+    print(f"  最大省区单独写出 {largest_seconds:7.2f} 秒")
+    for n, seconds in timings.items():
+        print(f"  {n:>2} 个进程      {seconds:7.2f} 秒  加速 {timings[1] / seconds:4.1f}x")
+    return 0
+
+
+# ---------- 并行解析工作簿 ----------
+
+def bench_parse(args):
+    from 抽签核心 import available_backends, read_excel_parallel, read_roster
+
+    cores = os.cpu_count() or 1
+    counts = args.workers or sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_roster(args.rows, directory, '.xlsx')
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f"📊 并行解析工作簿：名单 {args.rows} 人，{size:.1f} MB，本机 {cores} 核（每项取最快一次）")
+
+        reference = None
+        for backend in ('calamine', 'openpyxl'):
+            if backend not in available_backends(path):
+                continue
+            best = None
+            for _ in range(args.repeat):
+                df, _, seconds = read_roster(path, backend)
+                best = seconds if best is None else min(best, seconds)
+            reference = df if reference is None else reference
+            print(f"  单进程 {backend:<9}      {best:7.2f} 秒")
+
+        timings = {}
+        for n in counts:
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                df = read_excel_parallel(path, workers=n)
+                seconds = time.perf_counter() - start
+                best = seconds if best is None else min(best, seconds)
+            timings[n] = best
+            same = '' if reference is None or df.equals(reference) else '  ⚠️ 结果与单进程读取不一致'
+            print(f"  并行   {n:>2} 个进程      {best:7.2f} 秒  加速 {timings[counts[0]] / best:4.1f}x{same}")
+    if max(counts) > cores:
+        print(f"  ⚠️ 进程数超过本机核数（{cores}），多出的进程无法带来加速")
+    return 0
+
+
+# ---------- 部门分布限制抽签 ----------
+
+def bench_quota(args):
+    from 抽签核心 import DrawSession, DrawConstraints, round_rng, draw_positions
+
+    session = DrawSession(make_roster(args.rows))
+    eligible = session.eligible([(p, level) for p, level, *_ in session.provinces])
+    fourth = session.tree.groups('四级部门')
+    third = session.tree.groups('三级部门')
+    cases = {
+        '无限制': None,
+        '同一四级部门最多 2 人': DrawConstraints(('四级部门', 2)),
+        '每个三级部门至少 1 人': DrawConstraints(None, ('三级部门', 1)),
+        '两项同时': DrawConstraints(('四级部门', 2), ('三级部门', 1)),
+    }
+
+    print(f"📊 部门分布限制抽签：抽签池 {int(eligible.sum())} 人，每轮 {args.count} 人")
+    for name, constraints in cases.items():
+        samples = []
+        for serial in range(1, args.repeat + 1):
+            start = time.perf_counter()
+            positions = draw_positions(round_rng(0, serial), eligible, args.count, constraints, session.tree)
+            samples.append(time.perf_counter() - start)
+            if constraints and constraints.max_per:
+                assert np.bincount(fourth[positions]).max() <= constraints.max_per[1], '超出每部门上限'
+            if constraints and constraints.min_per:
+                assert len(np.unique(third[positions])) == len(np.unique(third[eligible])), '有部门未抽中'
+        print_latency(name, samples)
+    return 0
+
+
+# ---------- 资格条件 ----------
+
+def bench_rules(args):
+    from 抽签核心 import DrawSession, EligibilityRule
+
+    df = make_roster(args.rows)
+    session = DrawSession(df)
+    start = time.perf_counter()
+    columns = session.bitmaps.columns()
+    index_seconds = time.perf_counter() - start
+
+    level, onsite, years, third = df['职级'], df['是否驻场'] == '是', df['入职日期'].dt.year, df['三级部门']
+    cases = {
+        '单列': (
+            {'column': '职级', 'values': ['P5', 'P6']},
+            level.isin(['P5', 'P6']),
+        ),
+        '两列 与/非': (
+            {'and': [{'column': '职级', 'values': ['P5', 'P6']}, {'not': {'column': '是否驻场', 'values': ['是']}}]},
+            level.isin(['P5', 'P6']) & ~onsite,
+        ),
+        '四列 嵌套': (
+            {'or': [
+                {'and': [{'column': '职级', 'values': ['M1', 'M2']}, {'column': '入职日期', 'values': ['2015', '2016']}]},
+                {'and': [{'column': '三级部门', 'values': ['华东大区']}, {'not': {'column': '是否驻场', 'values': ['是']}}]},
+            ]},
+            (level.isin(['M1', 'M2']) & years.isin([2015, 2016])) | ((third == '华东大区') & ~onsite),
+        ),
+    }
+
+    print(f"📊 资格条件：名单 {args.rows} 人，{len(columns)} 列建立位图索引，耗时 {index_seconds * 1000:.1f} ms")
+    for name, (expression, expected) in cases.items():
+        rule = EligibilityRule(expression)
+        assert (session.bitmaps.mask(rule) == expected.to_numpy()).all(), f'{name}：位图结果与逐列筛选不一致'
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            session.rule_counts(rule)
+            samples.append(time.perf_counter() - start)
+        print_latency(name, samples)
+
+    # 逐列筛选（每轮重新比较名单各列）作为对照
+    samples = []
+    for _ in range(max(1, args.repeat // 10)):
+        start = time.perf_counter()
+        (level.isin(['M1', 'M2']) & years.isin([2015, 2016])) | ((third == '华东大区') & ~(df['是否驻场'] == '是'))
+        samples.append(time.perf_counter() - start)
+    print_latency('逐列筛选', samples)
+    return 0
+
+
+# ---------- 抽签服务压力测试 ----------
+
+async def _request(reader, writer, method, path, body=None):
+    data = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else b''
+    writer.write(
+        f'{method} {path} HTTP/1.1\r\nHost: localhost\r\n'
+        f'Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n'.encode('latin-1')
+        + data
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    payload = json.loads(await reader.readexactly(length))
+    return status, payload
+
+
+async def _client(port, requests, draw_ratio, provinces, rng, reads, draws, errors):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for _ in range(requests):
+            if rng.random() < draw_ratio:
+                body = {'provinces': [provinces[rng.integers(len(provinces))]], 'count': 1}
+                start = time.perf_counter()
+                status, _ = await _request(reader, writer, 'POST', '/draw', body)
+                draws.append(time.perf_counter() - start)
+            else:
+                path = '/provinces' if rng.random() < 0.5 else '/status'
+                start = time.perf_counter()
+                status, _ = await _request(reader, writer, 'GET', path)
+                reads.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def _load_test(port, clients, requests, draw_ratio, provinces):
+    reads, draws, errors = [], [], []
+    seeds = np.random.SeedSequence(0).spawn(clients)
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _client(port, requests, draw_ratio, provinces, np.random.default_rng(seed), reads, draws, errors)
+        for seed in seeds
+    ])
+    return time.perf_counter() - start, reads, draws, errors
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def bench_service(args):
+    with tempfile.TemporaryDirectory() as directory:
+        roster = write_roster(args.rows, directory, '.xlsx')
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, '抽签服务.py'), roster, '--port', str(port),
+             '--history', os.path.join(directory, '抽签历史.db')],
+            cwd=directory, stdout=subprocess.DEVNULL
+        )
+        try:
+            # 等待服务启动
+            deadline = time.time() + 120
+            while True:
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                    break
+                except OSError:
+                    if server.poll() is not None or time.time() > deadline:
+                        print("❌ 抽签服务启动失败")
+                        return 1
+                    time.sleep(0.2)
+
+            provinces = [p for children in DEPARTMENTS.values() for p in children if '省区' in p]
+            elapsed, reads, draws, errors = asyncio.run(
+                _load_test(port, args.clients, args.requests, args.draw_ratio, provinces)
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+    total = len(reads) + len(draws)
+    print(f"📊 名单 {args.rows} 人，{args.clients} 个并发客户端，每个 {args.requests} 个请求")
+    print(f"  总耗时 {elapsed:.2f} 秒，吞吐 {total / elapsed:.0f} 请求/秒，失败 {len(errors)} 个")
+    if reads:
+        print_latency('查询', reads)
+    if draws:
+        print_latency('抽签', draws)
+    return 0
+
+
+# ---------- 界面样式 ----------
+
+def _qt_app():
+    """创建无界面（offscreen）的 QApplication"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication(sys.argv[:1])
+
+
+def bench_style(args):
+    app = _qt_app()
+    from 抽签小程序 import RandomDrawApp, set_status
+
+    # 在临时目录中运行，避免自动加载当前目录下的默认名单
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            samples = []
+            for _ in range(args.windows):
+                start = time.perf_counter()
+                window = RandomDrawApp()
+                window.show()
+                app.processEvents()
+                samples.append(time.perf_counter() - start)
+                window.close()
+                window.deleteLater()
+                app.processEvents()
+
+            window = RandomDrawApp()
+            window.show()
+            app.processEvents()
+            label = window.result_stats_label
+            updates = []
+            for i in range(args.updates):
+                start = time.perf_counter()
+                set_status(label, 'success' if i % 2 else 'info')
+                label.setText(f'第 {i} 次')
+                app.processEvents()
+                updates.append(time.perf_counter() - start)
+            window.close()
+        finally:
+            os.chdir(cwd)
+
+    print("📊 界面样式")
+    print_latency('窗口构建', samples)
+    print_latency('状态切换', updates)
+    return 0
+
+
+# ---------- 界面端到端耗时 ----------
+
+class _AutoDismiss:
+    """运行期间自动关闭消息框、文件对话框返回指定路径，并记录弹出的警告和错误"""
+
+    def __init__(self, save_path):
+        self.save_path = save_path
+        self.errors = []
+
+    def __enter__(self):
+        from PyQt6.QtWidgets import QMessageBox, QFileDialog
+
+        self._saved = {
+            (QMessageBox, name): getattr(QMessageBox, name) for name in ('information', 'warning', 'critical')
+        }
+        self._saved[(QFileDialog, 'getSaveFileName')] = QFileDialog.getSaveFileName
+        QMessageBox.information = staticmethod(lambda *a, **k: QMessageBox.StandardButton.Ok)
+        QMessageBox.warning = QMessageBox.critical = staticmethod(self._record)
+        QFileDialog.getSaveFileName = staticmethod(lambda *a, **k: (self.save_path, ''))
+        return self
+
+    def _record(self, parent, title, text, *args, **kwargs):
+        from PyQt6.QtWidgets import QMessageBox
+
+        self.errors.append(f'{title}：{text}')
+        return QMessageBox.StandardButton.Ok
+
+    def __exit__(self, *exc):
+        for (owner, name), value in self._saved.items():
+            setattr(owner, name, value)
+
+
+def _render(app, window):
+    """处理挂起的事件并立即重绘结果表格和省区列表，计入绘制耗时"""
+    app.processEvents()
+    window.result_table.viewport().repaint()
+    window.province_list.viewport().repaint()
+    app.processEvents()
+
+
+def bench_gui(args):
+    app = _qt_app()
+    from 抽签小程序 import RandomDrawApp
+
+    report = {
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'qt_platform': os.environ.get('QT_QPA_PLATFORM'),
+        'results': {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            window = RandomDrawApp()
+            window.show()
+            window.animation_check.setChecked(False)
+            app.processEvents()
+
+            # 单独记录抽签后自动导出的耗时，便于区分界面刷新与写文件
+            auto_exports = []
+            auto_export = window._auto_update_export
+
+            def timed_auto_export():
+                start = time.perf_counter()
+                auto_export()
+                auto_exports.append(time.perf_counter() - start)
+
+            window._auto_update_export = timed_auto_export
+            with _AutoDismiss(os.path.join(directory, '导出.xlsx')) as dialogs:
+                for rows in args.rows:
+                    path = write_roster(rows, directory, '.xlsx')
+                    window.file_path_edit.setText(path)
+                    loads, draws, exports = [], [], []
+                    for _ in range(args.repeat):
+                        # 重新加载当前文件会开始新的一场，不走会话缓存
+                        start = time.perf_counter()
+                        window.load_selected_file()
+                        _render(app, window)
+                        loads.append(time.perf_counter() - start)
+                        assert window.province_model.rowCount() > 0, '省区列表未填充'
+
+                    window.select_all()
+                    window.count_input.setText(str(args.count))
+                    auto_exports.clear()
+                    for _ in range(args.draws):
+                        start = time.perf_counter()
+                        window.draw_btn.click()
+                        _render(app, window)
+                        draws.append(time.perf_counter() - start)
+
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        window.export_btn.click()
+                        app.processEvents()
+                        exports.append(time.perf_counter() - start)
+
+                    report['results'][str(rows)] = {
+                        '加载': percentiles(loads),
+                        '抽签': percentiles(draws),
+                        '刷新': percentiles(np.subtract(draws, auto_exports)),
+                        '导出': percentiles(exports),
+                    }
+            window.close()
+        finally:
+            os.chdir(cwd)
+
+    if dialogs.errors:
+        print("⚠️ 测试过程中出现提示：")
+        for message in dict.fromkeys(dialogs.errors):
+            print(f"  {message}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    print(f"📊 界面端到端耗时（抽签每轮 {args.count} 人，含结果表格绘制和自动导出；“刷新”为抽签扣除自动导出后的耗时）")
+    for rows, stats in report['results'].items():
+        print(f"  名单 {rows} 人")
+        for name, values in stats.items():
+            line = (f"    {name}  次数 {values['count']:>4}  p50 {values['p50']:9.2f} ms  "
+                    f"p95 {values['p95']:9.2f} ms  max {values['max']:9.2f} ms")
+            old = baseline.get(rows, {}).get(name) if baseline else None
+            if old:
+                line += f"  对比基线 p50 {old['p50']:9.2f} ms（{values['p50'] / old['p50']:5.2f}x）"
+            print(line)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=float)
+        print(f"🧾 报告已保存：{args.output}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='抽签小程序性能测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    service = subparsers.add_parser('service', help='抽签服务压力测试')
+    service.add_argument('--rows', type=int, default=100_000, help='模拟名单人数')
+    service.add_argument('--clients', type=int, default=50, help='并发客户端数')
+    service.add_argument('--requests', type=int, default=200, help='每个客户端的请求数')
+    service.add_argument('--draw-ratio', type=float, default=0.05, help='抽签请求占比')
+    service.set_defaults(func=bench_service)
+
+    readers = subparsers.add_parser('readers', help='名单读取后端耗时')
+    readers.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000], help='模拟名单人数（可多个）')
+    readers.add_argument('--repeat', type=int, default=3, help='每项重复次数')
+    readers.set_defaults(func=bench_readers)
+
+    export = subparsers.add_parser('export', help='导出结果耗时和内存')
+    export.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000], help='模拟名单人数（可多个）')
+    export.add_argument('--memory', action='store_true', help='同时统计峰值内存（较慢）')
+    export.set_defaults(func=bench_export)
+
+    split = subparsers.add_parser('split', help='分省区导出耗时')
+    split.add_argument('--rows', type=int, default=200_000, help='模拟名单人数')
+    split.add_argument('--workers', type=int, default=None, help='进程数（默认 CPU 核数）')
+    split.set_defaults(func=bench_split)
+
+    parse = subparsers.add_parser('parse', help='并行解析工作簿耗时')
+    parse.add_argument('--rows', type=int, default=500_000, help='模拟名单人数')
+    parse.add_argument('--workers', type=int, nargs='+', default=None, help='进程数（可多个，默认 1、2、4、8 中不超过 CPU 核数的）')
+    parse.add_argument('--repeat', type=int, default=1, help='每项重复次数')
+    parse.set_defaults(func=bench_parse)
+
+    quota = subparsers.add_parser('quota', help='部门分布限制抽签耗时')
+    quota.add_argument('--rows', type=int, default=100_000, help='模拟名单人数')
+    quota.add_argument('--count', type=int, default=30, help='每轮抽取人数')
+    quota.add_argument('--repeat', type=int, default=200, help='每种限制的抽取次数')
+    quota.set_defaults(func=bench_quota)
+
+    rules = subparsers.add_parser('rules', help='资格条件位图运算耗时')
+    rules.add_argument('--rows', type=int, default=1_000_000, help='模拟名单人数')
+    rules.add_argument('--repeat', type=int, default=200, help='每种条件的计算次数')
+    rules.set_defaults(func=bench_rules)
+
+    style = subparsers.add_parser('style', help='界面样式耗时')
+    style.add_argument('--windows', type=int, default=30, help='构建主窗口的次数')
+    style.add_argument('--updates', type=int, default=3000, help='状态标签切换次数')
+    style.set_defaults(func=bench_style)
+
+    gui = subparsers.add_parser('gui', help='界面端到端耗时')
+    gui.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 50_000], help='模拟名单人数（可多个）')
+    gui.add_argument('--repeat', type=int, default=3, help='加载、导出各重复次数')
+    gui.add_argument('--draws', type=int, default=20, help='每个名单的抽签次数')
+    gui.add_argument('--count', type=int, default=5, help='每轮抽取人数')
+    gui.add_argument('--output', default=None, help='保存报告（JSON）的路径')
+    gui.add_argument('--baseline', default=None, help='用于对比的旧版本报告（JSON）')
+    gui.set_defaults(func=bench_gui)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
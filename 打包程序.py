@@ -18,6 +18,7 @@ import os
 import sys
 import subprocess
 import platform
+import importlib.util
 
 def check_dependencies():
     """检查必要的依赖"""
@@ -76,6 +77,12 @@ def build_exe():
         '--noconfirm',  # 不询问确认
     ]
 
+    # 可选的快速名单读取组件（pandas 按需导入，需显式打包）
+    if importlib.util.find_spec('python_calamine'):
+        pyinstaller_cmd.append('--hidden-import=python_calamine')
+    else:
+        print("ℹ️  未安装 python-calamine，将使用 openpyxl 读取名单（较慢）")
+
     # 根据系统添加特定参数
     if system == 'Windows':
         pyinstaller_cmd.append('--windowed')  # 不显示控制台窗口
@@ -4,19 +4,26 @@
 """
 
 import sys
-import pandas as pd
+import multiprocessing
+import numpy as np
 from datetime import datetime
-import random
 import os
+import re
+import time
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QLabel, QPushButton, QLineEdit, QListWidget,
-    QTextEdit, QMessageBox, QFileDialog, QFrame,
+    QLabel, QPushButton, QLineEdit, QListView, QCheckBox, QDialog,
+    QMessageBox, QFileDialog, QFrame,
     QScrollArea, QGridLayout, QTableWidget, QTableWidgetItem,
-    QHeaderView, QAbstractItemView
+    QHeaderView, QAbstractItemView, QProgressDialog, QTreeView, QTabWidget, QInputDialog, QComboBox
+)
+from PyQt6.QtCore import Qt, QSortFilterProxyModel, QTimer, pyqtSignal
+from PyQt6.QtGui import QFont, QColor, QStandardItemModel, QStandardItem, QShortcut, QKeySequence
+
+from 抽签核心 import (
+    DrawError, DrawConstraints, EligibilityRule, ExclusionIndex, SessionCache, ChunkedRosterLoader, HookRunner,
+    journal_path, reservoir_draw, write_frame
 )
-from PyQt6.QtCore import Qt
-from PyQt6.QtGui import QFont, QColor
 
 
 # 根据图片提取的配色方案（清新浅色风格）
@@ -61,103 +68,311 @@ COLORS = {
 }
 
 
+# 按钮配色：背景、悬停背景、文字
+BUTTON_STYLES = {
+    'primary': (COLORS['primary'], COLORS['primary_light'], '#FFFFFF'),
+    'secondary': (COLORS['secondary'], COLORS['secondary_light'], '#FFFFFF'),
+    'success': (COLORS['success'], COLORS['success_dark'], COLORS['success_text']),
+    'warning': (COLORS['warning'], '#FFE69C', COLORS['warning_text']),
+    'danger': (COLORS['danger'], '#FF8A92', '#FFFFFF'),
+}
+
+# 状态标签配色：文字、背景、边框
+STATUS_STYLES = {
+    'info': (COLORS['primary_dark'], COLORS['bg_selected'], COLORS['primary']),
+    'success': (COLORS['success_text'], COLORS['success'], COLORS['success_dark']),
+    'warning': (COLORS['warning_text'], COLORS['warning'], '#F0E5A8'),
+    'danger': (COLORS['danger_text'], '#F8D7DA', COLORS['danger']),
+}
+
+# 导出结果的文件类型
+EXPORT_FILTER = 'Excel 文件 (*.xlsx);;CSV 文件 (*.csv);;Arrow 文件 (*.arrow);;所有文件 (*)'
+
+
+def build_stylesheet(colors=COLORS):
+    """根据配色方案生成整个应用的样式表
+
+    各控件只设置对象名或动态属性，由应用级样式表统一匹配，
+    状态切换时只需修改属性（见 set_status），无需重新解析样式。
+    """
+    c = colors
+    parts = [f"""
+        RandomDrawApp {{
+            background-color: {c['bg_main']};
+        }}
+
+        /* 按钮 */
+        CleanButton {{
+            border: none;
+            border-radius: 6px;
+            padding: 6px 16px;
+            font-size: 12px;
+            font-weight: 600;
+        }}
+        CleanButton:disabled {{
+            background-color: #E9ECEF;
+            color: {c['text_light']};
+        }}
+        CleanButton[colorType="outline"] {{
+            background-color: #FFFFFF;
+            color: {c['primary']};
+            border: 2px solid {c['border']};
+        }}
+        CleanButton[colorType="outline"]:hover {{
+            background-color: {c['bg_hover']};
+            border-color: {c['primary']};
+        }}
+        CleanButton[colorType="outline"]:pressed {{
+            background-color: {c['bg_selected']};
+        }}
+        CleanButton[colorType="outline"]:disabled {{
+            background-color: #F8F9FA;
+            color: {c['text_light']};
+            border-color: {c['border_light']};
+        }}
+    """]
+    for color_type, (bg, bg_hover, text) in BUTTON_STYLES.items():
+        parts.append(f"""
+        CleanButton[colorType="{color_type}"] {{
+            background-color: {bg};
+            color: {text};
+        }}
+        CleanButton[colorType="{color_type}"]:hover {{
+            background-color: {bg_hover};
+        }}
+        CleanButton[colorType="{color_type}"]:pressed {{
+            background-color: {bg};
+        }}
+        """)
+
+    parts.append(f"""
+        /* 卡片 */
+        CleanCard {{
+            background-color: {c['bg_card']};
+            border: 1px solid {c['border']};
+            border-radius: 8px;
+            padding: 0px;
+        }}
+        QWidget#cardTitleBar {{
+            background-color: {c['bg_hover']};
+            border-top-left-radius: 7px;
+            border-top-right-radius: 7px;
+        }}
+        QLabel#cardIcon {{
+            font-size: 14px;
+        }}
+        QLabel#cardTitle {{
+            color: {c['text_primary']};
+            font-size: 13px;
+            font-weight: 700;
+        }}
+        QFrame#cardSeparator {{
+            background-color: {c['border']};
+            max-height: 1px;
+        }}
+
+        /* 输入框 */
+        CleanLineEdit {{
+            background-color: {c['bg_input']};
+            border: 2px solid {c['border']};
+            border-radius: 6px;
+            padding: 6px 10px;
+            font-size: 12px;
+            color: {c['text_primary']};
+        }}
+        CleanLineEdit:focus {{
+            border-color: {c['primary']};
+            background-color: #FFFFFF;
+        }}
+
+        /* 列表 */
+        CleanListView, CleanTreeView {{
+            background-color: {c['bg_input']};
+            border: 2px solid {c['border']};
+            border-radius: 6px;
+            padding: 4px;
+            font-size: 12px;
+        }}
+        CleanListView::item, CleanTreeView::item {{
+            padding: 6px 10px;
+            border-radius: 6px;
+            margin: 1px;
+            background-color: transparent;
+        }}
+        CleanListView::item:hover, CleanTreeView::item:hover {{
+            background-color: {c['bg_hover']};
+        }}
+        CleanListView::item:disabled, CleanTreeView::item:disabled {{
+            color: {c['text_secondary']};
+        }}
+        QTabWidget::pane {{
+            border: none;
+        }}
+        QTabBar::tab {{
+            background-color: transparent;
+            color: {c['text_secondary']};
+            padding: 4px 14px;
+            border-bottom: 2px solid transparent;
+        }}
+        QTabBar::tab:selected {{
+            color: {c['text_primary']};
+            border-bottom: 2px solid {c['primary']};
+            font-weight: 700;
+        }}
+
+        /* 表格 */
+        CleanTableWidget {{
+            background-color: {c['bg_input']};
+            alternate-background-color: {c['bg_card']};
+            border: 2px solid {c['border']};
+            border-radius: 6px;
+            gridline-color: {c['border_light']};
+        }}
+        CleanTableWidget::item {{
+            padding: 3px;
+            border-bottom: 1px solid {c['border_light']};
+        }}
+        CleanTableWidget::item:selected {{
+            background-color: {c['bg_selected']};
+            color: {c['text_primary']};
+        }}
+        CleanTableWidget QHeaderView::section {{
+            background-color: {c['bg_hover']};
+            color: {c['text_primary']};
+            padding: 5px;
+            border: none;
+            border-bottom: 2px solid {c['border']};
+            font-size: 12px;
+            font-weight: 700;
+        }}
+        CleanTableWidget QTableCornerButton::section {{
+            background-color: {c['bg_hover']};
+            border: none;
+        }}
+
+        /* 主窗口标题 */
+        QWidget#titleBar {{
+            background-color: {c['primary']};
+            border-radius: 6px;
+            padding: 6px 12px;
+        }}
+        QLabel#titleLabel {{
+            color: white;
+            font-size: 16px;
+            font-weight: 700;
+            letter-spacing: 1px;
+        }}
+
+        /* 文字标签 */
+        QLabel#fieldLabel {{
+            color: {c['text_primary']};
+            font-size: 13px;
+            font-weight: 700;
+            padding: 4px 0px;
+        }}
+        QLabel#hintLabel {{
+            color: {c['text_secondary']};
+            font-size: 11px;
+        }}
+        QLabel#countBadge {{
+            color: {c['text_white']};
+            font-size: 11px;
+            font-weight: 600;
+            padding: 4px 10px;
+            background-color: {c['primary']};
+            border-radius: 12px;
+        }}
+        QCheckBox {{
+            color: {c['text_primary']};
+            font-size: 12px;
+        }}
+
+        /* 状态标签：通过 status 属性切换样式 */
+        QLabel[status] {{
+            color: {c['text_secondary']};
+            font-size: 11px;
+            padding: 6px 10px;
+            background-color: {c['bg_input']};
+            border-radius: 6px;
+            border: 1px solid {c['border']};
+        }}
+    """)
+    for status, (text, bg, border) in STATUS_STYLES.items():
+        parts.append(f"""
+        QLabel[status="{status}"] {{
+            color: {text};
+            font-size: 13px;
+            padding: 10px 14px;
+            background-color: {bg};
+            border-radius: 8px;
+            border: 1px solid {border};
+            font-weight: 600;
+        }}
+        """)
+
+    parts.append(f"""
+        /* 非模态通知 */
+        QLabel#toast {{
+            color: {c['text_white']};
+            background-color: rgba(44, 62, 80, 220);
+            border-radius: 8px;
+            padding: 10px 18px;
+            font-size: 13px;
+            font-weight: 600;
+        }}
+
+        /* 滚动抽签动画 */
+        LotteryAnimationDialog {{
+            background-color: {c['primary']};
+        }}
+        QLabel#lotteryTitle {{
+            color: white;
+            font-size: 18px;
+            font-weight: 700;
+        }}
+        QLabel#lotterySlot {{
+            color: {c['text_primary']};
+            background-color: {c['bg_card']};
+            border-radius: 8px;
+            font-size: 26px;
+            font-weight: 700;
+        }}
+        QLabel#lotteryResult {{
+            color: white;
+            font-size: 16px;
+            font-weight: 600;
+        }}
+    """)
+    return ''.join(parts)
+
+
+def apply_theme(app):
+    """为整个应用设置统一样式表，只在首次调用时生效"""
+    if not app.property('themeApplied'):
+        app.setStyleSheet(build_stylesheet())
+        app.setProperty('themeApplied', True)
+
+
+def set_status(widget, status):
+    """切换状态标签的样式：只修改动态属性并重新 polish"""
+    if widget.property('status') == status:
+        return
+    widget.setProperty('status', status)
+    style = widget.style()
+    style.unpolish(widget)
+    style.polish(widget)
+
+
 class CleanButton(QPushButton):
     """清新按钮"""
     def __init__(self, text, color_type='primary', parent=None):
         super().__init__(text, parent)
         self.color_type = color_type
+        if color_type != 'outline' and color_type not in BUTTON_STYLES:
+            color_type = 'primary'
+        self.setProperty('colorType', color_type)
         self.setCursor(Qt.CursorShape.PointingHandCursor)
         self.setMinimumHeight(32)
-        self._apply_style()
-
-    def _apply_style(self):
-        styles = {
-            'primary': {
-                'bg': COLORS['primary'],
-                'bg_hover': COLORS['primary_light'],
-                'text': '#FFFFFF',
-                'shadow': '#5BA8E8',
-            },
-            'secondary': {
-                'bg': COLORS['secondary'],
-                'bg_hover': COLORS['secondary_light'],
-                'text': '#FFFFFF',
-                'shadow': COLORS['secondary_dark'],
-            },
-            'success': {
-                'bg': COLORS['success'],
-                'bg_hover': COLORS['success_dark'],
-                'text': COLORS['success_text'],
-                'shadow': '#B0D9B6',
-            },
-            'warning': {
-                'bg': COLORS['warning'],
-                'bg_hover': '#FFE69C',
-                'text': COLORS['warning_text'],
-                'shadow': '#F0E5A8',
-            },
-            'danger': {
-                'bg': COLORS['danger'],
-                'bg_hover': '#FF8A92',
-                'text': '#FFFFFF',
-                'shadow': COLORS['danger_dark'],
-            },
-            'outline': {
-                'bg': '#FFFFFF',
-                'bg_hover': COLORS['bg_hover'],
-                'text': COLORS['primary'],
-                'border': COLORS['border'],
-            },
-        }
-
-        s = styles.get(self.color_type, styles['primary'])
-
-        if self.color_type == 'outline':
-            self.setStyleSheet(f"""
-                QPushButton {{
-                    background-color: {s['bg']};
-                    color: {s['text']};
-                    border: 2px solid {s['border']};
-                    border-radius: 6px;
-                    padding: 6px 16px;
-                    font-size: 12px;
-                    font-weight: 600;
-                }}
-                QPushButton:hover {{
-                    background-color: {s['bg_hover']};
-                    border-color: {COLORS['primary']};
-                }}
-                QPushButton:pressed {{
-                    background-color: {COLORS['bg_selected']};
-                }}
-                QPushButton:disabled {{
-                    background-color: #F8F9FA;
-                    color: {COLORS['text_light']};
-                    border-color: {COLORS['border_light']};
-                }}
-            """)
-        else:
-            self.setStyleSheet(f"""
-                QPushButton {{
-                    background-color: {s['bg']};
-                    color: {s['text']};
-                    border: none;
-                    border-radius: 6px;
-                    padding: 6px 16px;
-                    font-size: 12px;
-                    font-weight: 600;
-                }}
-                QPushButton:hover {{
-                    background-color: {s['bg_hover']};
-                }}
-                QPushButton:pressed {{
-                    background-color: {s['bg']};
-                }}
-                QPushButton:disabled {{
-                    background-color: #E9ECEF;
-                    color: {COLORS['text_light']};
-                }}
-            """)
 
 
 class CleanCard(QFrame):
@@ -169,45 +384,25 @@ class CleanCard(QFrame):
         self._setup_ui()
 
     def _setup_ui(self):
-        self.setStyleSheet(f"""
-            QFrame {{
-                background-color: {COLORS['bg_card']};
-                border: 1px solid {COLORS['border']};
-                border-radius: 8px;
-                padding: 0px;
-            }}
-        """)
-
         layout = QVBoxLayout(self)
         layout.setContentsMargins(0, 0, 0, 0)
         layout.setSpacing(0)
 
         # 标题栏
         title_widget = QWidget()
-        title_widget.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['bg_hover']};
-                border-top-left-radius: 7px;
-                border-top-right-radius: 7px;
-            }}
-        """)
+        title_widget.setObjectName('cardTitleBar')
+        title_widget.setAttribute(Qt.WidgetAttribute.WA_StyledBackground, True)
 
         title_layout = QHBoxLayout(title_widget)
         title_layout.setContentsMargins(12, 10, 12, 10)
 
         icon_label = QLabel(self.icon)
-        icon_label.setStyleSheet("font-size: 14px;")
+        icon_label.setObjectName('cardIcon')
         icon_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         icon_label.setFixedSize(20, 20)
 
         title_label = QLabel(self.title)
-        title_label.setStyleSheet(f"""
-            QLabel {{
-                color: {COLORS['text_primary']};
-                font-size: 13px;
-                font-weight: 700;
-            }}
-        """)
+        title_label.setObjectName('cardTitle')
 
         title_layout.addWidget(icon_label)
         title_layout.addWidget(title_label)
@@ -219,7 +414,7 @@ class CleanCard(QFrame):
         separator = QFrame()
         separator.setFrameShape(QFrame.Shape.HLine)
         separator.setFrameShadow(QFrame.Shadow.Sunken)
-        separator.setStyleSheet(f"QFrame {{ background-color: {COLORS['border']}; max-height: 1px; }}")
+        separator.setObjectName('cardSeparator')
         layout.addWidget(separator)
 
         # 内容区域
@@ -243,57 +438,313 @@ class CleanLineEdit(QLineEdit):
         super().__init__(parent)
         self.setPlaceholderText(placeholder)
         self.setMinimumHeight(30)
-        self._apply_style()
-
-    def _apply_style(self):
-        self.setStyleSheet(f"""
-            QLineEdit {{
-                background-color: {COLORS['bg_input']};
-                border: 2px solid {COLORS['border']};
-                border-radius: 6px;
-                padding: 6px 10px;
-                font-size: 12px;
-                color: {COLORS['text_primary']};
-            }}
-            QLineEdit:focus {{
-                border-color: {COLORS['primary']};
-                background-color: #FFFFFF;
-            }}
-            QLineEdit::placeholder {{
-                color: {COLORS['text_light']};
-            }}
-        """)
 
 
-class CleanListWidget(QListWidget):
+class CleanListView(QListView):
     """清新列表"""
     def __init__(self, parent=None):
         super().__init__(parent)
-        self._apply_style()
-
-    def _apply_style(self):
-        self.setStyleSheet(f"""
-            QListWidget {{
-                background-color: {COLORS['bg_input']};
-                border: 2px solid {COLORS['border']};
-                border-radius: 6px;
-                padding: 4px;
-                font-size: 12px;
-            }}
-            QListWidget::item {{
-                padding: 6px 10px;
-                border-radius: 6px;
-                margin: 1px;
-                background-color: transparent;
-            }}
-            QListWidget::item:hover {{
-                background-color: {COLORS['bg_hover']};
-            }}
-            QListWidget::item:selected {{
-                background-color: {COLORS['primary']};
-                color: white;
-            }}
-        """)
+        # 所有行高度一致，滚动时无需逐项计算尺寸
+        self.setUniformItemSizes(True)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+
+
+class CleanTreeView(QTreeView):
+    """清新树形列表"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setHeaderHidden(True)
+        self.setUniformRowHeights(True)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+
+
+def remaining_text(key, left, count):
+    """省区 / 部门的显示文字（含剩余人数）"""
+    if left == count:
+        return f"  {key}  ({count} 人)"
+    if left > 0:
+        return f"  {key}  (剩余 {left} / {count} 人)"
+    return f"  {key}  (已无可抽人员 / {count} 人)"
+
+
+class ProvinceModel(QStandardItemModel):
+    """省区数据模型
+
+    每一项在自定义角色中保存省区名称、所在部门列、人数和检索文本，
+    勾选状态即为选中状态，读取选中省区时无需解析显示文字。
+    行号与会话中的省区序号一致，剩余人数可按序号直接更新。
+    """
+    KEY_ROLE = Qt.ItemDataRole.UserRole + 1       # 省区名称
+    LEVEL_ROLE = Qt.ItemDataRole.UserRole + 2     # 所在列：四级部门 / 三级部门
+    COUNT_ROLE = Qt.ItemDataRole.UserRole + 3     # 人数
+    SEARCH_ROLE = Qt.ItemDataRole.UserRole + 4    # 检索文本（省区 + 上级部门）
+    REMAINING_ROLE = Qt.ItemDataRole.UserRole + 5  # 剩余可抽人数
+
+    def set_provinces(self, provinces):
+        """重建省区列表
+
+        provinces: [(省区名称, 所在列, 人数, 上级部门), ...]
+        """
+        self.clear()
+        for key, level, count, parent in provinces:
+            item = QStandardItem(f"  {key}  ({count} 人)")
+            item.setFlags(Qt.ItemFlag.ItemIsEnabled)
+            item.setData(Qt.CheckState.Unchecked, Qt.ItemDataRole.CheckStateRole)
+            item.setData(key, self.KEY_ROLE)
+            item.setData(level, self.LEVEL_ROLE)
+            item.setData(count, self.COUNT_ROLE)
+            item.setData(f"{key} {parent or ''}", self.SEARCH_ROLE)
+            item.setData(count, self.REMAINING_ROLE)
+            self.appendRow(item)
+
+    def update_provinces(self, provinces):
+        """分块加载过程中刷新省区列表
+
+        省区不变时只原地更新人数；出现新省区时重建列表，并保留已勾选的省区。
+        """
+        keys = [self.item(row).data(self.KEY_ROLE) for row in range(self.rowCount())]
+        if keys != [key for key, *_ in provinces]:
+            checked = {key for key, _ in self.checked_provinces()}
+            self.set_provinces(provinces)
+            self.set_rows_checked([row for row, (key, *_) in enumerate(provinces) if key in checked], True)
+            return
+        if not provinces:
+            return
+        self.blockSignals(True)
+        try:
+            for row, (key, level, count, parent) in enumerate(provinces):
+                item = self.item(row)
+                item.setText(f"  {key}  ({count} 人)")
+                item.setData(level, self.LEVEL_ROLE)
+                item.setData(count, self.COUNT_ROLE)
+                item.setData(count, self.REMAINING_ROLE)
+        finally:
+            self.blockSignals(False)
+        self.dataChanged.emit(self.index(0, 0), self.index(len(provinces) - 1, 0))
+
+    def set_remaining(self, remaining):
+        """按剩余人数更新显示，已无可抽人员的省区置灰并取消勾选
+
+        只改动剩余人数发生变化的行，最后发出一次 dataChanged 信号。
+        """
+        changed = []
+        self.blockSignals(True)
+        try:
+            for row, left in enumerate(remaining):
+                item = self.item(row)
+                left = int(left)
+                if item.data(self.REMAINING_ROLE) == left:
+                    continue
+                changed.append(row)
+                item.setData(left, self.REMAINING_ROLE)
+                item.setText(remaining_text(item.data(self.KEY_ROLE), left, item.data(self.COUNT_ROLE)))
+                if left == 0:
+                    item.setData(Qt.CheckState.Unchecked, Qt.ItemDataRole.CheckStateRole)
+                item.setEnabled(left > 0)
+        finally:
+            self.blockSignals(False)
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), 0), self.index(max(changed), 0))
+
+    def toggle(self, row):
+        item = self.item(row)
+        if not item.isEnabled():
+            return
+        checked = item.data(Qt.ItemDataRole.CheckStateRole) == Qt.CheckState.Checked
+        item.setData(
+            Qt.CheckState.Unchecked if checked else Qt.CheckState.Checked,
+            Qt.ItemDataRole.CheckStateRole
+        )
+
+    def set_rows_checked(self, rows, checked):
+        """批量设置勾选状态（已置灰的省区不会被勾选），只发出一次 dataChanged 信号"""
+        state = Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked
+        rows = [row for row in rows if not checked or self.item(row).isEnabled()]
+        if not rows:
+            return
+        self.blockSignals(True)
+        try:
+            for row in rows:
+                self.item(row).setData(state, Qt.ItemDataRole.CheckStateRole)
+        finally:
+            self.blockSignals(False)
+        self.dataChanged.emit(
+            self.index(min(rows), 0),
+            self.index(max(rows), 0),
+            [Qt.ItemDataRole.CheckStateRole]
+        )
+
+    def checked_rows(self):
+        return [
+            row for row in range(self.rowCount())
+            if self.item(row).data(Qt.ItemDataRole.CheckStateRole) == Qt.CheckState.Checked
+        ]
+
+    def checked_provinces(self):
+        """返回选中省区 [(省区名称, 所在列), ...]"""
+        return [
+            (self.item(row).data(self.KEY_ROLE), self.item(row).data(self.LEVEL_ROLE))
+            for row in self.checked_rows()
+        ]
+
+
+class DepartmentModel(QStandardItemModel):
+    """部门树数据模型（三级部门 → 四级部门）
+
+    每一项保存部门树节点序号，剩余人数按节点序号直接更新。
+    勾选三级部门即选中其下全部人员，部分勾选时只选中勾选的四级部门。
+    批量改动勾选状态后只发出一次 checksChanged 信号。
+    """
+    NODE_ROLE = Qt.ItemDataRole.UserRole + 6      # 部门树节点序号
+    checksChanged = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.tree = None
+        self._items = []  # 节点序号 → QStandardItem
+
+    def set_tree(self, tree):
+        """按部门树重建模型"""
+        self.clear()
+        self.tree = tree
+        self._items = [None] * len(tree)
+        for root in tree.roots:
+            parent_item = self._make_item(root)
+            for child in tree.children[root]:
+                parent_item.appendRow(self._make_item(child))
+            self.appendRow(parent_item)
+        self.checksChanged.emit()
+
+    def _make_item(self, node):
+        tree = self.tree
+        count = int(tree.counts[node])
+        item = QStandardItem(remaining_text(tree.names[node], count, count))
+        item.setFlags(Qt.ItemFlag.ItemIsEnabled)
+        item.setData(Qt.CheckState.Unchecked, Qt.ItemDataRole.CheckStateRole)
+        item.setData(node, self.NODE_ROLE)
+        item.setData(tree.names[node], ProvinceModel.KEY_ROLE)
+        item.setData(count, ProvinceModel.COUNT_ROLE)
+        item.setData(count, ProvinceModel.REMAINING_ROLE)
+        item.setData(tree.path(node).replace('/', ' '), ProvinceModel.SEARCH_ROLE)
+        self._items[node] = item
+        return item
+
+    def _state(self, item):
+        return item.data(Qt.ItemDataRole.CheckStateRole)
+
+    def _set_state(self, item, state):
+        if self._state(item) != state:
+            item.setData(state, Qt.ItemDataRole.CheckStateRole)
+
+    def _sync_parent(self, parent_item):
+        """按子部门勾选情况更新三级部门的勾选状态
+
+        三级部门下还有未填写四级部门的人员时，子部门全部勾选也只算部分勾选。
+        """
+        node = parent_item.data(self.NODE_ROLE)
+        children = [parent_item.child(row) for row in range(parent_item.rowCount())]
+        has_direct = self.tree.counts[node] > sum(child.data(ProvinceModel.COUNT_ROLE) for child in children)
+        enabled = [child for child in children if child.isEnabled()]
+        checked = sum(self._state(child) == Qt.CheckState.Checked for child in enabled)
+        if enabled and checked == len(enabled) and not has_direct:
+            state = Qt.CheckState.Checked
+        elif checked:
+            state = Qt.CheckState.PartiallyChecked
+        else:
+            state = Qt.CheckState.Unchecked
+        self._set_state(parent_item, state)
+
+    def _batch(self, update):
+        """在屏蔽信号的情况下批量修改，结束后整体刷新一次"""
+        self.blockSignals(True)
+        try:
+            update()
+        finally:
+            self.blockSignals(False)
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, 0))
+            for row in range(self.rowCount()):
+                parent = self.index(row, 0)
+                if self.rowCount(parent):
+                    self.dataChanged.emit(
+                        self.index(0, 0, parent), self.index(self.rowCount(parent) - 1, 0, parent)
+                    )
+        self.checksChanged.emit()
+
+    def toggle(self, item):
+        if not item.isEnabled():
+            return
+        checked = self._state(item) != Qt.CheckState.Checked
+        state = Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked
+
+        def update():
+            parent_item = item.parent()
+            if parent_item is None:
+                self._set_state(item, state)
+                for row in range(item.rowCount()):
+                    child = item.child(row)
+                    if child.isEnabled():
+                        self._set_state(child, state)
+            else:
+                self._set_state(item, state)
+                self._sync_parent(parent_item)
+        self._batch(update)
+
+    def set_roots_checked(self, rows, checked):
+        """批量勾选 / 取消三级部门（连同其下四级部门）"""
+        state = Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked
+
+        def update():
+            for row in rows:
+                item = self.item(row)
+                if checked and not item.isEnabled():
+                    continue
+                self._set_state(item, state)
+                for child_row in range(item.rowCount()):
+                    child = item.child(child_row)
+                    if not checked or child.isEnabled():
+                        self._set_state(child, state)
+        self._batch(update)
+
+    def set_remaining(self, tree):
+        """按部门树剩余人数更新显示，已无可抽人员的部门置灰并取消勾选"""
+        def update():
+            changed_roots = set()
+            for node, item in enumerate(self._items):
+                left = int(tree.remaining[node])
+                if item.data(ProvinceModel.REMAINING_ROLE) == left:
+                    continue
+                item.setData(left, ProvinceModel.REMAINING_ROLE)
+                item.setText(remaining_text(tree.names[node], left, item.data(ProvinceModel.COUNT_ROLE)))
+                item.setEnabled(left > 0)
+                if left == 0:
+                    self._set_state(item, Qt.CheckState.Unchecked)
+                parent = tree.parents[node]
+                changed_roots.add(parent if parent >= 0 else node)
+            # 整个三级部门已勾选时，子部门抽完不影响选择范围
+            for root in changed_roots:
+                if self._state(self._items[root]) == Qt.CheckState.PartiallyChecked:
+                    self._sync_parent(self._items[root])
+        self._batch(update)
+
+    def checked_departments(self):
+        """返回选中部门 [(名称或“三级部门/四级部门”路径, 所在列), ...]"""
+        if self.tree is None:
+            return []
+        selected = []
+        for row in range(self.rowCount()):
+            item = self.item(row)
+            node = item.data(self.NODE_ROLE)
+            if self._state(item) == Qt.CheckState.Checked:
+                selected.append((self.tree.path(node), self.tree.THIRD))
+            elif self._state(item) == Qt.CheckState.PartiallyChecked:
+                for child_row in range(item.rowCount()):
+                    child = item.child(child_row)
+                    if self._state(child) == Qt.CheckState.Checked:
+                        selected.append((self.tree.path(child.data(self.NODE_ROLE)), self.tree.FOURTH))
+        return selected
 
 
 class CleanTableWidget(QTableWidget):
@@ -306,37 +757,6 @@ class CleanTableWidget(QTableWidget):
         self.setColumnCount(5)
         self.setHorizontalHeaderLabels(['序号', 'Excel行号', 'ID', '姓名', '省区'])
 
-        # 设置表格样式
-        self.setStyleSheet(f"""
-            QTableWidget {{
-                background-color: {COLORS['bg_input']};
-                border: 2px solid {COLORS['border']};
-                border-radius: 6px;
-                gridline-color: {COLORS['border_light']};
-            }}
-            QTableWidget::item {{
-                padding: 3px;
-                border-bottom: 1px solid {COLORS['border_light']};
-            }}
-            QTableWidget::item:selected {{
-                background-color: {COLORS['bg_selected']};
-                color: {COLORS['text_primary']};
-            }}
-            QHeaderView::section {{
-                background-color: {COLORS['bg_hover']};
-                color: {COLORS['text_primary']};
-                padding: 5px;
-                border: none;
-                border-bottom: 2px solid {COLORS['border']};
-                font-size: 12px;
-                font-weight: 700;
-            }}
-            QTableCornerButton::section {{
-                background-color: {COLORS['bg_hover']};
-                border: none;
-            }}
-        """)
-
         # 设置行高
         vertical_header = self.verticalHeader()
         vertical_header.setVisible(False)
@@ -362,15 +782,11 @@ class CleanTableWidget(QTableWidget):
 
         # 设置交替行颜色
         self.setAlternatingRowColors(True)
-        self.setStyleSheet(self.styleSheet() + f"""
-            QTableWidget {{
-                alternate-background-color: {COLORS['bg_card']};
-            }}
-        """)
 
-    def add_result_row(self, index, row_num, id_num, name, province):
-        """添加结果行"""
-        row_position = self.rowCount()
+    def add_result_row(self, index, row_num, id_num, name, province, row_position=None):
+        """添加结果行，默认追加到末尾"""
+        if row_position is None:
+            row_position = self.rowCount()
         self.insertRow(row_position)
 
         # 序号
@@ -405,19 +821,299 @@ class CleanTableWidget(QTableWidget):
         item_prov.setForeground(QColor(COLORS['text_secondary']))
         self.setItem(row_position, 4, item_prov)
 
+    def remove_top_rows(self, count):
+        """移除最上方的 count 行（撤销最近的抽签结果）"""
+        for _ in range(min(count, self.rowCount())):
+            self.removeRow(0)
+
+
+class CleanToast(QLabel):
+    """非模态通知：显示在窗口底部，数秒后自动消失，不打断操作"""
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setObjectName('toast')
+        self.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents, True)
+        self.hide()
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.hide)
+
+    def show_message(self, text, msec=3000):
+        self.setText(text)
+        self.adjustSize()
+        parent = self.parentWidget()
+        self.move((parent.width() - self.width()) // 2, parent.height() - self.height() - 30)
+        self.raise_()
+        self.show()
+        self._timer.start(msec)
+
+
+class LotteryAnimationDialog(QDialog):
+    """滚动抽签动画
+
+    中签结果在打开动画前已由抽签流程确定。动画只在预先取出的候选人姓名数组上
+    按屏幕刷新率滚动显示，每帧仅按预生成的随机下标取名字，不再筛选或复制名单。
+    按空格 / 回车或点击按钮停止滚动并揭晓结果，到达预设时长也会自动揭晓。
+    """
+    MAX_SLOTS = 10          # 同时滚动的名字个数上限
+    ROLL_SECONDS = 3        # 自动揭晓前的滚动时长
+    FRAME_BUFFER = 1024     # 预生成的随机下标帧数（循环使用）
+
+    def __init__(self, pool_names, winner_names, parent=None):
+        super().__init__(parent)
+        self.pool_names = pool_names
+        self.winner_names = list(winner_names)
+        self.slots = min(len(self.winner_names), self.MAX_SLOTS)
+        self.frame = 0
+        self.revealed = False
+
+        # 预生成全部帧的随机下标
+        self.frame_indexes = np.random.default_rng().integers(
+            0, len(pool_names), size=(self.FRAME_BUFFER, self.slots)
+        )
+
+        self._setup_ui()
+
+        refresh_rate = self.screen().refreshRate() if self.screen() else 60
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setInterval(max(1, round(1000 / (refresh_rate or 60))))
+        self.timer.timeout.connect(self._next_frame)
+        self.max_frames = int(self.ROLL_SECONDS * (refresh_rate or 60))
+
+    def _setup_ui(self):
+        self.setWindowTitle('🎲 抽签中')
+        self.setMinimumSize(640, 420)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(30, 30, 30, 30)
+        layout.setSpacing(16)
+
+        self.title_label = QLabel(f'🎲 正在从 {len(self.pool_names)} 人中抽取 {len(self.winner_names)} 人...')
+        self.title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.title_label.setObjectName('lotteryTitle')
+        layout.addWidget(self.title_label)
+
+        # 固定尺寸的名字槽位，换字时不触发重新布局
+        grid = QGridLayout()
+        grid.setSpacing(12)
+        columns = 2 if self.slots > 5 else 1
+        self.slot_labels = []
+        for i in range(self.slots):
+            label = QLabel('')
+            label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            label.setFixedSize(260, 56)
+            label.setObjectName('lotterySlot')
+            grid.addWidget(label, i // columns, i % columns)
+            self.slot_labels.append(label)
+        layout.addLayout(grid)
+
+        # 揭晓后显示完整名单
+        self.result_label = QLabel('')
+        self.result_label.setWordWrap(True)
+        self.result_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.result_label.setObjectName('lotteryResult')
+        self.result_label.hide()
+        layout.addWidget(self.result_label)
+
+        layout.addStretch()
+
+        self.stop_btn = CleanButton('⏹ 停！', 'danger')
+        self.stop_btn.setMinimumHeight(44)
+        self.stop_btn.clicked.connect(self.on_stop_clicked)
+        layout.addWidget(self.stop_btn)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.revealed and not self.timer.isActive():
+            self.timer.start()
+
+    def keyPressEvent(self, event):
+        if event.key() in (Qt.Key.Key_Space, Qt.Key.Key_Return, Qt.Key.Key_Enter):
+            self.on_stop_clicked()
+        else:
+            super().keyPressEvent(event)
+
+    def _next_frame(self):
+        indexes = self.frame_indexes[self.frame % self.FRAME_BUFFER]
+        for label, index in zip(self.slot_labels, indexes):
+            label.setText(self.pool_names[index])
+        self.frame += 1
+        if self.frame >= self.max_frames:
+            self.reveal()
+
+    def on_stop_clicked(self):
+        if self.revealed:
+            self.accept()
+        else:
+            self.reveal()
+
+    def reveal(self):
+        """停止滚动，显示预先确定的中签结果"""
+        self.timer.stop()
+        self.revealed = True
+        for label, name in zip(self.slot_labels, self.winner_names):
+            label.setText(name)
+        self.title_label.setText(f'🎉 恭喜以下 {len(self.winner_names)} 位中签！')
+        if len(self.winner_names) > self.slots:
+            self.result_label.setText('、'.join(self.winner_names))
+            self.result_label.show()
+        self.stop_btn.setText('✅ 完成')
+
+
+class EligibilityRuleDialog(QDialog):
+    """资格条件设置
+
+    每列勾选允许的取值（列内为“或”），勾选“排除所选”则改为不含这些取值；
+    各列之间按“全部满足”或“任一满足”组合。勾选变化时立即按位图统计符合条件的人数。
+    """
+
+    MODES = [('and', '同时满足以下全部条件'), ('or', '满足以下任一条件')]
+    VALUE_COLUMNS = 3  # 每列取值复选框的排列列数
+
+    def __init__(self, session, rule=None, parent=None):
+        super().__init__(parent)
+        self.session = session
+        self.groups = {}  # 列名 → (“排除所选”复选框, {取值: 复选框})
+        self._setup_ui()
+        self._load_rule(rule)
+        self._update_count()
+
+    def _setup_ui(self):
+        self.setWindowTitle('🎯 资格条件')
+        self.setMinimumSize(720, 560)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(20, 20, 20, 20)
+        layout.setSpacing(12)
+
+        self.mode_combo = QComboBox()
+        for _, text in self.MODES:
+            self.mode_combo.addItem(text)
+        self.mode_combo.currentIndexChanged.connect(self._update_count)
+        layout.addWidget(self.mode_combo)
+
+        content = QWidget()
+        content_layout = QVBoxLayout(content)
+        content_layout.setContentsMargins(0, 0, 0, 0)
+        content_layout.setSpacing(12)
+        for column, values in self.session.bitmaps.columns():
+            card = CleanCard(column, '🏷️')
+            negate = QCheckBox('排除所选（不含这些取值）')
+            negate.toggled.connect(self._update_count)
+            card.add_widget(negate)
+            grid = QGridLayout()
+            grid.setSpacing(6)
+            boxes = {}
+            for i, (value, count) in enumerate(values):
+                box = QCheckBox(f'{value}（{count} 人）')
+                box.toggled.connect(self._update_count)
+                grid.addWidget(box, i // self.VALUE_COLUMNS, i % self.VALUE_COLUMNS)
+                boxes[value] = box
+            card.add_layout(grid)
+            content_layout.addWidget(card)
+            self.groups[column] = (negate, boxes)
+        content_layout.addStretch()
+
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setFrameShape(QFrame.Shape.NoFrame)
+        scroll.setWidget(content)
+        layout.addWidget(scroll, 1)
+
+        self.count_label = QLabel('')
+        self.count_label.setObjectName('hintLabel')
+        layout.addWidget(self.count_label)
+
+        buttons = QHBoxLayout()
+        clear_btn = CleanButton('清空', 'outline')
+        clear_btn.clicked.connect(self._clear)
+        cancel_btn = CleanButton('取消', 'outline')
+        cancel_btn.clicked.connect(self.reject)
+        ok_btn = CleanButton('✅ 确定')
+        ok_btn.clicked.connect(self.accept)
+        buttons.addWidget(clear_btn)
+        buttons.addStretch()
+        buttons.addWidget(cancel_btn)
+        buttons.addWidget(ok_btn)
+        layout.addLayout(buttons)
+
+    def _load_rule(self, rule):
+        """按已有条件勾选；只识别本对话框生成的形式（各列取值的与 / 或组合）"""
+        if rule is None:
+            return
+        expression = rule.expression
+        op = 'and' if 'and' in expression else 'or' if 'or' in expression else None
+        items = expression[op] if op else [expression]
+        self.mode_combo.setCurrentIndex(1 if op == 'or' else 0)
+        for item in items:
+            negated = 'not' in item
+            item = item.get('not', item)
+            if 'column' not in item or item['column'] not in self.groups:
+                continue
+            negate, boxes = self.groups[item['column']]
+            negate.setChecked(negated)
+            for value in item['values']:
+                if value in boxes:
+                    boxes[value].setChecked(True)
+
+    def _clear(self):
+        for negate, boxes in self.groups.values():
+            negate.setChecked(False)
+            for box in boxes.values():
+                box.setChecked(False)
+
+    def rule(self):
+        """勾选结果对应的资格条件，未勾选任何取值时返回 None"""
+        items = []
+        for column, (negate, boxes) in self.groups.items():
+            values = [value for value, box in boxes.items() if box.isChecked()]
+            if not values:
+                continue
+            item = {'column': column, 'values': values}
+            items.append({'not': item} if negate.isChecked() else item)
+        if not items:
+            return None
+        if len(items) == 1:
+            return EligibilityRule(items[0])
+        return EligibilityRule({self.MODES[self.mode_combo.currentIndex()][0]: items})
+
+    def _update_count(self):
+        rule = self.rule()
+        if rule is None:
+            self.count_label.setText(f'未设置条件：全部 {len(self.session.df)} 人均可参与抽取')
+            return
+        start = time.perf_counter()
+        matched, available = self.session.rule_counts(rule)
+        micros = (time.perf_counter() - start) * 1e6
+        self.count_label.setText(
+            f'符合条件 {matched} 人，其中未中签可抽 {available} 人（位图计算 {micros:.0f} µs）\n{rule.describe()}'
+        )
+
 
 class RandomDrawApp(QMainWindow):
+    # 超过此大小的 xlsx / xlsm / csv 名单分块加载，边读边显示省区
+    PROGRESSIVE_LOAD_BYTES = 5 * 1024 * 1024
+
+    SEARCH_LIMIT = 5  # 查询结果最多显示条数
+
     def __init__(self):
         super().__init__()
+        self.session = None  # 当前抽签会话
         self.df = None
         self.provinces = []
-        self.drawn_result = None
-        self.original_df = None
-        self.all_drawn_people = None  # 所有已抽中的人员
-        self.draw_count = 0  # 抽签次数
         self.export_file_path = None  # 导出文件路径
-        self.is_ended = False  # 是否已结束抽签
-
+        self.exclusion_index = ExclusionIndex()  # 往期中签排除索引
+        self.session_cache = SessionCache()  # 最近加载的名单及会话，切换回来时继续上次进度
+        self.export_paths = {}  # 名单绝对路径 -> 该会话的自动导出文件路径
+        self.loader = None  # 正在分块加载的名单
+        self.eligibility_rule = None  # 资格条件（EligibilityRule），None 表示不限
+        self.hooks = HookRunner()  # 插件（“插件”目录），在后台线程中执行，不影响抽签
+        self.hooks.load_plugins()
+
+        apply_theme(QApplication.instance())
         self._setup_window()
         self._setup_ui()
 
@@ -429,11 +1125,6 @@ class RandomDrawApp(QMainWindow):
     def _setup_window(self):
         self.setWindowTitle('🎲 抽签')
         self.setGeometry(100, 100, 760, 700)
-        self.setStyleSheet(f"""
-            QMainWindow {{
-                background-color: {COLORS['bg_main']};
-            }}
-        """)
 
     def _setup_ui(self):
         # 主容器
@@ -446,13 +1137,8 @@ class RandomDrawApp(QMainWindow):
 
         # 标题区域
         title_container = QWidget()
-        title_container.setStyleSheet(f"""
-            QWidget {{
-                background-color: {COLORS['primary']};
-                border-radius: 6px;
-                padding: 6px 12px;
-            }}
-        """)
+        title_container.setObjectName('titleBar')
+        title_container.setAttribute(Qt.WidgetAttribute.WA_StyledBackground, True)
 
         title_layout = QVBoxLayout(title_container)
         title_layout.setContentsMargins(0, 0, 0, 0)
@@ -460,14 +1146,7 @@ class RandomDrawApp(QMainWindow):
 
         title_label = QLabel('🎲 抽签')
         title_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        title_label.setStyleSheet(f"""
-            QLabel {{
-                color: white;
-                font-size: 16px;
-                font-weight: 700;
-                letter-spacing: 1px;
-            }}
-        """)
+        title_label.setObjectName('titleLabel')
 
         title_layout.addWidget(title_label)
 
@@ -491,23 +1170,54 @@ class RandomDrawApp(QMainWindow):
         load_btn.setMinimumWidth(70)
         load_btn.clicked.connect(self.load_selected_file)
 
+        # 直读抽签：不加载名单，顺序读一遍文件，每个省区直接抽取
+        direct_btn = CleanButton('⚡ 直读抽签', 'outline')
+        direct_btn.setToolTip('不加载名单，顺序读取一遍文件，每个省区各抽取“抽取人数”人，适合超大名单')
+        direct_btn.clicked.connect(self.direct_draw)
+
         file_input_layout.addWidget(self.file_path_edit, 1)
         file_input_layout.addWidget(browse_btn)
         file_input_layout.addWidget(load_btn)
+        file_input_layout.addWidget(direct_btn)
         file_card.add_layout(file_input_layout)
 
+        # 往期中签排除
+        history_layout = QHBoxLayout()
+        history_label = QLabel('🚫 排除近')
+        self.history_months_edit = CleanLineEdit('3')
+        self.history_months_edit.setText('3')
+        self.history_months_edit.setFixedWidth(50)
+        history_unit_label = QLabel('个月的中签者')
+
+        import_history_btn = CleanButton('导入往期结果', 'outline')
+        import_history_btn.clicked.connect(self.import_history)
+
+        self.history_status_label = QLabel('')
+        self.history_status_label.setObjectName('hintLabel')
+
+        history_layout.addWidget(history_label)
+        history_layout.addWidget(self.history_months_edit)
+        history_layout.addWidget(history_unit_label)
+        history_layout.addWidget(import_history_btn)
+        history_layout.addStretch()
+        history_layout.addWidget(self.history_status_label)
+        file_card.add_layout(history_layout)
+
+        # 插件状态（鼠标悬停查看各插件耗时、失败和超时次数）
+        self.plugin_label = QLabel('')
+        self.plugin_label.setObjectName('hintLabel')
+        history_layout.insertWidget(history_layout.count() - 1, self.plugin_label)
+        plugins_enabled = bool(self.hooks) or bool(self.hooks.errors)
+        self.plugin_label.setVisible(plugins_enabled)
+        self.plugin_timer = QTimer(self)
+        self.plugin_timer.timeout.connect(self._update_plugin_label)
+        if plugins_enabled:
+            self.plugin_timer.start(2000)
+        self._update_plugin_label()
+
         # 状态标签
         self.status_label = QLabel('⏳ 等待加载文件...')
-        self.status_label.setStyleSheet(f"""
-            QLabel {{
-                color: {COLORS['text_secondary']};
-                font-size: 11px;
-                padding: 6px 10px;
-                background-color: {COLORS['bg_input']};
-                border-radius: 6px;
-                border: 1px solid {COLORS['border']};
-            }}
-        """)
+        set_status(self.status_label, 'idle')
         file_card.add_widget(self.status_label)
 
         grid_layout.addWidget(file_card, 0, 0, 1, 2)
@@ -529,16 +1239,7 @@ class RandomDrawApp(QMainWindow):
         clear_btn.clicked.connect(self.clear_selection)
 
         self.selected_count_label = QLabel('已选: 0 个省区')
-        self.selected_count_label.setStyleSheet(f"""
-            QLabel {{
-                color: {COLORS['text_white']};
-                font-size: 11px;
-                font-weight: 600;
-                padding: 4px 10px;
-                background-color: {COLORS['primary']};
-                border-radius: 12px;
-            }}
-        """)
+        self.selected_count_label.setObjectName('countBadge')
 
         btn_layout.addWidget(select_all_btn)
         btn_layout.addWidget(clear_btn)
@@ -547,12 +1248,45 @@ class RandomDrawApp(QMainWindow):
 
         province_card.add_widget(btn_row_widget)
 
-        # 省区列表
-        self.province_list = CleanListWidget()
-        self.province_list.setMaximumHeight(120)
-        self.province_list.setSelectionMode(QListWidget.SelectionMode.MultiSelection)
-        self.province_list.itemSelectionChanged.connect(self.on_selection_changed)
-        province_card.add_widget(self.province_list)
+        # 省区筛选框（支持 * ? 通配符，也会匹配上级部门，如输入“华东”）
+        self.province_filter_edit = CleanLineEdit('🔍 输入关键字筛选省区...')
+        self.province_filter_edit.textChanged.connect(self.on_province_filter_changed)
+        province_card.add_widget(self.province_filter_edit)
+
+        # 省区列表：数据模型 + 排序筛选代理
+        self.province_model = ProvinceModel(self)
+        self.province_model.dataChanged.connect(self.on_selection_changed)
+
+        self.province_proxy = QSortFilterProxyModel(self)
+        self.province_proxy.setSourceModel(self.province_model)
+        self.province_proxy.setFilterRole(ProvinceModel.SEARCH_ROLE)
+        self.province_proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.province_proxy.setSortRole(ProvinceModel.KEY_ROLE)
+
+        self.province_list = CleanListView()
+        self.province_list.setMinimumHeight(120)
+        self.province_list.setModel(self.province_proxy)
+        self.province_list.clicked.connect(self.on_province_clicked)
+
+        # 部门树：三级部门 → 四级部门，可在任意层级勾选
+        self.department_model = DepartmentModel(self)
+        self.department_model.checksChanged.connect(self.on_selection_changed)
+
+        self.department_proxy = QSortFilterProxyModel(self)
+        self.department_proxy.setSourceModel(self.department_model)
+        self.department_proxy.setFilterRole(ProvinceModel.SEARCH_ROLE)
+        self.department_proxy.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.department_proxy.setRecursiveFilteringEnabled(True)
+
+        self.department_tree = CleanTreeView()
+        self.department_tree.setMinimumHeight(120)
+        self.department_tree.setModel(self.department_proxy)
+        self.department_tree.clicked.connect(self.on_department_clicked)
+
+        self.selection_tabs = QTabWidget()
+        self.selection_tabs.addTab(self.province_list, '省区')
+        self.selection_tabs.addTab(self.department_tree, '部门')
+        province_card.add_widget(self.selection_tabs)
 
         # 添加弹性空间，使内容向上对齐
         province_card.content_layout.addStretch()
@@ -568,24 +1302,93 @@ class RandomDrawApp(QMainWindow):
         count_layout.setSpacing(8)
 
         count_label = QLabel('📊 抽取人数：')
-        count_label.setStyleSheet(f"""
-            QLabel {{
-                color: {COLORS['text_primary']};
-                font-size: 13px;
-                font-weight: 700;
-                padding: 4px 0px;
-            }}
-        """)
+        count_label.setObjectName('fieldLabel')
 
         self.count_input = CleanLineEdit('5')
         self.count_input.setFixedWidth(80)
 
+        self.animation_check = QCheckBox('🎬 滚动动画')
+
         count_layout.addWidget(count_label)
         count_layout.addWidget(self.count_input)
         count_layout.addStretch()
+        count_layout.addWidget(self.animation_check)
 
         count_card.add_widget(count_row)
 
+        # 连续抽取轮数：多轮依次抽完后统一刷新表格并导出一次
+        rounds_row = QWidget()
+        rounds_layout = QHBoxLayout(rounds_row)
+        rounds_layout.setContentsMargins(0, 0, 0, 0)
+        rounds_layout.setSpacing(8)
+
+        rounds_label = QLabel('🔁 连续轮数：')
+        rounds_label.setObjectName('fieldLabel')
+
+        self.rounds_input = CleanLineEdit('1')
+        self.rounds_input.setText('1')
+        self.rounds_input.setFixedWidth(80)
+
+        shortcut_label = QLabel('Ctrl+Enter / F5 抽下一轮')
+        shortcut_label.setObjectName('hintLabel')
+
+        rounds_layout.addWidget(rounds_label)
+        rounds_layout.addWidget(self.rounds_input)
+        rounds_layout.addStretch()
+        rounds_layout.addWidget(shortcut_label)
+
+        count_card.add_widget(rounds_row)
+
+        # 部门分布限制：留空表示不限制
+        rules_row = QWidget()
+        rules_layout = QHBoxLayout(rules_row)
+        rules_layout.setContentsMargins(0, 0, 0, 0)
+        rules_layout.setSpacing(8)
+
+        max_label = QLabel('⚖️ 同一四级部门最多')
+        max_label.setObjectName('fieldLabel')
+        self.max_per_input = CleanLineEdit('不限')
+        self.max_per_input.setFixedWidth(60)
+        min_label = QLabel('人，每个三级部门至少')
+        min_label.setObjectName('fieldLabel')
+        self.min_per_input = CleanLineEdit('不限')
+        self.min_per_input.setFixedWidth(60)
+        unit_label = QLabel('人')
+        unit_label.setObjectName('fieldLabel')
+
+        rules_layout.addWidget(max_label)
+        rules_layout.addWidget(self.max_per_input)
+        rules_layout.addWidget(min_label)
+        rules_layout.addWidget(self.min_per_input)
+        rules_layout.addWidget(unit_label)
+        rules_layout.addStretch()
+
+        count_card.add_widget(rules_row)
+
+        # 资格条件：按职级、入职年份、是否驻场等列限定可抽人员
+        eligibility_row = QWidget()
+        eligibility_layout = QHBoxLayout(eligibility_row)
+        eligibility_layout.setContentsMargins(0, 0, 0, 0)
+        eligibility_layout.setSpacing(8)
+
+        eligibility_label = QLabel('🎯 资格条件：')
+        eligibility_label.setObjectName('fieldLabel')
+        self.rule_label = QLabel('不限')
+        self.rule_label.setObjectName('hintLabel')
+        self.rule_label.setWordWrap(True)
+        rule_btn = CleanButton('设置', 'outline')
+        rule_btn.clicked.connect(self.edit_eligibility_rule)
+        self.clear_rule_btn = CleanButton('清除', 'outline')
+        self.clear_rule_btn.clicked.connect(lambda: self._set_eligibility_rule(None))
+        self.clear_rule_btn.setEnabled(False)
+
+        eligibility_layout.addWidget(eligibility_label)
+        eligibility_layout.addWidget(self.rule_label, 1)
+        eligibility_layout.addWidget(rule_btn)
+        eligibility_layout.addWidget(self.clear_rule_btn)
+
+        count_card.add_widget(eligibility_row)
+
         # 操作按钮
         action_row = QWidget()
         action_layout = QVBoxLayout(action_row)
@@ -621,9 +1424,35 @@ class RandomDrawApp(QMainWindow):
         self.end_btn.clicked.connect(self.end_draw)
         self.end_btn.setEnabled(False)
 
+        # 第三行：撤销 / 重做
+        undo_row_widget = QWidget()
+        undo_row_layout = QHBoxLayout(undo_row_widget)
+        undo_row_layout.setContentsMargins(0, 0, 0, 0)
+        undo_row_layout.setSpacing(10)
+
+        self.undo_btn = CleanButton('↩ 撤销本轮', 'outline')
+        self.undo_btn.setToolTip('撤销最近一轮抽签（Ctrl+Z）')
+        self.undo_btn.clicked.connect(self.undo_draw)
+        self.undo_btn.setEnabled(False)
+
+        self.redo_btn = CleanButton('↪ 重做', 'outline')
+        self.redo_btn.setToolTip('恢复刚撤销的一轮（Ctrl+Y）')
+        self.redo_btn.clicked.connect(self.redo_draw)
+        self.redo_btn.setEnabled(False)
+
+        self.split_export_btn = CleanButton('🗂 分省区导出', 'outline')
+        self.split_export_btn.setToolTip('每个省区单独导出一个结果文件，并生成汇总清单')
+        self.split_export_btn.clicked.connect(self.export_by_province)
+        self.split_export_btn.setEnabled(False)
+
+        undo_row_layout.addWidget(self.undo_btn)
+        undo_row_layout.addWidget(self.redo_btn)
+        undo_row_layout.addWidget(self.split_export_btn)
+
         action_layout.addWidget(first_row_widget)
         action_layout.addWidget(self.end_btn)
         action_layout.setAlignment(self.end_btn, Qt.AlignmentFlag.AlignCenter)
+        action_layout.addWidget(undo_row_widget)
 
         count_card.add_widget(action_row)
 
@@ -639,30 +1468,51 @@ class RandomDrawApp(QMainWindow):
 
         # 结果统计
         self.result_stats_label = QLabel('💡 提示：请先选择省区并开始抽签')
-        self.result_stats_label.setStyleSheet(f"""
-            QLabel {{
-                color: {COLORS['text_secondary']};
-                font-size: 11px;
-                padding: 6px 10px;
-                background-color: {COLORS['bg_input']};
-                border-radius: 6px;
-                border: 1px solid {COLORS['border']};
-            }}
-        """)
+        set_status(self.result_stats_label, 'idle')
         result_card.add_widget(self.result_stats_label)
 
+        # 人员查询（“我抽中了吗？”）：按姓名、拼音首字母或员工 ID 查找
+        self.search_edit = CleanLineEdit('🔎 查询姓名 / 员工 ID，查看是否中签...')
+        self.search_edit.textChanged.connect(self.on_search_changed)
+        result_card.add_widget(self.search_edit)
+
+        self.search_result_label = QLabel('')
+        self.search_result_label.setObjectName('hintLabel')
+        self.search_result_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        self.search_result_label.hide()
+        result_card.add_widget(self.search_result_label)
+
         # 结果表格
         self.result_table = CleanTableWidget()
         result_card.add_widget(self.result_table)
 
         main_layout.addWidget(result_card, 8)
 
+        # 非模态通知
+        self.toast = CleanToast(self)
+
+        # 快捷键：抽下一轮
+        for key in ('Ctrl+Return', 'Ctrl+Enter', 'F5'):
+            shortcut = QShortcut(QKeySequence(key), self)
+            shortcut.activated.connect(self.on_draw_shortcut)
+
+        # 快捷键：撤销 / 重做
+        QShortcut(QKeySequence.StandardKey.Undo, self).activated.connect(self.undo_draw)
+        # 重做：平台默认按键加上 Ctrl+Y、Ctrl+Shift+Z，去重后放在同一个快捷键上（重复注册的按键会互相冲突而失效）
+        redo_keys = QKeySequence.keyBindings(QKeySequence.StandardKey.Redo)
+        for key in ('Ctrl+Y', 'Ctrl+Shift+Z'):
+            if QKeySequence(key) not in redo_keys:
+                redo_keys.append(QKeySequence(key))
+        redo_shortcut = QShortcut(self)
+        redo_shortcut.setKeys(redo_keys)
+        redo_shortcut.activated.connect(self.redo_draw)
+
     def browse_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
             self,
             '选择 Excel 文件',
             '',
-            'Excel 文件 (*.xlsx *.xls);;所有文件 (*)'
+            '名单文件 (*.xlsx *.xlsm *.xls *.csv *.arrow *.feather);;所有文件 (*)'
         )
         if file_path:
             self.file_path_edit.setText(file_path)
@@ -675,234 +1525,558 @@ class RandomDrawApp(QMainWindow):
 
         self.load_excel(file_path)
 
+    def direct_draw(self):
+        """直读抽签：顺序读取一遍名单文件，每个省区抽取“抽取人数”人并保存结果，不建立抽签会话"""
+        file_path = self.file_path_edit.text()
+        if not file_path:
+            QMessageBox.warning(self, '提示', '请先选择文件')
+            return
+        try:
+            count = int(self.count_input.text())
+            if count < 1:
+                raise ValueError
+        except ValueError:
+            QMessageBox.warning(self, '⚠️ 提示', '请输入有效的抽取人数')
+            return
+
+        text, ok = QInputDialog.getText(
+            self, '⚡ 直读抽签',
+            f'不加载名单，顺序读取一遍文件，每个省区抽取 {count} 人。\n'
+            f'要抽取的省区（可用 * 通配，多个用逗号分隔，留空为全部省区）：'
+        )
+        if not ok:
+            return
+        patterns = [pattern for pattern in re.split(r'[,，\s]+', text) if pattern]
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        output, _ = QFileDialog.getSaveFileName(
+            self, '保存直读抽签结果', f'抽签结果_直读_{timestamp}.xlsx', EXPORT_FILTER
+        )
+        if not output:
+            return
+
+        progress = QProgressDialog('正在读取名单...', '取消', 0, 0, self)
+        progress.setWindowTitle('⚡ 直读抽签')
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.show()
+        QApplication.processEvents()
+
+        def on_progress(rows):
+            progress.setLabelText(f'已读取 {rows} 行...')
+            QApplication.processEvents()
+            if progress.wasCanceled():
+                raise DrawError('已取消直读抽签')
+
+        start = time.perf_counter()
+        try:
+            winners, pools, rows, seed = reservoir_draw(
+                file_path, count, patterns or None, self.exclusion_index.active_ids(), progress=on_progress
+            )
+            write_frame(output, winners)
+        except DrawError as e:
+            QMessageBox.warning(self, '⚠️ 提示', str(e))
+            return
+        except Exception as e:
+            QMessageBox.critical(self, '❌ 直读抽签失败', f'直读抽签失败：\n{str(e)}')
+            return
+        finally:
+            progress.close()
+
+        lines = [
+            f'{province}：从 {pool} 人中抽取 {int((winners["省区"] == province).sum())} 人'
+            for province, pool in list(pools.items())[:10]
+        ]
+        if len(pools) > 10:
+            lines.append(f'…… 共 {len(pools)} 个省区')
+        QMessageBox.information(
+            self,
+            '✅ 直读抽签完成',
+            f'读取 {rows} 行，用时 {time.perf_counter() - start:.2f} 秒\n'
+            f'🎯 共抽中 {len(winners)} 人\n\n' + '\n'.join(lines) +
+            f'\n\n📁 结果已保存到：\n{output}\n🔑 种子：{seed}（可用 直读抽签.py --seed 复现）'
+        )
+
+    def _progressive(self, file_path):
+        """是否分块加载：大文件且格式支持逐行读取，且没有可继续的缓存会话"""
+        if os.path.splitext(file_path)[1].lower() not in ('.xlsx', '.xlsm', '.csv'):
+            return False
+        if os.path.getsize(file_path) < self.PROGRESSIVE_LOAD_BYTES:
+            return False
+        cached = self.session_cache.get(file_path)
+        return cached is None or cached.is_ended
+
+    def _cancel_loading(self):
+        if self.loader is not None:
+            self.loader.close()
+            self.loader = None
+
     def load_excel(self, file_path):
+        self._cancel_loading()
         try:
-            # 读取 Excel 文件
-            self.df = pd.read_excel(file_path)
-            self.original_df = self.df.copy()
-
-            # 获取省区列表
-            fourth_level_provinces = [
-                dept for dept in self.df['四级部门'].dropna().unique().tolist()
-                if '省区' in dept
-            ]
-            third_level_provinces = [
-                dept for dept in self.df['三级部门'].dropna().unique().tolist()
-                if '独立省区' in dept
-            ]
+            if self.session is not None:
+                # 记下当前会话的导出文件，切换回来时继续写入同一文件
+                self.export_paths[os.path.abspath(self.session.file_path)] = self.export_file_path
+                if os.path.abspath(file_path) == os.path.abspath(self.session.file_path):
+                    # 重新加载当前文件：开始新的一场
+                    self.session_cache.discard(file_path)
+
+            if self._progressive(file_path):
+                self._start_progressive_load(file_path)
+                return
+
+            # 读取 Excel 文件，开始新的抽签会话（同时生成往期排除掩码）；最近加载过的名单直接取缓存
+            session, resumed = self.session_cache.load(file_path, self.exclusion_index)
+            self._show_session(file_path, session, resumed)
+
+        except Exception as e:
+            QMessageBox.critical(self, '❌ 加载失败', f'加载 Excel 文件失败：\n{str(e)}')
+
+    def _start_progressive_load(self, file_path):
+        """开始分块加载：清空当前会话，每读完一块刷新一次省区列表"""
+        self.loader = ChunkedRosterLoader(file_path)
+        self.session = None
+        self.df = None
+        self.provinces = []
+        self.export_file_path = None
+        self.province_model.set_provinces([])
+        self.department_model.clear()
+        self.result_table.setRowCount(0)
+        self.on_selection_changed()
+        self._update_action_buttons()
+        self.status_label.setText(f'⏳ 正在加载 {os.path.basename(file_path)}…')
+        set_status(self.status_label, 'info')
+        self.result_stats_label.setText('⏳ 名单加载中，可先勾选省区，加载完成后即可抽签')
+        set_status(self.result_stats_label, 'info')
+        QTimer.singleShot(0, self._load_next_chunk)
+
+    def _load_next_chunk(self):
+        """读取下一块名单；读完后建立会话。块与块之间返回事件循环，界面保持可操作"""
+        loader = self.loader
+        if loader is None:
+            return
+        try:
+            if loader.step():
+                self.province_model.update_provinces(loader.provinces)
+                self.province_proxy.sort(0)
+                self.status_label.setText(
+                    f'⏳ 正在加载：已读取 {loader.rows} 人，{self.province_model.rowCount()} 个省区（可先勾选省区）'
+                )
+                QTimer.singleShot(0, self._load_next_chunk)
+                return
+            self.loader = None
+            session = loader.session(self.exclusion_index)
+            self.session_cache.put(session)
+            self._show_session(loader.file_path, session, False, keep_checked=True)
+        except Exception as e:
+            self.loader = None
+            self.status_label.setText('❌ 加载失败')
+            set_status(self.status_label, 'danger')
+            QMessageBox.critical(self, '❌ 加载失败', f'加载 Excel 文件失败：\n{str(e)}')
+
+    def _show_session(self, file_path, session, resumed, keep_checked=False):
+        """切换到加载好的会话，刷新省区列表、部门树、结果表格和状态
+
+        keep_checked 为 True 时（分块加载完成）保留加载过程中已勾选的省区。
+        """
+        self.session = session
+        self.df = self.session.df
+        if resumed:
+            mask = self.exclusion_index.mask_for(self.session.keys)
+            if not np.array_equal(mask, self.session.excluded):
+                self.session.excluded = mask
+        self._update_history_label()
+
+        # 获取省区列表（按部门列一次性统计人数）
+        self.provinces = [province for province, *_ in self.session.provinces]
+
+        # 更新省区列表
+        if keep_checked:
+            self.province_model.update_provinces(self.session.provinces)
+        else:
+            self.province_model.set_provinces(self.session.provinces)
+        self.department_model.set_tree(self.session.tree)
+        self._refresh_remaining()
+        self.province_proxy.sort(0)
+
+        # 建立姓名 / 员工 ID 检索索引
+        self.session.search_index
+        self.on_selection_changed()
+
+        # 清空上一场的累计结果（继续的会话沿用原导出文件）
+        self.export_file_path = self.export_paths.get(os.path.abspath(file_path)) if resumed else None
+        self._update_action_buttons()
+
+        # 更新状态
+        total_count = len(self.df)
+        self.status_label.setText(
+            f'✅ 已加载：{total_count} 人，{len(self.provinces)} 个省区'
+            f'（{self.session.backend}，{self.session.load_seconds:.2f} 秒）'
+        )
+        set_status(self.status_label, 'success')
+
+        # 清空结果；继续的会话重新列出已抽轮次
+        self.result_table.setRowCount(0)
+        if resumed:
+            self._prepend_rounds(self.session.rounds)
+            self.status_label.setText(f'{self.status_label.text()}  ⚡ 已从缓存恢复')
+            self.result_stats_label.setText(
+                f'⚡ 已恢复上次进度：{self.session.draw_count} 次抽签\n📊 累计抽取：{self.session.drawn_total} 人'
+            )
+            set_status(self.result_stats_label, 'info')
+            self.toast.show_message(f'⚡ 已切换到 {os.path.basename(file_path)}，继续第{self.session.draw_count + 1}次抽签')
+            return
+        self.result_stats_label.setText(f'📊 数据已加载，共 {total_count} 人，{len(self.provinces)} 个省区')
+        set_status(self.result_stats_label, 'info')
+        if self.hooks:
+            self.hooks.emit('on_load', self.session.load_event())
+
+        message = f'成功加载 Excel 文件！\n\n📊 总人数：{total_count}\n🏢 省区数：{len(self.provinces)}'
+        if self.session.duplicates:
+            # 重复 ID 会同时被排除 / 同时被检索到，提示核对名单
+            self.status_label.setText(
+                f'{self.status_label.text()}  ⚠️ {len(self.session.duplicates)} 个员工 ID 重复'
+            )
+            set_status(self.status_label, 'warning')
+            message += (
+                f'\n\n⚠️ 发现 {len(self.session.duplicates)} 个重复员工 ID，请核对名单：\n'
+                f'{self.session.duplicate_summary()}'
+            )
+        QMessageBox.information(self, '✅ 加载成功', message)
+
+    def _update_history_label(self):
+        self.history_status_label.setText(f'往期排除：{int(self.session.excluded.sum())} 人')
+
+    def _refresh_history_mask(self):
+        """根据排除索引重新生成当前名单的排除掩码"""
+        if self.session is None:
+            return
+        self.session.excluded = self.exclusion_index.mask_for(self.session.keys)
+        self._update_history_label()
+        self._refresh_remaining()
 
-            # 合并并去重
-            all_provinces = fourth_level_provinces + third_level_provinces
-            self.provinces = sorted(list(set(all_provinces)))
-
-            # 更新省区列表
-            self.province_list.clear()
-            for province in self.provinces:
-                if province in fourth_level_provinces:
-                    count = len(self.df[self.df['四级部门'] == province])
-                else:
-                    count = len(self.df[self.df['三级部门'] == province])
-
-                item_text = f"  {province}  ({count} 人)"
-                self.province_list.addItem(item_text)
-
-            # 更新状态
-            total_count = len(self.df)
-            self.status_label.setText(f'✅ 已加载：{total_count} 人，{len(self.provinces)} 个省区')
-            self.status_label.setStyleSheet(f"""
-                QLabel {{
-                    color: {COLORS['success_text']};
-                    font-size: 13px;
-                    padding: 10px 14px;
-                    background-color: {COLORS['success']};
-                    border-radius: 8px;
-                    border: 1px solid {COLORS['success_dark']};
-                    font-weight: 600;
-                }}
-            """)
-
-            # 清空结果
-            self.result_table.setRowCount(0)
-            self.result_stats_label.setText(f'📊 数据已加载，共 {total_count} 人，{len(self.provinces)} 个省区')
-            self.result_stats_label.setStyleSheet(f"""
-                QLabel {{
-                    color: {COLORS['primary_dark']};
-                    font-size: 13px;
-                    padding: 10px 14px;
-                    background-color: {COLORS['bg_selected']};
-                    border-radius: 8px;
-                    border: 1px solid {COLORS['primary']};
-                    font-weight: 600;
-                }}
-            """)
+    def import_history(self):
+        """导入往期结果文件到排除索引"""
+        try:
+            months = int(self.history_months_edit.text())
+            if months < 1:
+                raise ValueError
+        except ValueError:
+            QMessageBox.warning(self, '⚠️ 提示', '请输入有效的排除月数')
+            return
 
+        file_paths, _ = QFileDialog.getOpenFileNames(
+            self,
+            '选择往期结果文件',
+            '',
+            'Excel/CSV 文件 (*.xlsx *.xls *.csv);;所有文件 (*)'
+        )
+        if not file_paths:
+            return
+
+        try:
+            imported = sum(
+                self.exclusion_index.import_result_file(file_path, months)
+                for file_path in file_paths
+            )
+            self._refresh_history_mask()
             QMessageBox.information(
                 self,
-                '✅ 加载成功',
-                f'成功加载 Excel 文件！\n\n📊 总人数：{total_count}\n🏢 省区数：{len(self.provinces)}'
+                '✅ 导入成功',
+                f'已从 {len(file_paths)} 个文件导入 {imported} 名中签人员\n排除期：中签后 {months} 个月'
             )
-
         except Exception as e:
-            QMessageBox.critical(self, '❌ 加载失败', f'加载 Excel 文件失败：\n{str(e)}')
+            QMessageBox.critical(self, '❌ 导入失败', f'导入往期结果失败：\n{str(e)}')
+
+    def _refresh_remaining(self):
+        """按会话的剩余人数刷新省区列表和部门树"""
+        self.province_model.set_remaining(self.session.remaining)
+        self.department_model.set_remaining(self.session.tree)
 
-    def on_selection_changed(self):
+    def selected_units(self):
+        """本轮选择的范围：勾选的省区和部门 [(名称, 所在列), ...]"""
+        units = self.province_model.checked_provinces()
+        units += [unit for unit in self.department_model.checked_departments() if unit not in units]
+        return units
+
+    def on_selection_changed(self, *args):
         """处理选择变化"""
-        selected_items = self.province_list.selectedItems()
-        count = len(selected_items)
-        self.selected_count_label.setText(f'已选: {count} 个省区')
+        count = len(self.selected_units())
+        self.selected_count_label.setText(f'已选: {count} 项')
 
         # 更新按钮状态
-        self.draw_btn.setEnabled(count > 0 and self.df is not None)
+        self.draw_btn.setEnabled(
+            count > 0 and self.session is not None and not self.session.is_ended
+        )
+        self._refresh_search()
+
+    def on_search_changed(self, text):
+        self._refresh_search()
+
+    def _refresh_search(self):
+        """按查询框内容显示匹配人员及其抽签状态（抽签、撤销、改选省区后同步刷新）"""
+        query = self.search_edit.text().strip()
+        if not query or self.session is None:
+            self.search_result_label.hide()
+            return
+
+        matches = self.session.search(
+            query, self.selected_units(), self.SEARCH_LIMIT + 1
+        )
+        if not matches:
+            self.search_result_label.setText(f'未找到“{query}”')
+        else:
+            ids = self.df['员工 ID'].to_numpy()
+            labels = self.session.labels
+            lines = [
+                f'{self.session.names[position]}（{ids[position]}）· {labels[position]} · {status}'
+                for position, status in matches[:self.SEARCH_LIMIT]
+            ]
+            if len(matches) > self.SEARCH_LIMIT:
+                lines.append(f'…… 仅显示前 {self.SEARCH_LIMIT} 条，请输入更完整的姓名或 ID')
+            self.search_result_label.setText('\n'.join(lines))
+        self.search_result_label.show()
+
+    def on_province_clicked(self, proxy_index):
+        """点击省区切换选中状态"""
+        self.province_model.toggle(self.province_proxy.mapToSource(proxy_index).row())
+
+    def on_department_clicked(self, proxy_index):
+        """点击部门切换选中状态（三级部门连同其下四级部门）"""
+        source = self.department_proxy.mapToSource(proxy_index)
+        self.department_model.toggle(self.department_model.itemFromIndex(source))
+
+    def on_province_filter_changed(self, text):
+        self.province_proxy.setFilterWildcard(text.strip())
+        self.department_proxy.setFilterWildcard(text.strip())
+        if text.strip():
+            self.department_tree.expandAll()
+
+    def _visible_province_rows(self):
+        """当前筛选结果对应的模型行号"""
+        proxy = self.province_proxy
+        return [
+            proxy.mapToSource(proxy.index(row, 0)).row()
+            for row in range(proxy.rowCount())
+        ]
 
     def select_all(self):
-        self.province_list.selectAll()
+        """选中当前页筛选出的全部省区 / 三级部门（未筛选时即全选）"""
+        if self.selection_tabs.currentWidget() is self.department_tree:
+            proxy = self.department_proxy
+            rows = [proxy.mapToSource(proxy.index(row, 0)).row() for row in range(proxy.rowCount())]
+            self.department_model.set_roots_checked(rows, True)
+        else:
+            self.province_model.set_rows_checked(self._visible_province_rows(), True)
 
     def clear_selection(self):
-        self.province_list.clearSelection()
+        self.province_model.set_rows_checked(range(self.province_model.rowCount()), False)
+        self.department_model.set_roots_checked(range(self.department_model.rowCount()), False)
+
+    def on_draw_shortcut(self):
+        """快捷键抽下一轮（与点击开始抽签按钮相同）"""
+        if self.draw_btn.isEnabled():
+            self.start_draw()
 
     def start_draw(self):
-        if self.df is None:
+        if self.session is None:
             QMessageBox.warning(self, '⚠️ 提示', '请先加载 Excel 文件')
             return
 
-        if self.is_ended:
-            QMessageBox.warning(self, '⚠️ 提示', '抽签已结束，如需重新开始请重新加载文件')
-            return
-
         try:
             draw_count = int(self.count_input.text())
-            if draw_count < 1:
-                QMessageBox.warning(self, '⚠️ 提示', '抽取人数必须大于 0')
-                return
         except ValueError:
             QMessageBox.warning(self, '⚠️ 提示', '请输入有效的抽取人数')
             return
 
-        # 获取选中的省区
-        selected_items = self.province_list.selectedItems()
-        if not selected_items:
-            QMessageBox.warning(self, '⚠️ 提示', '请至少选择一个省区')
+        try:
+            rounds = int(self.rounds_input.text() or 1)
+            if rounds < 1:
+                raise ValueError
+        except ValueError:
+            QMessageBox.warning(self, '⚠️ 提示', '请输入有效的连续轮数')
             return
 
-        selected_provinces = []
-        for item in selected_items:
-            # 解析省区名称
-            text = item.text()
-            province = text.split('(')[0].strip()
-            selected_provinces.append(province)
-
-        # 筛选数据
-        filtered_df = None
-        fourth_level_provinces = [
-            dept for dept in self.df['四级部门'].dropna().unique().tolist()
-            if '省区' in dept
-        ]
-
-        for province in selected_provinces:
-            if province in fourth_level_provinces:
-                temp_df = self.df[self.df['四级部门'] == province]
-            else:
-                temp_df = self.df[self.df['三级部门'] == province]
-
-            if filtered_df is None:
-                filtered_df = temp_df
-            else:
-                filtered_df = pd.concat([filtered_df, temp_df], ignore_index=True)
-
-        if filtered_df is None or len(filtered_df) == 0:
-            QMessageBox.warning(self, '⚠️ 提示', '选中的省区中没有数据')
+        try:
+            constraints = self._draw_constraints()
+        except (ValueError, DrawError):
+            QMessageBox.warning(self, '⚠️ 提示', '请输入有效的部门分布限制人数（留空表示不限制）')
             return
 
-        # 排除已抽中的人员
-        if self.all_drawn_people is not None and len(self.all_drawn_people) > 0:
-            drawn_ids = self.all_drawn_people['员工 ID'].tolist()
-            filtered_df = filtered_df[~filtered_df['员工 ID'].isin(drawn_ids)]
+        # 获取选中的省区（名称和所在列直接取自模型）
+        checked_provinces = self.selected_units()
+        selected_provinces = [province for province, _ in checked_provinces]
+
+        # 依次抽取各轮，中途条件不满足时停止并保留已完成的轮次
+        completed = 0
+        error = None
+        for _ in range(rounds):
+            # 筛选并随机抽取（播放动画时先取出候选人姓名，结果仍由抽签流程决定）
+            try:
+                self.session.check_available(checked_provinces, draw_count)
+                if self.animation_check.isChecked():
+                    pool_names = self.session.names[self.session.eligible(checked_provinces, self.eligibility_rule)]
+                positions = self.session.draw(
+                    checked_provinces, draw_count, constraints=constraints, rule=self.eligibility_rule
+                )
+            except DrawError as e:
+                error = str(e)
+                break
 
-        if len(filtered_df) == 0:
-            QMessageBox.warning(
-                self,
-                '⚠️ 提示',
-                '选中的省区中已无未抽中的人员'
-            )
-            return
+            if self.animation_check.isChecked():
+                LotteryAnimationDialog(pool_names, self.session.names[positions], self).exec()
+            completed += 1
 
-        if len(filtered_df) < draw_count:
-            QMessageBox.warning(
-                self,
-                '⚠️ 提示',
-                f'选中省区中只有 {len(filtered_df)} 人未抽中，无法抽取 {draw_count} 人'
-            )
+        if completed == 0:
+            QMessageBox.warning(self, '⚠️ 提示', error)
             return
 
-        # 随机抽取
-        self.drawn_result = filtered_df.sample(n=draw_count)
-
-        # 累加到已抽中人员列表
-        self.draw_count += 1
-        if self.all_drawn_people is None:
-            self.all_drawn_people = self.drawn_result.copy()
-        else:
-            self.all_drawn_people = pd.concat([self.all_drawn_people, self.drawn_result], ignore_index=True)
-
-        # 显示结果
-        self._show_result(selected_provinces, draw_count)
+        # 显示结果（多轮只刷新一次表格，只插入新抽中的行）
+        self._prepend_rounds(self.session.rounds[-completed:])
+        self._refresh_remaining()
+        self._show_result(selected_provinces, draw_count, completed)
 
-        # 启用导出和结束按钮
-        self.export_btn.setEnabled(True)
-        self.end_btn.setEnabled(True)
+        # 启用导出、结束和撤销按钮
+        self._update_action_buttons()
 
-        # 自动更新导出文件
+        # 自动更新导出文件（多轮只导出一次）
         self._auto_update_export()
 
-        QMessageBox.information(
-            self,
-            '🎉 抽签成功',
-            f'✅ 抽签完成！\n\n🎯 本次抽取：{draw_count} 人\n📊 累计抽取：{len(self.all_drawn_people)} 人\n📋 结果已显示在下方'
-        )
+        # 通知插件：界面刷新后再生成事件内容，插件在后台执行，不等待
+        if self.hooks:
+            session, last = self.session, self.session.draw_count
 
-    def _show_result(self, selected_provinces, draw_count):
-        """显示抽签结果"""
-        # 清空表格
-        self.result_table.setRowCount(0)
+            def emit_rounds():
+                for number in range(last - completed + 1, min(last, session.draw_count) + 1):
+                    self.hooks.emit('on_draw', session.round_event(number))
 
-        # 显示所有累计抽取的结果（倒序显示，最新的在前面）
-        if self.all_drawn_people is not None and len(self.all_drawn_people) > 0:
-            for i, (idx, row) in enumerate(self.all_drawn_people.iloc[::-1].iterrows(), 1):
-                # 判断省区级别
-                if pd.notna(row.get('四级部门')) and '省区' in row['四级部门']:
-                    province = row['四级部门']
-                elif pd.notna(row.get('三级部门')) and '独立省区' in row['三级部门']:
-                    province = row['三级部门']
-                else:
-                    province = '未知'
+            QTimer.singleShot(0, emit_rounds)
 
+        message = (
+            f'🎉 抽签完成！本次 {completed} 轮共抽取 {completed * draw_count} 人，'
+            f'累计 {self.session.drawn_total} 人'
+        )
+        if error:
+            message += f'\n⚠️ 第 {completed + 1} 轮未能完成：{error}'
+        self.toast.show_message(message, 5000 if error else 3000)
+
+    def _update_plugin_label(self):
+        """刷新插件状态；有失败、超时或丢弃的事件时以警告色显示"""
+        stats = self.hooks.stats()
+        problems = sum(item['failures'] + item['timeouts'] + item['dropped'] for item in stats)
+        text = f'🧩 插件 {len(stats)} 个'
+        if problems or self.hooks.errors:
+            text += f'（⚠️ {problems + len(self.hooks.errors)} 个问题）'
+        self.plugin_label.setText(text)
+        self.plugin_label.setToolTip(self.hooks.summary() or '没有插件')
+        set_status(self.plugin_label, 'warning' if problems or self.hooks.errors else 'info')
+
+    def edit_eligibility_rule(self):
+        """打开资格条件设置"""
+        if self.session is None:
+            QMessageBox.warning(self, '⚠️ 提示', '请先加载 Excel 文件')
+            return
+        dialog = EligibilityRuleDialog(self.session, self.eligibility_rule, self)
+        if dialog.exec():
+            self._set_eligibility_rule(dialog.rule())
+
+    def _set_eligibility_rule(self, rule):
+        self.eligibility_rule = rule
+        self.rule_label.setText(rule.describe() if rule else '不限')
+        set_status(self.rule_label, 'warning' if rule else None)
+        self.clear_rule_btn.setEnabled(rule is not None)
+
+    def _draw_constraints(self):
+        """按输入框生成部门分布限制，都留空时返回 None"""
+        max_text = self.max_per_input.text().strip()
+        min_text = self.min_per_input.text().strip()
+        return DrawConstraints(
+            ('四级部门', int(max_text)) if max_text else None,
+            ('三级部门', int(min_text)) if min_text else None,
+        ) or None
+
+    def _prepend_rounds(self, rounds):
+        """把新抽中的轮次插入表格顶部（最新的在最前面），不重建已有行"""
+        labels = self.session.labels
+        start = self.session.drawn_total - sum(len(positions) for _, positions in rounds)
+        self.result_table.setUpdatesEnabled(False)
+        for _, positions in rounds:
+            winners = self.session.winners(positions)
+            for position, (idx, row) in zip(positions, winners.iterrows()):
+                start += 1
                 self.result_table.add_result_row(
-                    index=i,
+                    index=start,
                     row_num=idx + 2,
                     id_num=row['员工 ID'],
                     name=row['姓名'],
-                    province=province
+                    province=labels[position],
+                    row_position=0
                 )
+        self.result_table.setUpdatesEnabled(True)
+
+    def _update_action_buttons(self):
+        has_session = self.session is not None
+        has_draws = has_session and self.session.draw_count > 0
+        ended = has_session and self.session.is_ended
+        self.export_btn.setEnabled(has_draws)
+        self.split_export_btn.setEnabled(has_draws)
+        self.end_btn.setEnabled(has_draws and not ended)
+        self.undo_btn.setEnabled(has_draws and not ended)
+        self.redo_btn.setEnabled(has_session and bool(self.session.redo_stack) and not ended)
+
+    def undo_draw(self):
+        """撤销最近一轮：只移除该轮的表格行、还原该轮中签标记"""
+        if self.session is None:
+            return
+        try:
+            _, positions = self.session.undo()
+        except DrawError as e:
+            self.toast.show_message(f'⚠️ {e}')
+            return
+
+        self.result_table.remove_top_rows(len(positions))
+        self._refresh_remaining()
+        self.result_stats_label.setText(
+            f'↩ 已撤销第{self.session.draw_count + 1}次抽签（{len(positions)} 人）\n📊 累计抽取：{self.session.drawn_total} 人'
+        )
+        set_status(self.result_stats_label, 'warning')
+        self._update_action_buttons()
+        self._auto_update_export()
+        self.toast.show_message(f'↩ 已撤销 1 轮，累计 {self.session.drawn_total} 人')
+
+    def redo_draw(self):
+        """重做最近撤销的一轮"""
+        if self.session is None:
+            return
+        try:
+            provinces, positions = self.session.redo()
+        except DrawError as e:
+            self.toast.show_message(f'⚠️ {e}')
+            return
+
+        self._prepend_rounds([(provinces, positions)])
+        self._refresh_remaining()
+        self._show_result([province for province, _ in provinces], len(positions))
+        self._update_action_buttons()
+        self._auto_update_export()
+        self.toast.show_message(f'↪ 已重做第{self.session.draw_count}次抽签，累计 {self.session.drawn_total} 人')
 
+    def _show_result(self, selected_provinces, draw_count, rounds=1):
+        """显示抽签统计"""
         # 更新统计
         provinces_str = ', '.join(selected_provinces[:2])
         if len(selected_provinces) > 2:
             provinces_str += f' 等 {len(selected_provinces)} 个省区'
 
+        last_round = self.session.draw_count
+        if rounds > 1:
+            round_str = f'第{last_round - rounds + 1}~{last_round}次抽签完成！从 {provinces_str} 中每轮抽取了 {draw_count} 人'
+        else:
+            round_str = f'第{last_round}次抽签完成！从 {provinces_str} 中抽取了 {draw_count} 人'
         self.result_stats_label.setText(
-            f'🎉 第{self.draw_count}次抽签完成！从 {provinces_str} 中抽取了 {draw_count} 人\n📊 累计抽取：{len(self.all_drawn_people)} 人'
+            f'🎉 {round_str}\n📊 累计抽取：{self.session.drawn_total} 人'
         )
-        self.result_stats_label.setStyleSheet(f"""
-            QLabel {{
-                color: {COLORS['success_text']};
-                font-size: 13px;
-                padding: 10px 14px;
-                background-color: {COLORS['success']};
-                border-radius: 8px;
-                border: 1px solid {COLORS['success_dark']};
-                font-weight: 600;
-            }}
-        """)
+        set_status(self.result_stats_label, 'success')
 
     def _auto_update_export(self):
         """自动更新导出文件"""
@@ -910,50 +2084,36 @@ class RandomDrawApp(QMainWindow):
             # 如果还没有导出文件路径，创建一个
             if self.export_file_path is None:
                 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                self.export_file_path = f'抽签结果_自动更新_{timestamp}.xlsx'
+                self.export_file_path = f'抽签结果_自动更新_{timestamp}{self.session.export_suffix}'
 
             # 导出原文件，并在"是否被抽中"列标记
-            export_df = self.original_df.copy()
-
-            # 确保有"是否被抽中"列
-            if '是否被抽中' not in export_df.columns:
-                export_df['是否被抽中'] = ''
-
-            # 将所有行的"是否被抽中"设置为空
-            export_df['是否被抽中'] = ''
-
-            # 获取所有已抽中人员的ID列表
-            drawn_ids = self.all_drawn_people['员工 ID'].tolist()
-
-            # 标记所有抽中的人员
-            export_df.loc[export_df['员工 ID'].isin(drawn_ids), '是否被抽中'] = '是'
-
-            # 保存到 Excel
-            export_df.to_excel(self.export_file_path, index=False, engine='openpyxl')
+            # 每次抽取、撤销、重做都会触发，只用 pandas 快速写出；保留原格式的流式导出留给手动导出和结束抽签
+            self.session.export(self.export_file_path, keep_format=False)
 
         except Exception as e:
             print(f"自动更新导出文件失败：{str(e)}")
 
     def end_draw(self):
         """结束抽签"""
-        if self.all_drawn_people is None or len(self.all_drawn_people) == 0:
+        if self.session is None or self.session.draw_count == 0:
             QMessageBox.warning(self, '⚠️ 提示', '还没有进行抽签')
             return
 
-        self.is_ended = True
+        self.session.is_ended = True
 
-        # 禁用开始抽签按钮
+        # 禁用开始抽签、撤销和重做按钮
         self.draw_btn.setEnabled(False)
+        self._update_action_buttons()
 
         # 选择最终导出路径
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        default_filename = f'抽签结果最终_{timestamp}.xlsx'
+        default_filename = f'抽签结果最终_{timestamp}{self.session.export_suffix}'
 
         file_path, _ = QFileDialog.getSaveFileName(
             self,
             '保存最终结果',
             default_filename,
-            'Excel 文件 (*.xlsx);;所有文件 (*)'
+            EXPORT_FILTER
         )
 
         if file_path:
@@ -961,28 +2121,14 @@ class RandomDrawApp(QMainWindow):
 
         try:
             # 导出原文件，并在"是否被抽中"列标记
-            export_df = self.original_df.copy()
-
-            # 确保有"是否被抽中"列
-            if '是否被抽中' not in export_df.columns:
-                export_df['是否被抽中'] = ''
-
-            # 将所有行的"是否被抽中"设置为空
-            export_df['是否被抽中'] = ''
-
-            # 获取所有已抽中人员的ID列表
-            drawn_ids = self.all_drawn_people['员工 ID'].tolist()
-
-            # 标记所有抽中的人员
-            export_df.loc[export_df['员工 ID'].isin(drawn_ids), '是否被抽中'] = '是'
-
-            # 保存到 Excel
-            export_df.to_excel(self.export_file_path, index=False, engine='openpyxl')
+            self.session.export(self.export_file_path)
+            if self.hooks:
+                self.hooks.emit('on_end', self.session.end_event(self.export_file_path))
 
             QMessageBox.information(
                 self,
                 '🎊 抽签结束',
-                f'✅ 抽签已结束！\n\n📊 总共抽签次数：{self.draw_count} 次\n🎯 累计抽取人数：{len(self.all_drawn_people)} 人\n\n📁 结果已保存到：\n{self.export_file_path}'
+                f'✅ 抽签已结束！\n\n📊 总共抽签次数：{self.session.draw_count} 次\n🎯 累计抽取人数：{self.session.drawn_total} 人\n\n📁 结果已保存到：\n{self.export_file_path}\n🧾 抽签记录（可用 抽签重放.py 核验）：\n{journal_path(self.export_file_path)}'
             )
 
         except Exception as e:
@@ -990,19 +2136,19 @@ class RandomDrawApp(QMainWindow):
 
     def export_result(self):
         """导出结果"""
-        if self.all_drawn_people is None or len(self.all_drawn_people) == 0:
+        if self.session is None or self.session.draw_count == 0:
             QMessageBox.warning(self, '⚠️ 提示', '请先进行抽签')
             return
 
         # 选择保存路径
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        default_filename = f'抽签结果_{timestamp}.xlsx'
+        default_filename = f'抽签结果_{timestamp}{self.session.export_suffix}'
 
         file_path, _ = QFileDialog.getSaveFileName(
             self,
             '保存结果',
             default_filename,
-            'Excel 文件 (*.xlsx);;所有文件 (*)'
+            EXPORT_FILTER
         )
 
         if not file_path:
@@ -1010,33 +2156,57 @@ class RandomDrawApp(QMainWindow):
 
         try:
             # 导出原文件，并在"是否被抽中"列标记
-            export_df = self.original_df.copy()
-
-            # 确保有"是否被抽中"列
-            if '是否被抽中' not in export_df.columns:
-                export_df['是否被抽中'] = ''
-
-            # 将所有行的"是否被抽中"设置为空
-            export_df['是否被抽中'] = ''
-
-            # 获取所有已抽中人员的ID列表
-            drawn_ids = self.all_drawn_people['员工 ID'].tolist()
-
-            # 标记所有抽中的人员
-            export_df.loc[export_df['员工 ID'].isin(drawn_ids), '是否被抽中'] = '是'
-
-            # 保存到 Excel
-            export_df.to_excel(file_path, index=False, engine='openpyxl')
+            records = self.session.export(file_path)
 
             QMessageBox.information(
                 self,
                 '✅ 导出成功',
-                f'结果已成功导出到：\n{file_path}\n\n📊 共导出 {len(export_df)} 条记录\n✅ 抽中 {len(drawn_ids)} 人'
+                f'结果已成功导出到：\n{file_path}\n\n📊 共导出 {records} 条记录\n✅ 抽中 {self.session.drawn_total} 人\n🧾 抽签记录：{journal_path(file_path)}'
             )
 
         except Exception as e:
             QMessageBox.critical(self, '❌ 导出失败', f'导出失败：\n{str(e)}')
 
+    def export_by_province(self):
+        """分省区导出：每个省区一个工作簿，多进程并行写出"""
+        if self.session is None or self.session.draw_count == 0:
+            QMessageBox.warning(self, '⚠️ 提示', '请先进行抽签')
+            return
+
+        parent_dir = QFileDialog.getExistingDirectory(self, '选择分省区结果保存位置')
+        if not parent_dir:
+            return
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        directory = os.path.join(parent_dir, f'抽签结果_分省区_{timestamp}')
+
+        progress = QProgressDialog('正在导出各省区结果...', None, 0, 0, self)
+        progress.setWindowTitle('🗂 分省区导出')
+        progress.setWindowModality(Qt.WindowModality.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.show()
+        QApplication.processEvents()
+
+        def on_progress(done, total, province):
+            progress.setMaximum(total)
+            progress.setValue(done)
+            progress.setLabelText(f'已完成 {done} / {total}：{province}')
+            QApplication.processEvents()
+
+        try:
+            manifest = self.session.export_by_province(directory, progress=on_progress)
+        except Exception as e:
+            QMessageBox.critical(self, '❌ 导出失败', f'分省区导出失败：\n{str(e)}')
+            return
+        finally:
+            progress.close()
+
+        QMessageBox.information(
+            self,
+            '✅ 导出成功',
+            f'已导出 {len(manifest)} 个省区的结果文件\n'
+            f'✅ 抽中 {int(manifest["中签人数"].sum())} 人\n\n📁 保存位置：\n{directory}\n（汇总清单.xlsx）'
+        )
+
 
 def main():
     app = QApplication(sys.argv)
@@ -1053,4 +2223,5 @@ def main():
 
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,447 @@
+"""
+抽签服务模式
+功能：在本机启动 HTTP/JSON 服务，大屏、前台平板等多个终端共用同一场抽签
+
+用法示例：
+    python 抽签服务.py 工作簿1.xlsx --port 8765
+    python 抽签服务.py --root D:\\抽签名单 --port 8765
+
+接口：
+    GET  /status              当前会话概况
+    GET  /provinces           省区列表及人数、剩余可抽人数
+    GET  /results             全部已中签人员（按轮次）
+    GET  /journal             抽签记录（名单指纹、种子、各轮参数及中签人员），可用 抽签重放.py 核验
+    GET  /search?q=张三        按姓名前缀 / 拼音首字母 / 员工 ID 查询人员及抽签状态
+    GET  /attributes          可用作资格条件的列及各取值人数
+    GET  /hooks               插件各事件处理函数的调用次数、耗时、失败和超时统计
+    POST /load     {"path": "名单.xlsx"}                       加载名单目录下的名单；最近加载过的其他名单直接恢复其会话
+    POST /draw     {"provinces": ["江苏省区", "浙江*"], "count": 5}  抽取一轮，省区支持通配符
+                   可加 "constraints": {"max_per": ["四级部门", 2], "min_per": ["三级部门", 1]}
+                   可加 "rule": {"and": [{"column": "职级", "values": ["P5", "P6"]},
+                                         {"not": {"column": "是否驻场", "values": ["是"]}}]}
+    POST /undo                                                  撤销最近一轮
+    POST /redo                                                  重做最近撤销的一轮
+    POST /export   {"path": "抽签结果.xlsx"}                    导出标记结果到名单目录（path 可省略）
+
+说明：
+- 服务没有身份验证，默认只监听本机（127.0.0.1）；需要局域网访问时用 --host 指定本机网卡地址，并确保网络可信
+- 接口中的 path 只能是名单目录（--root，默认当前目录）下的相对路径，不接受绝对路径和 ..
+- 加载、抽签、撤销、重做、导出依次串行执行（同一时刻只有一个修改会话的操作）
+- 查询类请求在后台线程中读取会话，只在抽签、撤销、重做修改会话的瞬间等待，不会被导出阻塞；
+  检索和资格条件索引在加载名单时建立
+- --plugins 指定插件目录（默认“插件”），插件在后台线程中执行，不会延迟接口响应
+"""
+
+import os
+import sys
+import json
+import asyncio
+import threading
+import argparse
+import fnmatch
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs
+
+from 抽签核心 import DrawError, DrawConstraints, EligibilityRule, ExclusionIndex, HookRunner, SessionCache
+
+# 请求体大小上限
+MAX_BODY = 1024 * 1024
+
+# 可导出的文件类型
+EXPORT_EXTENSIONS = ('.xlsx', '.csv', '.arrow', '.feather')
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_value(value):
+    """numpy 标量 / NaN 转为可 JSON 序列化的值"""
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+class DrawService:
+    """共享一场抽签会话的 HTTP 服务"""
+
+    def __init__(self, exclusion_index=None, hooks=None, root=None):
+        self.exclusion_index = exclusion_index
+        self.hooks = hooks or HookRunner()
+        self.root = os.path.realpath(root or os.getcwd())  # 名单和导出文件所在目录
+        self.session = None
+        self.session_cache = SessionCache()  # 最近加载的名单及会话
+        # 串行执行加载、抽签、撤销、重做、导出
+        self._write_lock = asyncio.Lock()
+        # 会话状态锁：修改会话和查询在后台线程中持有，导出只读会话，不持有
+        self._state_lock = threading.Lock()
+
+    def _locked(self, func, *args, **kwargs):
+        with self._state_lock:
+            return func(*args, **kwargs)
+
+    async def _call(self, func, *args, **kwargs):
+        """在后台线程中持会话状态锁执行 func，不阻塞事件循环"""
+        return await asyncio.to_thread(self._locked, func, *args, **kwargs)
+
+    def _resolve_path(self, path):
+        """请求中的相对路径 → 名单目录下的绝对路径；拒绝绝对路径、.. 和指向目录外的链接"""
+        if not isinstance(path, str) or not path.strip():
+            raise HttpError(HTTPStatus.BAD_REQUEST, '缺少 path')
+        parts = path.replace('\\', '/').split('/')
+        if os.path.isabs(path) or os.path.splitdrive(path)[0] or parts[0] == '' or '..' in parts:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'path 只能是名单目录下的相对路径')
+        full_path = os.path.realpath(os.path.join(self.root, path))
+        if os.path.commonpath([full_path, self.root]) != self.root:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'path 只能是名单目录下的相对路径')
+        return full_path
+
+    # ---------- 会话操作 ----------
+
+    def _require_session(self):
+        session = self.session
+        if session is None:
+            raise HttpError(HTTPStatus.CONFLICT, '请先加载名单')
+        return session
+
+    def _people(self, session, positions):
+        winners = session.winners(positions)
+        labels = session.labels
+        return [
+            {
+                'Excel行号': int(idx) + 2,
+                '员工 ID': _json_value(row['员工 ID']),
+                '姓名': _json_value(row['姓名']),
+                '省区': labels[position],
+            }
+            for position, (idx, row) in zip(positions, winners.iterrows())
+        ]
+
+    def status(self):
+        session = self.session
+        if session is None:
+            return {'loaded': False}
+        return {
+            'loaded': True,
+            'file': session.file_path,
+            'backend': session.backend,
+            'load_seconds': session.load_seconds,
+            'total': len(session.df),
+            'provinces': len(session.provinces),
+            'excluded': int(session.excluded.sum()),
+            'duplicate_ids': len(session.duplicates),
+            'rounds': session.draw_count,
+            'drawn': session.drawn_total,
+            'ended': session.is_ended,
+        }
+
+    def provinces(self):
+        session = self._require_session()
+        return {
+            'provinces': [
+                {'name': province, 'level': level, 'count': count, 'parent': parent,
+                 'remaining': int(remaining)}
+                for (province, level, count, parent), remaining in zip(session.provinces, session.remaining)
+            ]
+        }
+
+    def results(self):
+        session = self._require_session()
+        rounds = list(session.rounds)
+        return {
+            'rounds': [
+                {
+                    'round': i,
+                    'provinces': [province for province, _ in provinces],
+                    'winners': self._people(session, positions),
+                }
+                for i, (provinces, positions) in enumerate(rounds, 1)
+            ]
+        }
+
+    def attributes(self):
+        session = self._require_session()
+        return {
+            'columns': [
+                {'column': column, 'values': [{'value': value, 'count': count} for value, count in values]}
+                for column, values in session.bitmaps.columns()
+            ]
+        }
+
+    def search(self, params):
+        session = self._require_session()
+        query = params.get('q', [''])[0]
+        if not query.strip():
+            raise HttpError(HTTPStatus.BAD_REQUEST, '缺少查询内容 q')
+        matches = session.search(query)
+        people = self._people(session, [position for position, _ in matches])
+        for person, (_, status) in zip(people, matches):
+            person['状态'] = status
+        return {'query': query, 'matches': people}
+
+    def _open(self, path):
+        """加载名单并建立查询用的索引（在后台线程中执行，查询时不再在事件循环上建索引）"""
+        session, resumed = self.session_cache.load(path, self.exclusion_index)
+        session.search_index
+        session.bitmaps.columns()
+        session.labels
+        return session, resumed
+
+    async def load(self, body):
+        return await self.load_path(self._resolve_path(body.get('path')))
+
+    async def load_path(self, path):
+        """加载名单（path 为已校验的路径）"""
+        async with self._write_lock:
+            current = self.session
+            if current is not None and os.path.abspath(path) == os.path.abspath(current.file_path):
+                # 重新加载当前名单：开始新的一场
+                self.session_cache.discard(path)
+            try:
+                session, resumed = await asyncio.to_thread(self._open, path)
+            except Exception as e:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f'加载 Excel 文件失败：{e}')
+            self.session = session
+            if not resumed and self.hooks:
+                self.hooks.emit('on_load', session.load_event())
+            status = await self._call(self.status)
+        return {**status, 'resumed': resumed}
+
+    async def draw(self, body):
+        try:
+            count = int(body.get('count', 0))
+        except (TypeError, ValueError):
+            raise HttpError(HTTPStatus.BAD_REQUEST, '请输入有效的抽取人数')
+        patterns = body.get('provinces') or []
+        if isinstance(patterns, str):
+            patterns = [patterns]
+        try:
+            constraints = DrawConstraints.from_dict(body.get('constraints'))
+        except DrawError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, str(e))
+        except AttributeError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'constraints 应为 JSON 对象')
+        try:
+            rule = EligibilityRule.from_dict(body.get('rule'))
+        except DrawError as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, str(e))
+
+        async with self._write_lock:
+            session = self._require_session()
+            names = [
+                province for province, *_ in session.provinces
+                if any(fnmatch.fnmatchcase(province, pattern) for pattern in patterns)
+            ]
+            if patterns and not names:
+                raise HttpError(HTTPStatus.BAD_REQUEST, f'没有匹配的省区：{", ".join(patterns)}')
+
+            def apply():
+                positions = session.draw(session.resolve(names), count, constraints=constraints, rule=rule)
+                event = session.round_event(session.draw_count) if self.hooks else None
+                return positions, session.draw_count, session.drawn_total, event
+
+            try:
+                positions, round_number, drawn_total, event = await self._call(apply)
+            except DrawError as e:
+                raise HttpError(HTTPStatus.CONFLICT, str(e))
+            if event is not None:
+                self.hooks.emit('on_draw', event)
+
+        return {
+            'round': round_number,
+            'provinces': names,
+            'winners': self._people(session, positions),
+            'total_drawn': drawn_total,
+        }
+
+    async def undo(self, body):
+        async with self._write_lock:
+            session = self._require_session()
+
+            def apply():
+                provinces, positions = session.undo()
+                return positions, session.draw_count, session.drawn_total
+
+            try:
+                positions, round_number, drawn_total = await self._call(apply)
+            except DrawError as e:
+                raise HttpError(HTTPStatus.CONFLICT, str(e))
+        return {
+            'undone_round': round_number + 1,
+            'removed': self._people(session, positions),
+            'total_drawn': drawn_total,
+        }
+
+    async def redo(self, body):
+        async with self._write_lock:
+            session = self._require_session()
+
+            def apply():
+                provinces, positions = session.redo()
+                return provinces, positions, session.draw_count, session.drawn_total
+
+            try:
+                provinces, positions, round_number, drawn_total = await self._call(apply)
+            except DrawError as e:
+                raise HttpError(HTTPStatus.CONFLICT, str(e))
+        return {
+            'round': round_number,
+            'provinces': [province for province, _ in provinces],
+            'winners': self._people(session, positions),
+            'total_drawn': drawn_total,
+        }
+
+    async def export(self, body):
+        path = body.get('path') or f"抽签结果_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        full_path = self._resolve_path(path)
+        if os.path.splitext(full_path)[1].lower() not in EXPORT_EXTENSIONS:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f'只能导出为 {" / ".join(EXPORT_EXTENSIONS)} 文件')
+        async with self._write_lock:
+            session = self._require_session()
+            if full_path == os.path.realpath(session.file_path):
+                raise HttpError(HTTPStatus.BAD_REQUEST, '不能覆盖当前名单文件')
+            try:
+                # 导出期间没有其他修改会话的操作，查询照常进行
+                records = await asyncio.to_thread(session.export, full_path)
+            except Exception as e:
+                raise HttpError(HTTPStatus.INTERNAL_SERVER_ERROR, f'导出失败：{e}')
+            drawn_total = session.drawn_total
+        return {'path': path, 'records': records, 'drawn': drawn_total}
+
+    # ---------- HTTP ----------
+
+    async def dispatch(self, method, path, body):
+        path, _, query = path.partition('?')
+        params = parse_qs(query)
+        routes = {
+            ('GET', '/status'): lambda: self._call(self.status),
+            ('GET', '/provinces'): lambda: self._call(self.provinces),
+            ('GET', '/results'): lambda: self._call(self.results),
+            ('GET', '/search'): lambda: self._call(self.search, params),
+            ('GET', '/attributes'): lambda: self._call(self.attributes),
+            ('GET', '/journal'): lambda: self._call(lambda: self._require_session().journal()),
+            ('GET', '/hooks'): lambda: {'hooks': self.hooks.stats(), 'errors': self.hooks.errors},
+            ('POST', '/load'): lambda: self.load(body),
+            ('POST', '/draw'): lambda: self.draw(body),
+            ('POST', '/undo'): lambda: self.undo(body),
+            ('POST', '/redo'): lambda: self.redo(body),
+            ('POST', '/export'): lambda: self.export(body),
+        }
+        handler = routes.get((method, path))
+        if handler is None:
+            raise HttpError(HTTPStatus.NOT_FOUND, f'未知接口：{method} {path}')
+        result = handler()
+        if asyncio.iscoroutine(result):
+            result = await result
+        return result
+
+    async def handle_connection(self, reader, writer):
+        """处理一个连接上的请求（支持 keep-alive）"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                try:
+                    try:
+                        length = int(headers.get('content-length', 0))
+                    except ValueError:
+                        length = -1
+                    if length < 0:
+                        keep_alive = False  # 无法确定请求体边界，回复后关闭连接
+                        raise HttpError(HTTPStatus.BAD_REQUEST, '无效的 Content-Length')
+                    if length > MAX_BODY:
+                        raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, '请求体过大')
+                    raw = await reader.readexactly(length) if length else b''
+                    try:
+                        body = json.loads(raw) if raw else {}
+                    except ValueError:
+                        body = None
+                    if not isinstance(body, dict):
+                        raise HttpError(HTTPStatus.BAD_REQUEST, '请求体应为 JSON 对象')
+                    status, payload = HTTPStatus.OK, await self.dispatch(method, path, body)
+                except HttpError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                writer.write(
+                    f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                    f'Content-Type: application/json; charset=utf-8\r\n'
+                    f'Content-Length: {len(data)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1')
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host, port):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve(args):
+    exclusion_index = ExclusionIndex(args.history) if args.history else ExclusionIndex()
+    hooks = HookRunner()
+    count = hooks.load_plugins(args.plugins)
+    if count or hooks.errors:
+        print(f"🧩 已加载插件：{count} 个处理函数" + (f"，{len(hooks.errors)} 个插件加载失败" if hooks.errors else ''))
+    service = DrawService(exclusion_index, hooks, args.root)
+    print(f"📂 名单目录：{service.root}")
+    if args.roster:
+        status = await service.load_path(os.path.abspath(args.roster))
+        print(f"✅ 已加载：{status['total']} 人，{status['provinces']} 个省区")
+
+    server = await service.start(args.host, args.port)
+    print(f"🌐 抽签服务已启动：http://{args.host}:{args.port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='抽签服务模式（HTTP/JSON）')
+    parser.add_argument('roster', nargs='?', help='启动时加载的名单文件')
+    parser.add_argument('--host', default='127.0.0.1', help='监听地址（默认只允许本机访问；服务没有身份验证）')
+    parser.add_argument('--root', default=None, help='名单和导出文件所在目录，接口中的 path 相对此目录（默认当前目录）')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口')
+    parser.add_argument('--history', default=None, help='往期中签排除库（默认 抽签历史.db）')
+    parser.add_argument('--plugins', default='插件', help='插件目录（默认 插件）')
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\n⏹ 抽签服务已停止")
+    except HttpError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
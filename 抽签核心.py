@@ -0,0 +1,2230 @@
+"""
+抽签核心逻辑
+功能：与界面无关的数据处理（名单读取、省区识别、资格筛选、随机抽取、往期中签排除、人员查询、抽签会话及重放），
+      供抽签小程序、抽签服务及配套工具共用
+"""
+
+import os
+import re
+import copy
+import json
+import time
+import fnmatch
+import queue
+import hashlib
+import threading
+import sqlite3
+import zipfile
+import posixpath
+import importlib.util
+from collections import OrderedDict, deque
+from datetime import datetime, date
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+
+class DrawError(Exception):
+    """抽签条件不满足，提示信息可直接展示给用户"""
+
+
+# 名单读取后端：按文件格式从快到慢排列，使用第一个已安装且能读取的
+READER_BACKENDS = {
+    '.csv': ['csv'],
+    '.xlsx': ['parallel', 'calamine', 'openpyxl'],
+    '.xlsm': ['parallel', 'calamine', 'openpyxl'],
+    '.xls': ['calamine', 'xlrd'],
+    '.arrow': ['arrow'],
+    '.feather': ['arrow'],
+}
+
+# 各后端依赖的模块（None 表示无需额外依赖）
+BACKEND_MODULES = {
+    'csv': None,
+    'parallel': 'openpyxl',
+    'calamine': 'python_calamine',
+    'openpyxl': 'openpyxl',
+    'xlrd': 'xlrd',
+    'arrow': 'pyarrow',
+}
+
+# Excel 单个工作表最多容纳的数据行数（不含表头）
+EXCEL_MAX_ROWS = 1_048_575
+
+# 多进程并行解析 xlsx 的条件：每个进程的解析速度约为 calamine 的三分之一、openpyxl 的两倍，
+# 核数和文件都足够大时才更快（未安装 calamine 时两核即可）
+PARALLEL_MIN_WORKERS = 6
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+PARALLEL_PARTS_PER_WORKER = 2  # 多分几段，各进程负载更均衡，分块加载时也能更早拿到第一块
+
+# 转换为 Arrow 名单时字典编码的列：取值少、分组统计频繁
+ARROW_DICTIONARY_COLUMNS = ('三级部门', '四级部门')
+
+
+def available_backends(file_path):
+    """该文件可用的读取后端（已安装的，按速度排序；并行解析只用于多核机器上的大文件）"""
+    ext = os.path.splitext(file_path)[1].lower()
+    return [
+        backend for backend in READER_BACKENDS.get(ext, READER_BACKENDS['.xlsx'])
+        if (BACKEND_MODULES[backend] is None or importlib.util.find_spec(BACKEND_MODULES[backend]))
+        and (backend != 'parallel' or _parallel_worthwhile(file_path))
+    ]
+
+
+def _parallel_worthwhile(file_path):
+    try:
+        size = os.path.getsize(file_path)
+    except OSError:
+        return False
+    min_workers = PARALLEL_MIN_WORKERS if importlib.util.find_spec('python_calamine') else 2
+    return (os.cpu_count() or 1) >= min_workers and size >= PARALLEL_MIN_BYTES
+
+
+def read_with_backend(file_path, backend):
+    if backend == 'csv':
+        return pd.read_csv(file_path)
+    if backend == 'arrow':
+        return read_arrow(file_path)
+    if backend == 'parallel':
+        return read_excel_parallel(file_path)
+    return pd.read_excel(file_path, engine=backend)
+
+
+def read_arrow(file_path):
+    """以内存映射方式打开 Arrow IPC（Feather V2）名单
+
+    各列直接引用映射的文件内容（零拷贝），只有实际用到的列才会从磁盘读入；
+    字典编码的列转为 pandas 分类列，部门分组直接使用其编码。
+    """
+    import pyarrow as pa
+    import pyarrow.ipc
+
+    table = pa.ipc.open_file(pa.memory_map(file_path, 'r')).read_all()
+    return table.to_pandas(types_mapper=_arrow_types)
+
+
+def _arrow_types(arrow_type):
+    """Arrow 列转 pandas 的类型：字典编码列转为分类列，其余直接包装（零拷贝）"""
+    import pyarrow as pa
+
+    return None if pa.types.is_dictionary(arrow_type) else pd.ArrowDtype(arrow_type)
+
+
+def write_arrow(file_path, frame):
+    """把名单写成未压缩的 Arrow IPC 文件（可内存映射零拷贝读取）
+
+    混有数字和文字的列统一转为文字；部门列字典编码。
+    """
+    import pyarrow as pa
+    import pyarrow.ipc
+
+    columns = []
+    for name in frame.columns:
+        values = frame[name]
+        try:
+            column = pa.array(values, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            column = pa.array(
+                [None if pd.isna(value) else str(value) for value in values], type=pa.string()
+            )
+        if name in ARROW_DICTIONARY_COLUMNS:
+            column = column.dictionary_encode()
+        columns.append(column)
+    table = pa.table(columns, names=[str(name) for name in frame.columns])
+    with pa.OSFile(file_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=64 * 1024)
+
+
+def convert_to_arrow(source_path, output_path=None):
+    """把 Excel / CSV 名单一次性转换为 Arrow 名单，返回 (输出路径, 人数, 耗时秒数)
+
+    output_path 默认为同名的 .arrow 文件。转换后行序与源文件一致，抽签记录可照常重放。
+    """
+    output_path = output_path or os.path.splitext(source_path)[0] + '.arrow'
+    start = time.perf_counter()
+    df, _, _ = read_roster(source_path)
+    write_arrow(output_path, df)
+    return output_path, len(df), time.perf_counter() - start
+
+
+def read_roster(file_path, backend=None):
+    """读取名单文件，自动选用最快的可用后端
+
+    返回 (DataFrame, 使用的后端, 耗时秒数)。
+    快速后端因版本不兼容、文件结构特殊、子进程异常等原因读取失败时依次退回下一个后端，
+    全部失败时抛出第一个后端的错误。
+    """
+    backends = [backend] if backend else available_backends(file_path)
+    if not backends:
+        ext = os.path.splitext(file_path)[1] or '无扩展名'
+        raise ValueError(f'没有可读取 {ext} 文件的组件，请安装 python-calamine')
+
+    start = time.perf_counter()
+    first_error = None
+    for name in backends:
+        try:
+            df = read_with_backend(file_path, name)
+            return df, name, time.perf_counter() - start
+        except Exception as e:
+            first_error = first_error or e
+    raise first_error
+
+
+# 分块读取名单时每块的行数
+CHUNK_ROWS = 5000
+
+
+def _iter_sheet_chunks(file_path, chunk_rows):
+    """openpyxl 只读模式逐行读取第一个工作表，每 chunk_rows 行生成一个 DataFrame
+
+    与 pd.read_excel 一致：空表头列名为“Unnamed: 列号”，末尾的空行不计入名单。
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        while header and header[-1] is None:
+            header.pop()
+        if not header:
+            raise ValueError('名单文件为空')
+        columns = [name if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+        width = len(columns)
+
+        batch, blanks = [], []
+        for row in rows:
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            if all(value is None for value in row):
+                blanks.append(row)  # 暂存空行，后面还有数据时才计入
+                continue
+            batch.extend(blanks)
+            blanks.clear()
+            batch.append(row)
+            if len(batch) >= chunk_rows:
+                yield pd.DataFrame(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+# 工作表 XML 中行标签的开头（不含 <rowBreaks> 等）
+_ROW_TAG = re.compile(rb'<row[\s>]')
+_SHEET_DATA_END = b'</sheetData>'
+
+# 并行解析时每次建树的 XML 字节数
+PARSE_BLOCK_BYTES = 1024 * 1024
+
+
+def _sheet_part_bounds(src, size, index, count):
+    """把工作表 XML 按字节均分为 count 段，读出第 index 段，首尾对齐到 <row> 标签
+
+    每段从不早于均分起点的第一个 <row> 开始，到不早于均分终点的第一个 <row>（或 </sheetData>）为止，
+    相邻两段的分界点一致，每行恰好属于一段；起点之后到终点之前没有行开头的段为空。
+    """
+    start, end = size * index // count, size * (index + 1) // count
+    src.seek(start)
+    data = src.read(end - start)
+
+    def boundary(offset):
+        """data 中不早于 offset 的第一个 <row> 或 </sheetData> 的位置，不够时继续读取"""
+        nonlocal data
+        while True:
+            row = _ROW_TAG.search(data, offset)
+            close = data.find(_SHEET_DATA_END, offset)
+            if row or close >= 0:
+                return min(pos for pos in (row.start() if row else -1, close) if pos >= 0)
+            more = src.read(64 * 1024)
+            if not more:
+                return len(data)
+            data += more
+
+    first = boundary(0)
+    if first >= end - start or data.startswith(_SHEET_DATA_END, first):
+        return b''
+    last = boundary(end - start)
+    close = data.find(_SHEET_DATA_END, first, last)  # 最后一段：行数据在终点之前结束
+    return data[first:last if close < 0 else close]
+
+
+# xlsx 包内部件的命名空间
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_DOCUMENT_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+def _part_relationships(archive, part):
+    """包内部件的关系表：{关系 ID: (关系类型, 目标部件路径)}，part 为空时读取包级关系"""
+    import xml.etree.ElementTree as ET
+
+    folder, name = posixpath.split(part)
+    try:
+        root = ET.fromstring(archive.read(posixpath.join(folder, '_rels', name + '.rels')))
+    except KeyError:
+        return {}
+    relationships = {}
+    for element in root.iter(_PACKAGE_REL_NS + 'Relationship'):
+        if element.get('TargetMode') == 'External':
+            continue
+        target = element.get('Target')
+        target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join(folder, target))
+        relationships[element.get('Id')] = (element.get('Type', '').rsplit('/', 1)[-1], target)
+    return relationships
+
+
+def _xlsx_layout(archive):
+    """按 xlsx 包内的关系表找出第一个工作表及其依赖部件（不依赖 openpyxl 内部属性）
+
+    archive 为已打开的 zipfile.ZipFile，返回 (工作表部件, 共享字符串部件, 样式部件, 是否 1904 日期系统)，
+    工作簿没有共享字符串或样式时对应项为 None。第一个工作表与 openpyxl 的 worksheets[0] 一致（跳过图表页）。
+    """
+    import xml.etree.ElementTree as ET
+
+    workbook = next(
+        (target for kind, target in _part_relationships(archive, '').values() if kind == 'officeDocument'), None
+    )
+    if workbook is None:
+        raise ValueError('不是有效的 xlsx 文件（缺少工作簿）')
+    root = ET.fromstring(archive.read(workbook))
+    relationships = _part_relationships(archive, workbook)
+
+    sheet = None
+    for element in root.iter(_MAIN_NS + 'sheet'):
+        kind, target = relationships.get(element.get(_DOCUMENT_REL_NS + 'id'), (None, None))
+        if kind == 'worksheet':
+            sheet = target
+            break
+    if sheet is None:
+        raise ValueError('名单文件中没有工作表')
+
+    parts = {kind: target for kind, target in relationships.values()}
+    properties = root.find(_MAIN_NS + 'workbookPr')
+    date1904 = properties is not None and properties.get('date1904', '').lower() in ('1', 'true')
+    return sheet, parts.get('sharedStrings'), parts.get('styles'), date1904
+
+
+def _read_shared_strings(archive, part):
+    """共享字符串表（与 openpyxl 一致：拼接纯文本和各格式段的文字，不含注音）"""
+    import xml.etree.ElementTree as ET
+
+    strings = []
+    if part is None:
+        return strings
+    with archive.open(part) as src:
+        for _, element in ET.iterparse(src):
+            if element.tag != _MAIN_NS + 'si':
+                continue
+            plain = element.find(_MAIN_NS + 't')
+            snippets = [plain.text or ''] if plain is not None else []
+            snippets.extend(run.findtext(_MAIN_NS + 't') or '' for run in element.iter(_MAIN_NS + 'r'))
+            strings.append(''.join(snippets).replace('x005F_', ''))
+            element.clear()
+    return strings
+
+
+def _read_date_styles(archive, part):
+    """单元格样式中数字格式为日期、时长的样式序号，返回 (日期样式集合, 时长样式集合)"""
+    import xml.etree.ElementTree as ET
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+
+    date_styles, timedelta_styles = set(), set()
+    if part is None:
+        return date_styles, timedelta_styles
+    root = ET.fromstring(archive.read(part))
+    custom = {int(element.get('numFmtId')): element.get('formatCode') for element in root.iter(_MAIN_NS + 'numFmt')}
+    cell_styles = root.find(_MAIN_NS + 'cellXfs')
+    for index, style in enumerate(cell_styles if cell_styles is not None else ()):
+        number_format = int(style.get('numFmtId', 0))
+        code = custom.get(number_format, BUILTIN_FORMATS.get(number_format))
+        if is_date_format(code):
+            date_styles.add(index)
+        if is_timedelta_format(code):
+            timedelta_styles.add(index)
+    return date_styles, timedelta_styles
+
+
+def _parse_sheet_part(file_path, index, count):
+    """子进程：解析第一个工作表的第 index 段（共 count 段）
+
+    返回 (首行行号, 各列为整数列号的 DataFrame)，行号连续，中间缺失的行补为空行。
+    单元格取值规则与 openpyxl + pd.read_excel 一致：共享字符串、日期格式转为时间、整数值的小数转为整数。
+    直接用 zipfile 读取包内部件，不依赖 openpyxl 的内部属性。
+    """
+    import xml.etree.ElementTree as ET
+    from openpyxl.utils import column_index_from_string
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_excel
+
+    with zipfile.ZipFile(file_path) as archive:
+        sheet, strings_part, styles_part, date1904 = _xlsx_layout(archive)
+        strings = _read_shared_strings(archive, strings_part)
+        date_formats, timedelta_formats = _read_date_styles(archive, styles_part)
+        epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+        info = archive.getinfo(sheet)
+        with archive.open(info) as src:
+            root = re.search(rb'<worksheet\b[^>]*>', src.read(64 * 1024))
+            if root is None:
+                raise ValueError('无法并行解析该工作表（非标准的 XML 结构）')
+            data = _sheet_part_bounds(src, info.file_size, index, count)
+    if not data:
+        return None, pd.DataFrame()
+    if not re.match(rb'<row\b[^>]*\sr="', data):
+        raise ValueError('无法并行解析该工作表（缺少行号）')
+
+    row_tag, cell_tag = _MAIN_NS + 'row', _MAIN_NS + 'c'
+    value_tag, text_tag = _MAIN_NS + 'v', _MAIN_NS + 't'
+    columns = {}  # 列字母 → 列号（从 0 开始）
+
+    def cell_value(cell):
+        kind = cell.get('t', 'n')
+        if kind == 'inlineStr':
+            return ''.join(text.text or '' for text in cell.iter(text_tag))
+        value = cell.findtext(value_tag) or None
+        if value is None:
+            return None
+        if kind == 'n':
+            number = float(value) if '.' in value or 'E' in value or 'e' in value else int(value)
+            style = int(cell.get('s', 0))
+            if style in date_formats or style in timedelta_formats:
+                return from_excel(number, epoch, timedelta=style in timedelta_formats)
+            if isinstance(number, float) and number.is_integer():
+                return int(number)
+            return number
+        if kind == 's':
+            return strings[int(value)]
+        if kind == 'b':
+            return bool(int(value))
+        if kind == 'd':
+            return datetime.fromisoformat(value.rstrip('Z'))
+        return value  # str（公式结果）、e（错误值）
+
+    rows, first, last = [], None, None
+    head, position = root.group(0) + b'<sheetData>', 0
+    while position < len(data):
+        # 每次解析约 1 MB 的完整行，整块建树比逐个元素的事件快，内存也有上限
+        found = _ROW_TAG.search(data, position + PARSE_BLOCK_BYTES)
+        block_end = found.start() if found else len(data)
+        block = ET.fromstring(head + data[position:block_end] + b'</sheetData></worksheet>')
+        position = block_end
+        for element in block.iter(row_tag):
+            number = int(element.get('r')) if element.get('r') else last + 1
+            if first is None:
+                first = number
+            elif number > last + 1:
+                rows.extend([] for _ in range(number - last - 1))
+            last = number
+            values, column = [], 0
+            for cell in element.iter(cell_tag):
+                ref = cell.get('r')
+                if ref:
+                    letters = ref.rstrip('0123456789')
+                    column = columns.get(letters)
+                    if column is None:
+                        column = columns[letters] = column_index_from_string(letters) - 1
+                if column > len(values):
+                    values.extend([None] * (column - len(values)))
+                values.append(cell_value(cell))
+                column += 1
+            rows.append(values)
+    return first, pd.DataFrame(rows)
+
+
+def iter_excel_parallel(file_path, workers=None, parts=None):
+    """多进程并行解析 xlsx / xlsm 名单的第一个工作表，按行序依次生成 DataFrame 块（每段一块）
+
+    工作表 XML 按字节均分为 parts 段（默认每个进程两段，对齐到行），各子进程独立解压并只解析自己的一段，
+    主进程按行号顺序接收各段结果。表头、空表头列名和末尾空行的处理与分块读取一致。
+    """
+    workers = workers or os.cpu_count() or 1
+    parts = parts or workers * PARALLEL_PARTS_PER_WORKER
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        results = executor.map(_parse_sheet_part, [file_path] * parts, range(parts), [parts] * parts)
+        columns, expected, blanks = None, 1, []
+        for first, frame in results:
+            if first is None:
+                continue
+            if first > expected:
+                # 分段之间缺失的行
+                frame = pd.concat([pd.DataFrame(index=range(first - expected)), frame], ignore_index=True)
+            expected += len(frame)
+
+            if columns is None:
+                header = list(frame.iloc[0])  # 第 1 行缺失时为空行
+                header = [None if pd.isna(name) else name for name in header]
+                while header and header[-1] is None:
+                    header.pop()
+                if not header:
+                    raise ValueError('名单文件为空')
+                columns = [name if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+                frame = frame.iloc[1:]
+            frame = frame.reindex(columns=range(len(columns)))
+            frame.columns = columns
+
+            # 末尾的空行暂存，后面还有数据时才计入
+            filled = np.flatnonzero(frame.notna().any(axis=1).to_numpy())
+            if not len(filled):
+                blanks.append(frame)
+                continue
+            yield pd.concat(blanks + [frame.iloc[:filled[-1] + 1]], ignore_index=True)
+            blanks = [frame.iloc[filled[-1] + 1:]]
+        if columns is None:
+            raise ValueError('名单文件为空')
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def read_excel_parallel(file_path, workers=None, parts=None):
+    """多进程并行解析 xlsx / xlsm 名单的第一个工作表，返回 DataFrame（见 iter_excel_parallel）"""
+    chunks = list(iter_excel_parallel(file_path, workers, parts))
+    return pd.concat(chunks, ignore_index=True).infer_objects()
+
+
+def iter_roster_chunks(file_path, chunk_rows=CHUNK_ROWS):
+    """分块读取名单，依次生成 (DataFrame 块, 使用的后端)
+
+    xlsx / xlsm 用 openpyxl 只读模式逐行读取，多核机器上的大文件改为多进程并行解析（每段一块），
+    并行解析失败时改用 openpyxl 从已读到的位置继续；
+    csv 按块读取，arrow 按文件中的记录批次读取；其他格式无法分块，整表作为一块。
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in ('.xlsx', '.xlsm') and 'parallel' in available_backends(file_path):
+        done = 0  # 已生成的行数
+        try:
+            for chunk in iter_excel_parallel(file_path):
+                yield chunk, 'parallel'
+                done += len(chunk)
+        except Exception:
+            for chunk in _iter_sheet_chunks(file_path, chunk_rows):
+                if done >= len(chunk):
+                    done -= len(chunk)
+                    continue
+                yield chunk.iloc[done:].reset_index(drop=True), 'openpyxl'
+                done = 0
+    elif ext in ('.xlsx', '.xlsm'):
+        for chunk in _iter_sheet_chunks(file_path, chunk_rows):
+            yield chunk, 'openpyxl'
+    elif ext in ('.arrow', '.feather'):
+        import pyarrow as pa
+        import pyarrow.ipc
+
+        reader = pa.ipc.open_file(pa.memory_map(file_path, 'r'))
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i).to_pandas(types_mapper=_arrow_types), 'arrow'
+    elif ext == '.csv':
+        with pd.read_csv(file_path, chunksize=chunk_rows) as reader:
+            for chunk in reader:
+                yield chunk, 'csv'
+    else:
+        df, backend, _ = read_roster(file_path)
+        yield df, backend
+
+
+def normalize_id(value):
+    """将员工 ID 统一为字符串形式（1001、1001.0、' 1001 ' 视为同一人）"""
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        if np.isnan(value):
+            return ''
+        if value.is_integer():
+            return str(int(value))
+    text = str(value).strip()
+    if text.endswith('.0') and text[:-2].isdigit():
+        text = text[:-2]
+    return text
+
+
+def normalize_ids(values):
+    """批量规范化员工 ID，返回字符串数组"""
+    return np.array([normalize_id(v) for v in values], dtype=object)
+
+
+# 员工 ID 为空时的整数键
+MISSING_KEY = np.iinfo(np.int64).min
+
+
+def employee_key(value):
+    """员工 ID 的整数键
+
+    不以 0 开头的纯数字 ID 取其数值（1001、1001.0、' 1001 ' 为同一人）；
+    以 0 开头的数字 ID（'001001' 与 1001 不是同一人）、含字母等其他 ID 取稳定哈希
+    （负数，跨进程、跨次运行不变）；空值为 MISSING_KEY。
+    """
+    text = normalize_id(value)
+    if not text:
+        return MISSING_KEY
+    if text.isascii() and text.isdigit() and len(text) < 19 and (text == '0' or text[0] != '0'):
+        return int(text)
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+    return -(int.from_bytes(digest, 'big') >> 1) - 1
+
+
+def employee_keys(values):
+    """批量计算员工 ID 整数键，返回 int64 数组；整数列直接转换，无需逐个处理"""
+    values = pd.Series(values)
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values.to_numpy(dtype=np.int64, na_value=MISSING_KEY)
+    if pd.api.types.is_float_dtype(values.dtype):
+        floats = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        missing = np.isnan(floats)
+        if (floats[~missing] == np.floor(floats[~missing])).all() and (np.abs(floats[~missing]) < 2 ** 53).all():
+            return np.where(missing, MISSING_KEY, np.nan_to_num(floats).astype(np.int64))
+    return np.fromiter((employee_key(v) for v in values), dtype=np.int64, count=len(values))
+
+
+def duplicate_keys(keys):
+    """重复的员工 ID：{整数键: 行位置数组}，空 ID 不计"""
+    unique, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+    repeated = (counts > 1) & (unique != MISSING_KEY)
+    positions = np.flatnonzero(repeated[inverse.ravel()])
+    if not len(positions):
+        return {}
+    order = positions[np.argsort(keys[positions], kind='stable')]
+    split = np.flatnonzero(np.diff(keys[order])) + 1
+    groups = sorted(np.split(order, split), key=lambda group: group[0])
+    return {int(keys[group[0]]): group for group in groups}
+
+
+def department_counts(df):
+    """按（三级部门, 四级部门）统计人数，保持首次出现的顺序，空部门也计入"""
+    return df.groupby(['三级部门', '四级部门'], sort=False, dropna=False).size()
+
+
+def merge_department_counts(total, counts):
+    """累加两批部门人数统计（分块读取名单时逐块合并）"""
+    if total is None:
+        return counts
+    return pd.concat([total, counts]).groupby(level=[0, 1], sort=False, dropna=False).sum()
+
+
+def detect_provinces(df):
+    """识别名单中的省区
+
+    四级部门含“省区”或三级部门含“独立省区”的部门视为省区，同名时按四级部门处理。
+    返回按名称排序的 [(省区名称, 所在列, 人数, 上级部门), ...]
+    """
+    return provinces_from_counts(department_counts(df))
+
+
+def provinces_from_counts(counts):
+    """由部门人数统计（见 department_counts）识别省区，返回值同 detect_provinces"""
+    fourth_counts = counts.groupby(level=1).sum()
+    third_counts = counts.groupby(level=0).sum()
+    fourth_level_provinces = {
+        dept for dept in fourth_counts.index
+        if isinstance(dept, str) and '省区' in dept
+    }
+    third_level_provinces = {
+        dept for dept in third_counts.index
+        if isinstance(dept, str) and '独立省区' in dept
+    }
+
+    # 四级部门省区的上级部门（首次出现的三级部门），用于按大区筛选
+    pairs = counts.index.to_frame(index=False)
+    parents = (
+        pairs.dropna(subset=['四级部门'])
+        .drop_duplicates('四级部门')
+        .set_index('四级部门')['三级部门']
+    )
+
+    provinces = []
+    for province in sorted(fourth_level_provinces | third_level_provinces):
+        if province in fourth_level_provinces:
+            parent = parents.get(province)
+            provinces.append((
+                province, '四级部门', int(fourth_counts[province]),
+                parent if isinstance(parent, str) else ''
+            ))
+        else:
+            provinces.append((province, '三级部门', int(third_counts[province]), ''))
+    return provinces
+
+
+def province_mask(df, provinces):
+    """所选省区的行掩码，provinces: [(省区名称, 所在列), ...]"""
+    mask = np.zeros(len(df), dtype=bool)
+    for province, level in provinces:
+        mask |= (df[level] == province).to_numpy()
+    return mask
+
+
+def _factorize_sorted(values):
+    """列值编码：返回 (编码数组, 名称列表)，名称按字母排序，空值编码为最后一个（名称为 None）"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.cat.reorder_categories(sorted(values.cat.categories, key=str))
+    codes, uniques = pd.factorize(values, sort=True)
+    uniques = list(uniques) + [None]
+    return np.where(codes < 0, len(uniques) - 1, codes), uniques
+
+
+class DepartmentTree:
+    """部门树：三级部门 → 四级部门
+
+    节点人数在加载时由一次 groupby 统计；codes 记录每行所属的三级、四级节点序号，
+    剩余人数随每轮中签行按 O(k) 增减。任意层级（含省区）的选择都换算为节点集合，
+    筛选和计数都无需重新扫描部门名称。
+    """
+    THIRD = '三级部门'
+    FOURTH = '四级部门'
+    BLANK = '（未填写）'  # 部门为空时的节点名称
+
+    def __init__(self, df):
+        # 两列分别编码后组合成（三级, 四级）对：按名称排序、空部门排最后，与 groupby(sort=True) 一致，
+        # 但比 groupby().ngroup() 快得多（分类列直接使用其编码）
+        third_codes, thirds = _factorize_sorted(df[self.THIRD])
+        fourth_codes, fourths = _factorize_sorted(df[self.FOURTH])
+        pair_ids, pairs = pd.factorize(third_codes * len(fourths) + fourth_codes, sort=True)
+        sizes = np.bincount(pair_ids, minlength=len(pairs))
+
+        self.names = []    # 节点名称
+        self.levels = []   # 节点所在列
+        self.parents = []  # 上级节点序号，三级部门为 -1
+        self.counts = []   # 节点人数
+        self.children = {}  # 三级节点序号 → [四级节点序号, ...]
+        # (名称, 所在列) → [节点序号, ...]：同名四级部门可能挂在不同三级部门下，
+        # 按“三级部门/四级部门”路径查找时只对应一个节点
+        self.lookup = {}
+
+        third_nodes = {}
+        pair_codes = []
+        for pair, size in zip(pairs.tolist(), sizes.tolist()):
+            third, fourth = thirds[pair // len(fourths)], fourths[pair % len(fourths)]
+            third = third if isinstance(third, str) else self.BLANK
+            if third not in third_nodes:
+                third_nodes[third] = self._add_node(third, self.THIRD, -1)
+                self.children[third_nodes[third]] = []
+            parent = third_nodes[third]
+            self.counts[parent] += size
+            child = -1
+            if isinstance(fourth, str):
+                child = self._add_node(fourth, self.FOURTH, parent)
+                self.lookup[self.path(child), self.FOURTH] = [child]
+                self.counts[child] = size
+                self.children[parent].append(child)
+            pair_codes.append((parent, child))
+
+        self.counts = np.array(self.counts, dtype=np.int64)
+        self.levels = np.array(self.levels, dtype=object)
+        self.parents = np.array(self.parents, dtype=np.intp)
+        self.codes = np.array(pair_codes, dtype=np.intp).reshape(-1, 2)[pair_ids]
+        self.remaining = self.counts.copy()
+
+    def _add_node(self, name, level, parent):
+        self.names.append(name)
+        self.levels.append(level)
+        self.parents.append(parent)
+        self.counts.append(0)
+        self.lookup.setdefault((name, level), []).append(len(self.names) - 1)
+        return len(self.names) - 1
+
+    def __len__(self):
+        return len(self.names)
+
+    def path(self, node):
+        """节点路径：三级部门为名称本身，四级部门为“三级部门/四级部门”"""
+        parent = self.parents[node]
+        if parent < 0:
+            return self.names[node]
+        return f'{self.names[parent]}/{self.names[node]}'
+
+    @property
+    def roots(self):
+        return list(self.children)
+
+    def resolve(self, departments):
+        """[(名称, 所在列), ...] → 节点序号数组，名称不存在时抛出 DrawError"""
+        nodes = []
+        for name, level in departments:
+            if (name, level) not in self.lookup:
+                raise DrawError(f'未知部门：{name}')
+            nodes.extend(self.lookup[name, level])
+        return np.unique(np.array(nodes, dtype=np.intp))
+
+    def groups(self, level):
+        """每行在 level 列所属的节点序号（用于按部门分组）；四级部门为空的行按所在三级部门归为一组"""
+        if level == self.THIRD:
+            return self.codes[:, 0]
+        return np.where(self.codes[:, 1] >= 0, self.codes[:, 1], self.codes[:, 0])
+
+    def mask(self, nodes):
+        """所选节点的行掩码"""
+        return np.isin(self.codes, nodes).any(axis=1)
+
+    def count_remaining(self, active):
+        """按可抽取行掩码重新统计各节点剩余人数（O(n)，仅在加载和更新排除名单时执行）"""
+        third, fourth = self.codes[:, 0], self.codes[:, 1]
+        # 以掩码为权重计数，避免先按掩码复制整张编码表；四级为空（-1）的行计入第 0 格后丢弃
+        self.remaining = (
+            np.bincount(third, weights=active, minlength=len(self))
+            + np.bincount(fourth + 1, weights=active, minlength=len(self) + 1)[1:]
+        ).astype(np.int64)
+
+    def adjust(self, positions, delta):
+        """按一轮中签行增减剩余人数（O(k)）"""
+        codes = self.codes[positions]
+        fourth = codes[:, 1]
+        np.add.at(self.remaining, codes[:, 0], delta)
+        np.add.at(self.remaining, fourth[fourth >= 0], delta)
+
+    def remaining_count(self, nodes):
+        """所选节点合并后的剩余人数；上级已选中的四级部门不重复计算"""
+        nodes = np.asarray(nodes, dtype=np.intp)
+        covered = np.isin(self.parents[nodes], nodes)
+        return int(self.remaining[nodes[~covered]].sum())
+
+    def node_remaining(self, departments):
+        """[(名称, 所在列), ...] 中每一项的剩余人数"""
+        return np.array([
+            self.remaining[self.lookup[key]].sum() for key in departments
+        ], dtype=np.int64)
+
+
+def select_by_random_keys(keys, eligible, k):
+    """按随机键抽取：在符合条件的行中取随机键最小的 k 行
+
+    keys 形状为 (..., n)，可一次处理多组随机键（审计模拟时按批并行）；
+    eligible 为 (n,) 或 (..., n) 的布尔掩码。调用方需保证每组至少有 k 个符合条件的行。
+    返回 (..., k) 的行位置，按随机键从小到大排列（即抽中顺序）。
+    """
+    keys = np.where(eligible, keys, np.inf)
+    part = np.argpartition(keys, k - 1, axis=-1)[..., :k]
+    order = np.argsort(np.take_along_axis(keys, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def _rank_in_group(groups):
+    """每个元素在同组元素中的序号（按原顺序从 0 开始）"""
+    order = np.argsort(groups, kind='stable')
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    lengths = np.diff(np.r_[starts, len(groups)])
+    rank = np.empty(len(groups), dtype=np.intp)
+    rank[order] = np.arange(len(groups)) - np.repeat(starts, lengths)
+    return rank
+
+
+def select_with_quotas(keys, eligible, k, max_rule=None, min_rule=None):
+    """按随机键抽取，并满足部门分布限制（不做“抽完不合格再重抽”，耗时固定为一次排序）
+
+    max_rule / min_rule 为 (每行分组序号, 人数, 说明文字)：同组最多 / 至少中签的人数。
+    按随机键从小到大依次考虑：先去掉超出本组上限的人，再为每组保留随机键最小的“至少”名额，
+    其余名额取剩下随机键最小的人。无限制时结果与 select_by_random_keys 相同。
+    无法满足时抛出 DrawError。返回行位置，按随机键从小到大排列。
+    """
+    positions = np.flatnonzero(eligible)
+    candidates = positions[np.argsort(keys[positions], kind='stable')]
+
+    if max_rule is not None:
+        groups, limit, label = max_rule
+        candidates = candidates[_rank_in_group(groups[candidates]) < limit]
+        if len(candidates) < k:
+            raise DrawError(f'按{label}最多 {limit} 人的限制，本轮最多只能抽取 {len(candidates)} 人')
+
+    chosen = np.zeros(len(candidates), dtype=bool)
+    if min_rule is not None:
+        groups, limit, label = min_rule
+        candidate_groups = groups[candidates]
+        chosen = _rank_in_group(candidate_groups) < limit
+        _, sizes = np.unique(candidate_groups, return_counts=True)
+        short = int((sizes < limit).sum()) + len(np.unique(groups[positions])) - len(sizes)
+        if short:
+            raise DrawError(f'有 {short} 个部门可抽人数不足 {limit} 人，无法满足{label}至少 {limit} 人')
+        required = int(chosen.sum())
+        if required > k:
+            raise DrawError(f'{label}至少 {limit} 人共需抽取 {required} 人，超过本轮抽取人数 {k} 人')
+
+    # 其余名额按随机键顺序补足
+    chosen[np.flatnonzero(~chosen)[:k - int(chosen.sum())]] = True
+    return candidates[chosen]
+
+
+class DrawConstraints:
+    """一轮抽取的部门分布限制
+
+    max_per = (所在列, 人数)：同一部门最多中签几人，如同一四级部门最多 2 人；
+    min_per = (所在列, 人数)：每个部门至少中签几人，如每个三级部门至少 1 人。
+    “至少”只针对本轮范围内仍有可抽人员的部门。
+    """
+
+    LEVELS = (DepartmentTree.THIRD, DepartmentTree.FOURTH)
+
+    def __init__(self, max_per=None, min_per=None):
+        for rule in (max_per, min_per):
+            if rule is not None and (rule[0] not in self.LEVELS or int(rule[1]) < 1):
+                raise DrawError(f'无效的分布限制：{rule[0]} {rule[1]} 人')
+        self.max_per = (max_per[0], int(max_per[1])) if max_per else None
+        self.min_per = (min_per[0], int(min_per[1])) if min_per else None
+
+    def __bool__(self):
+        return bool(self.max_per or self.min_per)
+
+    def describe(self):
+        parts = []
+        if self.max_per:
+            parts.append(f'同一{self.max_per[0]}最多 {self.max_per[1]} 人')
+        if self.min_per:
+            parts.append(f'每个{self.min_per[0]}至少 {self.min_per[1]} 人')
+        return '，'.join(parts)
+
+    def as_dict(self):
+        return {
+            name: list(rule) for name, rule in (('max_per', self.max_per), ('min_per', self.min_per)) if rule
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 as_dict 的结果（抽签记录、服务请求）还原，无限制时返回 None"""
+        if not data:
+            return None
+        try:
+            constraints = cls(data.get('max_per'), data.get('min_per'))
+        except (TypeError, ValueError, IndexError):
+            raise DrawError(f'无效的分布限制：{data}')
+        return constraints or None
+
+    def select(self, tree, keys, eligible, k):
+        """在可抽取行中按随机键抽取 k 人并满足限制，见 select_with_quotas"""
+        def rule(spec, word):
+            if spec is None:
+                return None
+            level, count = spec
+            return tree.groups(level), count, f'{word}{level}'
+        return select_with_quotas(keys, eligible, k, rule(self.max_per, '同一'), rule(self.min_per, '每个'))
+
+
+class EligibilityRule:
+    """抽签资格条件：按名单中部门以外的列（职级、入职年份、是否驻场等）限定可抽人员
+
+    条件为可存入抽签记录的嵌套 dict：
+        {'column': '职级', 'values': ['P5', 'P6']}    该列取值为其中之一（日期列按年份，如 '2020'）
+        {'and': [条件, ...]}、{'or': [条件, ...]}、{'not': 条件}
+    按 BitmapIndex 的位图求值。
+    """
+
+    def __init__(self, expression):
+        self.expression = self._validate(expression)
+
+    @classmethod
+    def _validate(cls, expression):
+        if isinstance(expression, dict) and len(expression) <= 2:
+            if 'column' in expression:
+                column, values = expression['column'], expression.get('values')
+                if isinstance(column, str) and isinstance(values, list) and values:
+                    return {'column': column, 'values': [str(value) for value in values]}
+            elif 'not' in expression and len(expression) == 1:
+                return {'not': cls._validate(expression['not'])}
+            elif len(expression) == 1:
+                (op, items), = expression.items()
+                if op in ('and', 'or') and isinstance(items, list) and items:
+                    return {op: [cls._validate(item) for item in items]}
+        raise DrawError(f'无效的资格条件：{expression}')
+
+    def describe(self, expression=None, parent=None):
+        """条件的文字说明，如“职级为 P5/P6 且 非（是否驻场为 是）”"""
+        expression = expression or self.expression
+        if 'column' in expression:
+            return f"{expression['column']}为 {'/'.join(expression['values'])}"
+        if 'not' in expression:
+            return f"非（{self.describe(expression['not'], 'not')}）"
+        op = 'and' if 'and' in expression else 'or'
+        text = f" {'且' if op == 'and' else '或'} ".join(self.describe(item, op) for item in expression[op])
+        return f'（{text}）' if parent in ('and', 'or') and parent != op and len(expression[op]) > 1 else text
+
+    def as_dict(self):
+        return copy.deepcopy(self.expression)
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 as_dict 的结果（抽签记录、服务请求）还原，无条件时返回 None"""
+        return cls(data) if data else None
+
+
+# 资格条件只针对取值种类不超过此数的列（员工 ID、姓名等逐人不同的列不参与）
+RULE_MAX_VALUES = 64
+
+
+def _rule_label(value):
+    """列取值在资格条件中的写法：整数值的小数写成整数，空值为“（未填写）”"""
+    if value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return DepartmentTree.BLANK
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class BitmapIndex:
+    """资格条件位图索引：每列的每个取值一个压缩位图（np.packbits，每人 1 位）
+
+    各列在第一次用到时建立位图，日期列按入职年份等年份建立。
+    与 / 或 / 非 直接在压缩位图上逐字节计算（百万人的名单每次运算约 125 KB），
+    求得的行掩码按条件缓存，同一条件连续抽签时只需一次按位与。
+    """
+
+    SKIP_COLUMNS = ('员工 ID', '姓名')
+
+    def __init__(self, df, max_values=RULE_MAX_VALUES):
+        self.df = df
+        self.size = len(df)
+        self.max_values = max_values
+        self._bitmaps = {}  # 列名 → {取值: 位图}，取值过多的列为 None
+        self._masks = {}  # 条件 → 行掩码
+
+    def _tail(self):
+        """最后一个字节中有效位的掩码（取反后清除补齐的位）"""
+        return np.uint8((0xFF << (-self.size % 8)) & 0xFF)
+
+    def column_bitmaps(self, column):
+        """某列各取值的位图 {取值: 位图}，列不存在或取值过多时抛出 DrawError"""
+        if column not in self._bitmaps:
+            if column not in self.df.columns or column in self.SKIP_COLUMNS:
+                raise DrawError(f'名单中没有可用作资格条件的“{column}”列')
+            self._bitmaps[column] = self._build(self.df[column])
+        if self._bitmaps[column] is None:
+            raise DrawError(f'“{column}”列取值超过 {self.max_values} 种，不能用作资格条件')
+        return self._bitmaps[column]
+
+    def _build(self, values):
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = values.dt.year
+        try:
+            codes, uniques = pd.factorize(values, sort=True)
+        except TypeError:  # 数字与文字混排
+            codes, uniques = pd.factorize(values.astype(str).where(values.notna()), sort=True)
+        if len(uniques) > self.max_values:
+            return None
+        bitmaps = {}
+        for code, value in enumerate(uniques):
+            label = _rule_label(value)
+            bits = np.packbits(codes == code)
+            bitmaps[label] = bitmaps[label] | bits if label in bitmaps else bits
+        if (codes < 0).any():
+            bitmaps[DepartmentTree.BLANK] = np.packbits(codes < 0)
+        return bitmaps
+
+    def columns(self):
+        """可用作资格条件的列及各取值人数：[(列名, [(取值, 人数), ...]), ...]"""
+        result = []
+        for column in self.df.columns:
+            try:
+                bitmaps = self.column_bitmaps(column)
+            except DrawError:
+                continue
+            result.append((column, [(label, popcount(bits)) for label, bits in bitmaps.items()]))
+        return result
+
+    def bits(self, expression):
+        """条件对应的压缩位图"""
+        if 'column' in expression:
+            bitmaps = self.column_bitmaps(expression['column'])
+            result = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+            for value in expression['values']:
+                if value in bitmaps:
+                    result |= bitmaps[value]
+            return result
+        if 'not' in expression:
+            result = ~self.bits(expression['not'])
+            if len(result):
+                result[-1] &= self._tail()
+            return result
+        op = 'and' if 'and' in expression else 'or'
+        items = iter(expression[op])
+        result = self.bits(next(items)).copy()
+        for item in items:
+            (np.bitwise_and if op == 'and' else np.bitwise_or)(result, self.bits(item), out=result)
+        return result
+
+    def mask(self, rule):
+        """资格条件（EligibilityRule）的行掩码，按条件缓存"""
+        key = json.dumps(rule.expression, ensure_ascii=False, sort_keys=True)
+        if key not in self._masks:
+            self._masks[key] = np.unpackbits(self.bits(rule.expression), count=self.size).view(bool)
+        return self._masks[key]
+
+
+def popcount(bits):
+    """压缩位图中 1 的个数"""
+    return int(np.bitwise_count(bits).sum())
+
+
+def roster_fingerprint(df):
+    """名单指纹：按行序对员工 ID、姓名、三级部门、四级部门取 SHA-256
+
+    只包含影响抽签结果的列，与读取后端（calamine / openpyxl / csv）无关。
+    """
+    digest = hashlib.sha256()
+    columns = [normalize_ids(df['员工 ID'])] + [
+        df[column].astype(object).fillna('').astype(str).to_numpy(dtype=object)
+        for column in ('姓名', '三级部门', '四级部门')
+    ]
+    for row in zip(*columns):
+        digest.update('\x1f'.join(row).encode('utf-8'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+def round_rng(seed, serial):
+    """第 serial 次抽取使用的随机数生成器，由会话种子和抽取序号唯一确定"""
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(serial,)))
+
+
+def draw_positions(rng, eligible, k, constraints=None, tree=None):
+    """抽取一轮：为名单每行生成一个随机键，返回中签行位置
+
+    有部门分布限制时按 constraints.select 抽取（需传入部门树）。
+    """
+    keys = rng.random(len(eligible))
+    if constraints:
+        return constraints.select(tree, keys, eligible, k)
+    return select_by_random_keys(keys, eligible, k)
+
+
+def province_labels(df):
+    """每行所属省区（优先四级部门），无法识别时为“未知”"""
+    fourth = df['四级部门']
+    third = df['三级部门']
+    is_fourth = fourth.map(lambda dept: isinstance(dept, str) and '省区' in dept).to_numpy(dtype=bool)
+    is_third = third.map(lambda dept: isinstance(dept, str) and '独立省区' in dept).to_numpy(dtype=bool)
+    return np.where(
+        is_fourth, fourth.to_numpy(dtype=object),
+        np.where(is_third, third.to_numpy(dtype=object), '未知')
+    )
+
+
+def pinyin_initials(names):
+    """姓名的拼音首字母（小写），未安装 pypinyin 时返回 None"""
+    try:
+        from pypinyin import lazy_pinyin, Style
+    except ImportError:
+        return None
+    cache = {}
+    for name in names:
+        if name not in cache:
+            cache[name] = ''.join(lazy_pinyin(name, style=Style.FIRST_LETTER)).lower()
+    return [cache[name] for name in names]
+
+
+class RosterIndex:
+    """名单检索索引
+
+    员工 ID 按整数键（见 employee_key）使用哈希表精确查找；姓名（及拼音首字母）保存为有序数组，
+    前缀查找只需两次二分，十万行名单也能即时返回。
+    """
+
+    def __init__(self, keys, names):
+        self.id_positions = {}
+        for position, key in enumerate(keys.tolist()):
+            if key != MISSING_KEY:
+                self.id_positions.setdefault(key, []).append(position)
+        self._names, self._name_order = self._sorted(names)
+        initials = pinyin_initials(names)
+        self._initials = self._initials_order = None
+        if initials is not None:
+            self._initials, self._initials_order = self._sorted(initials)
+
+    @staticmethod
+    def _sorted(values):
+        values = np.asarray(values, dtype=str)
+        order = np.argsort(values, kind='stable')
+        return values[order], order
+
+    @staticmethod
+    def _prefix(sorted_values, order, prefix):
+        start = np.searchsorted(sorted_values, prefix, side='left')
+        stop = np.searchsorted(sorted_values, prefix + '\U0010ffff', side='left')
+        return order[start:stop]
+
+    def search(self, query, limit=20):
+        """按员工 ID 或姓名前缀（拼音首字母前缀）查找，返回匹配的行位置（ID 精确匹配在前）"""
+        query = query.strip()
+        if not query:
+            return np.array([], dtype=np.intp)
+
+        parts = [
+            np.asarray(self.id_positions.get(employee_key(query), []), dtype=np.intp),
+            self._prefix(self._names, self._name_order, query),
+        ]
+        if self._initials is not None and query.isascii():
+            parts.append(self._prefix(self._initials, self._initials_order, query.lower()))
+
+        found = np.concatenate(parts)
+        _, first = np.unique(found, return_index=True)
+        return found[np.sort(first)][:limit]
+
+
+def safe_filename(name):
+    """去掉文件名中不允许出现的字符"""
+    return re.sub(r'[\\/:*?"<>|]', '_', str(name)).strip() or '未命名'
+
+
+def write_frame(file_path, frame):
+    """按扩展名把表格写成 csv、arrow 或 xlsx"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == '.csv':
+        frame.to_csv(file_path, index=False, encoding='utf-8-sig')
+    elif ext in ('.arrow', '.feather'):
+        write_arrow(file_path, frame)
+    else:
+        write_workbook(file_path, frame)
+
+
+def write_workbook(file_path, frame):
+    """写出一个工作簿（供进程池调用，需为模块级函数）"""
+    frame.to_excel(file_path, index=False, engine='openpyxl')
+    return file_path
+
+
+# 流式导出时中签行的高亮底色
+HIGHLIGHT_COLOR = 'FFF3CD'
+
+
+def _column_widths(file_path, max_column):
+    """读取第一个工作表的列宽
+
+    只读模式不解析 <cols>，这里用 zipfile 直接扫描工作表 XML，读到 <sheetData> 即停止。
+    """
+    from xml.etree.ElementTree import iterparse
+    from openpyxl.utils import get_column_letter
+
+    last_column = (max_column or 0) + 1
+    widths = {}
+    with zipfile.ZipFile(file_path) as archive, archive.open(_xlsx_layout(archive)[0]) as xml:
+        for _, element in iterparse(xml, events=('start',)):
+            if element.tag == _MAIN_NS + 'sheetData':
+                break
+            if element.tag == _MAIN_NS + 'col' and element.get('width'):
+                first = int(element.get('min'))
+                last = min(int(element.get('max')), last_column)
+                for column in range(first, last + 1):
+                    widths[get_column_letter(column)] = float(element.get('width'))
+    return widths
+
+
+def stream_export(source_path, output_path, drawn_mask, column='是否被抽中'):
+    """流式导出标记结果：只读模式逐行读取源工作簿，只写模式逐行写出
+
+    保留源表的列宽、字体、表头样式和数字格式，中签行加高亮底色并在“是否被抽中”列标记“是”，
+    内存占用与名单大小无关。源表数据行数与名单不一致时抛出 ValueError。
+    返回写出的数据行数。
+    """
+    from openpyxl import load_workbook, Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import NamedStyle, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    highlight = PatternFill('solid', fgColor=HIGHLIGHT_COLOR)
+    source = load_workbook(source_path, read_only=True)
+    output = Workbook(write_only=True)
+    try:
+        sheet = source.worksheets[0]
+        out_sheet = output.create_sheet(sheet.title)
+        for letter, width in _column_widths(source_path, sheet.max_column).items():
+            out_sheet.column_dimensions[letter].width = width
+
+        # 同一源样式（及是否高亮）只在首次遇到时登记为一个命名样式，之后按名称直接套用
+        style_fields = ('font', 'fill', 'border', 'alignment', 'protection', 'number_format')
+        styles = {}
+
+        def styled(value, source_cell, highlighted):
+            cell = WriteOnlyCell(out_sheet, value)
+            has_style = getattr(source_cell, 'has_style', False)
+            if not has_style and not highlighted:
+                return cell
+            source_style = [getattr(source_cell, field) for field in style_fields] if has_style else []
+            key = (tuple(map(id, source_style)), highlighted)
+            name = styles.get(key)
+            if name is None:
+                name = f'抽签导出 {len(styles) + 1}'
+                named = NamedStyle(name=name)
+                for field, style in zip(style_fields, source_style):
+                    setattr(named, field, copy.copy(style))
+                if highlighted:
+                    named.fill = highlight
+                output.add_named_style(named)
+                styles[key] = name
+            cell.style = name
+            return cell
+
+        rows = sheet.iter_rows()
+        header = list(next(rows, ()))
+        names = [cell.value for cell in header]
+        if not names:
+            raise ValueError('源工作簿为空')
+        if column in names:
+            mark = names.index(column)
+        else:
+            mark = len(names)
+            out_sheet.column_dimensions[get_column_letter(mark + 1)].width = 12
+            header.append(header[-1])
+            names.append(column)
+        out_sheet.append([styled(name, cell, False) for name, cell in zip(names, header)])
+
+        count = 0
+        width = len(names)
+        for row in rows:
+            values = [cell.value for cell in row]
+            if count >= len(drawn_mask):
+                if any(value is not None for value in values):
+                    raise ValueError('源工作簿的数据行数多于名单，无法按行标记')
+                continue
+            winner = bool(drawn_mask[count])
+            count += 1
+
+            values += [None] * (width - len(values))
+            values[mark] = '是' if winner else None
+            if not winner and not any(getattr(cell, 'has_style', False) for cell in row):
+                out_sheet.append(values)
+            else:
+                cells = list(row) + [None] * (width - len(row))
+                out_sheet.append([
+                    styled(value, cell, winner) for value, cell in zip(values, cells)
+                ])
+
+        if count != len(drawn_mask):
+            raise ValueError('源工作簿的数据行数少于名单，无法按行标记')
+    finally:
+        source.close()
+
+    output.save(output_path)
+    return count
+
+
+class DrawSession:
+    """一场抽签会话
+
+    保存名单、省区、往期排除掩码和各轮中签行位置，
+    界面与抽签服务共用同一套抽签流程。
+    每次抽取的随机数由会话种子和抽取序号决定，配合抽签记录可完整重放。
+    """
+
+    def __init__(self, df, excluded=None, file_path=None, backend=None, load_seconds=None, seed=None):
+        self.df = df
+        self.file_path = file_path
+        self.backend = backend  # 读取名单使用的后端
+        self.load_seconds = load_seconds  # 读取名单耗时
+        self.provinces = detect_provinces(df)
+        self.levels = {province: level for province, level, _, _ in self.provinces}
+        self.tree = DepartmentTree(df)
+        # 员工 ID 整数键（加载时计算一次），排除、查找、重放都按整数键比较
+        self.keys = employee_keys(df['员工 ID'])
+        self.duplicates = duplicate_keys(self.keys)  # {整数键: 行位置数组}
+        self.seed = seed if seed is not None else np.random.SeedSequence().entropy
+        self.next_serial = 1  # 下一次抽取的序号（撤销后不回退，保证每次抽取的随机数互不相同）
+        self.drawn_mask = np.zeros(len(df), dtype=bool)
+        self.drawn_round = np.zeros(len(df), dtype=np.int32)  # 中签轮次，0 为未中签
+        self.excluded = excluded if excluded is not None else np.zeros(len(df), dtype=bool)
+        self.drawn_total = 0
+        self.rounds = []  # [(所选省区, 中签行位置), ...]
+        self.redo_stack = []  # 已撤销、可重做的轮次
+        self.round_info = []  # 与 rounds 对应：[(抽取序号, 抽取时的往期排除行位置, 分布限制, 资格条件), ...]
+        self._redo_info = []  # 与 redo_stack 对应
+        self.is_ended = False
+        self._labels = None
+        self._names = None
+        self._ids = None
+        self._fingerprint = None
+        self._search_index = None
+        self._bitmaps = None
+
+    @classmethod
+    def from_file(cls, file_path, exclusion_index=None, backend=None):
+        df, backend, seconds = read_roster(file_path, backend)
+        session = cls(df, None, file_path, backend, seconds)
+        if exclusion_index is not None:
+            session.excluded = exclusion_index.mask_for(session.keys)
+        return session
+
+    @property
+    def excluded(self):
+        return self._excluded
+
+    @excluded.setter
+    def excluded(self, mask):
+        """更新往期排除掩码，并重新统计各部门剩余人数"""
+        self._excluded = mask
+        self._excluded_positions = np.flatnonzero(mask)
+        active = ~(mask | self.drawn_mask)
+        self.tree.count_remaining(active)
+        self.available_bits = np.packbits(active)  # 未中签且未被排除的人（压缩位图，每轮按中签行更新）
+
+    @property
+    def remaining(self):
+        """各省区（与 provinces 顺序一致）的剩余人数"""
+        return self.tree.node_remaining([(province, level) for province, level, _, _ in self.provinces])
+
+    def remaining_count(self, provinces):
+        """所选省区 / 部门合并后的剩余人数，provinces 为 [(名称, 所在列), ...]"""
+        if not provinces:
+            return 0
+        return self.tree.remaining_count(self.tree.resolve(provinces))
+
+    def check_available(self, provinces, draw_count):
+        """按剩余人数预先校验本轮能否抽取，无需筛选名单"""
+        if self.is_ended:
+            raise DrawError('抽签已结束，如需重新开始请重新加载文件')
+        if draw_count < 1:
+            raise DrawError('抽取人数必须大于 0')
+        if not provinces:
+            raise DrawError('请至少选择一个省区')
+
+        available = self.remaining_count(provinces)
+        if available == 0:
+            raise DrawError('选中的省区中已无未抽中的人员')
+        if available < draw_count:
+            raise DrawError(f'选中省区中只有 {available} 人未抽中，无法抽取 {draw_count} 人')
+
+    @property
+    def labels(self):
+        """每行所属省区，首次使用时计算"""
+        if self._labels is None:
+            self._labels = province_labels(self.df)
+        return self._labels
+
+    @property
+    def names(self):
+        """姓名列的 NumPy 数组，首次使用时生成"""
+        if self._names is None:
+            self._names = self.df['姓名'].astype(str).to_numpy(dtype=object)
+        return self._names
+
+    @property
+    def ids(self):
+        """规范化后的员工 ID 数组，首次使用时生成"""
+        if self._ids is None:
+            self._ids = normalize_ids(self.df['员工 ID'])
+        return self._ids
+
+    def duplicate_summary(self, limit=5):
+        """重复员工 ID 的说明文字，如“1001（第 2、5 行）”，最多列出 limit 个"""
+        ids = self.ids
+        parts = [
+            f"{ids[positions[0]]}（第 {'、'.join(str(p + 2) for p in positions)} 行）"
+            for positions in list(self.duplicates.values())[:limit]
+        ]
+        if len(self.duplicates) > limit:
+            parts.append(f'等 {len(self.duplicates)} 个')
+        return '，'.join(parts)
+
+    @property
+    def fingerprint(self):
+        """名单指纹，首次使用时计算"""
+        if self._fingerprint is None:
+            self._fingerprint = roster_fingerprint(self.df)
+        return self._fingerprint
+
+    @property
+    def bitmaps(self):
+        """资格条件位图索引，首次使用时建立"""
+        if self._bitmaps is None:
+            self._bitmaps = BitmapIndex(self.df)
+        return self._bitmaps
+
+    def rule_counts(self, rule):
+        """符合资格条件的人数及其中仍可抽取的人数（只做位图运算）"""
+        bits = self.bitmaps.bits(rule.expression)
+        return popcount(bits), popcount(bits & self.available_bits)
+
+    @property
+    def search_index(self):
+        """姓名 / 员工 ID 检索索引，首次使用时建立"""
+        if self._search_index is None:
+            self._search_index = RosterIndex(self.keys, self.names)
+        return self._search_index
+
+    def person_status(self, position, provinces=None):
+        """某人在本场的抽签状态，provinces 为当前所选省区 [(省区名称, 所在列), ...]"""
+        if self.drawn_round[position]:
+            return f'已中签（第 {self.drawn_round[position]} 轮）'
+        if self.excluded[position]:
+            return '往期已中签，本场排除'
+        if provinces:
+            if not np.isin(self.tree.codes[position], self.tree.resolve(provinces)).any():
+                return '不在所选范围'
+        elif self.labels[position] == '未知':
+            return '不属于任何省区'
+        return '未中签，可参与抽取'
+
+    def search(self, query, provinces=None, limit=20):
+        """查询人员，返回 [(行位置, 抽签状态), ...]"""
+        return [
+            (int(position), self.person_status(position, provinces))
+            for position in self.search_index.search(query, limit)
+        ]
+
+    @property
+    def draw_count(self):
+        return len(self.rounds)
+
+    @property
+    def drawn_positions(self):
+        """按抽中顺序排列的全部中签行位置"""
+        if not self.rounds:
+            return np.array([], dtype=np.intp)
+        return np.concatenate([positions for _, positions in self.rounds])
+
+    def resolve(self, names):
+        """省区名称 → [(省区名称, 所在列), ...]"""
+        unknown = [name for name in names if name not in self.levels]
+        if unknown:
+            raise DrawError(f'未知省区：{", ".join(unknown)}')
+        return [(name, self.levels[name]) for name in names]
+
+    def eligible(self, provinces, rule=None):
+        """本轮可抽取人员的行掩码，provinces 为 [(省区名称, 所在列), ...]，rule 为资格条件（EligibilityRule）"""
+        if not provinces:
+            raise DrawError('请至少选择一个省区')
+
+        # 筛选数据（按部门树节点合并所选省区 / 部门，无需逐个比较部门名称）
+        eligible = self.tree.mask(self.tree.resolve(provinces))
+        if not eligible.any():
+            raise DrawError('选中的省区中没有数据')
+
+        # 排除往期中签人员和已抽中的人员
+        eligible &= ~self.excluded
+        eligible &= ~self.drawn_mask
+        if rule is not None:
+            eligible &= self.bitmaps.mask(rule)
+        return eligible
+
+    def draw(self, provinces, draw_count, serial=None, constraints=None, rule=None):
+        """抽取一轮，provinces 为 [(省区名称, 所在列), ...]，返回中签行位置
+
+        serial 为抽取序号，默认取下一个序号；重放抽签记录时传入记录中的序号。
+        constraints 为部门分布限制（DrawConstraints），无法满足时抛出 DrawError，不会记录该轮。
+        rule 为资格条件（EligibilityRule），只在符合条件的人中抽取。
+        """
+        self.check_available(provinces, draw_count)
+        if serial is None:
+            serial = self.next_serial
+
+        # 随机抽取
+        eligible = self.eligible(provinces, rule)
+        if rule is not None:
+            available = int(eligible.sum())
+            if available < draw_count:
+                raise DrawError(
+                    f'选中省区中符合资格条件（{rule.describe()}）的未中签人员只有 {available} 人，'
+                    f'无法抽取 {draw_count} 人'
+                )
+        positions = draw_positions(round_rng(self.seed, serial), eligible, draw_count, constraints, self.tree)
+        self.next_serial = max(self.next_serial, serial + 1)
+        self._apply_round(list(provinces), positions, (serial, self._excluded_positions, constraints or None, rule))
+        self.redo_stack.clear()
+        self._redo_info.clear()
+        return positions
+
+    def _apply_round(self, provinces, positions, info):
+        self.drawn_mask[positions] = True
+        _set_bits(self.available_bits, positions, False)
+        self.drawn_total += len(positions)
+        self.tree.adjust(positions, -1)
+        self.rounds.append((provinces, positions))
+        self.round_info.append(info)
+        self.drawn_round[positions] = len(self.rounds)
+
+    def undo(self):
+        """撤销最后一轮，只还原该轮中签行（O(k)），返回 (所选省区, 中签行位置)"""
+        if self.is_ended:
+            raise DrawError('抽签已结束，无法撤销')
+        if not self.rounds:
+            raise DrawError('没有可撤销的抽签')
+        provinces, positions = self.rounds.pop()
+        self.drawn_mask[positions] = False
+        _set_bits(self.available_bits, positions[~self.excluded[positions]], True)
+        self.drawn_round[positions] = 0
+        self.drawn_total -= len(positions)
+        self.tree.adjust(positions, 1)
+        self.redo_stack.append((provinces, positions))
+        self._redo_info.append(self.round_info.pop())
+        return provinces, positions
+
+    def redo(self):
+        """重做最近撤销的一轮（恢复原中签人员，不重新抽取）"""
+        if self.is_ended:
+            raise DrawError('抽签已结束，无法重做')
+        if not self.redo_stack:
+            raise DrawError('没有可重做的抽签')
+        provinces, positions = self.redo_stack[-1]
+        if self.excluded[positions].any():
+            raise DrawError('该轮部分中签人员已被列入往期排除，无法重做')
+        self.redo_stack.pop()
+        self._apply_round(provinces, positions, self._redo_info.pop())
+        return provinces, positions
+
+    def journal(self):
+        """抽签记录：名单指纹、种子和按顺序排列的各轮参数及中签人员，可用于重放核验
+
+        往期排除名单只在第一轮及发生变化的轮次记录。
+        """
+        ids = self.ids
+        rounds = []
+        last_excluded = None
+        for (provinces, positions), (serial, excluded, constraints, rule) in zip(self.rounds, self.round_info):
+            entry = {
+                'serial': serial,
+                'provinces': [province for province, _ in provinces],
+                'levels': [level for _, level in provinces],
+                'count': len(positions),
+                'winners': ids[positions].tolist(),
+            }
+            if excluded is not last_excluded:
+                entry['excluded'] = ids[excluded].tolist()
+                last_excluded = excluded
+            if constraints:
+                entry['constraints'] = constraints.as_dict()
+            if rule is not None:
+                entry['rule'] = rule.as_dict()
+            rounds.append(entry)
+        return {
+            'version': 1,
+            'file': os.path.basename(self.file_path) if self.file_path else None,
+            'fingerprint': self.fingerprint,
+            'seed': self.seed,
+            'rounds': rounds,
+        }
+
+    def save_journal(self, file_path):
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.journal(), f, ensure_ascii=False, indent=2)
+
+    def winners(self, positions=None):
+        """中签人员明细（保留原始行索引），默认为全部已中签人员"""
+        if positions is None:
+            positions = self.drawn_positions
+        return self.df.iloc[positions]
+
+    # ---------- 插件事件内容 ----------
+
+    def load_event(self):
+        """on_load 事件：名单文件、人数和省区"""
+        return {
+            'file': self.file_path,
+            'total': len(self.df),
+            'provinces': [
+                {'name': name, 'level': level, 'count': count, 'parent': parent}
+                for name, level, count, parent in self.provinces
+            ],
+            'excluded': int(self.excluded.sum()),
+            'seed': self.seed,
+        }
+
+    def round_event(self, number):
+        """on_draw 事件：第 number 轮（从 1 开始）的范围和中签人员（含全部原始列）"""
+        provinces, positions = self.rounds[number - 1]
+        serial, _, _, rule = self.round_info[number - 1]
+        labels = self.labels
+        rows = self.winners(positions)
+        winners = [
+            {'Excel行号': int(idx) + 2, '省区': labels[position], **record}
+            for position, idx, record in zip(positions, rows.index, rows.to_dict('records'))
+        ]
+        return {
+            'file': self.file_path,
+            'round': number,
+            'serial': serial,
+            'rule': rule.describe() if rule is not None else None,
+            'provinces': [province for province, _ in provinces],
+            'winners': winners,
+            'total_drawn': self.drawn_total,
+        }
+
+    def end_event(self, export_path=None):
+        """on_end 事件：导出文件、抽签记录路径和完整抽签记录"""
+        return {
+            'file': self.file_path,
+            'export_path': export_path,
+            'journal_path': journal_path(export_path) if export_path else None,
+            'journal': self.journal(),
+            'rounds': self.draw_count,
+            'total_drawn': self.drawn_total,
+        }
+
+    @property
+    def export_suffix(self):
+        """默认导出格式：名单超过 Excel 行数上限时用 csv"""
+        return '.csv' if len(self.df) > EXCEL_MAX_ROWS else '.xlsx'
+
+    def export_frame(self):
+        """带“是否被抽中”标记的完整名单（直接按已抽中行掩码标记）"""
+        export_df = self.df.copy()
+        export_df['是否被抽中'] = np.where(self.drawn_mask, '是', '')
+        return export_df
+
+    def export(self, file_path, keep_format=True):
+        """导出带“是否被抽中”标记的完整名单，返回导出的记录数
+
+        按导出文件扩展名写出 xlsx、csv 或 arrow；导出 xlsx 且源文件为 xlsx 时流式复制源表
+        （保留原有格式，中签行高亮），其他格式或源表与名单对不上时用 pandas 写出。
+        keep_format=False 时跳过流式复制直接用 pandas 写出，供每次抽取后的自动更新使用。
+        名单超过 Excel 行数上限时只能导出为 csv / arrow。
+        同时在旁边保存抽签记录（见 journal_path），用于日后重放核验。
+        """
+        if os.path.splitext(file_path)[1].lower() in ('.csv', '.arrow', '.feather'):
+            write_frame(file_path, self.export_frame())
+            self.save_journal(journal_path(file_path))
+            return len(self.df)
+        if len(self.df) > EXCEL_MAX_ROWS:
+            raise DrawError(f'名单共 {len(self.df)} 人，超过 Excel 单表行数上限，请导出为 .csv 或 .arrow 文件')
+
+        source = self.file_path
+        records = None
+        if keep_format and source and source.lower().endswith(('.xlsx', '.xlsm')) and os.path.exists(source):
+            try:
+                records = stream_export(source, file_path, self.drawn_mask)
+            except ValueError:
+                records = None
+        if records is None:
+            self.export_frame().to_excel(file_path, index=False, engine='openpyxl')
+            records = len(self.df)
+        self.save_journal(journal_path(file_path))
+        return records
+
+    def export_by_province(self, directory, workers=None, progress=None):
+        """按省区拆分标记结果，每个省区一个工作簿，多进程并行写出，最后生成汇总清单
+
+        每行归入其所属省区（与 labels 一致，优先四级部门），无法识别的行归入“未知”。
+        人数多的省区先提交，总耗时接近最大省区的写出时间。
+        progress(已完成数, 总数, 省区名称) 在每个工作簿写完后调用。
+        返回汇总清单 DataFrame。
+        """
+        os.makedirs(directory, exist_ok=True)
+        export_df = self.export_frame()
+        groups = pd.Series(self.labels).groupby(self.labels).indices
+        tasks = sorted(groups.items(), key=lambda item: len(item[1]), reverse=True)
+
+        manifest = []
+        workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))  # 空名单时仍写出汇总清单
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for province, positions in tasks:
+                file_path = os.path.join(directory, f'抽签结果_{safe_filename(province)}.xlsx')
+                future = executor.submit(write_workbook, file_path, export_df.iloc[positions])
+                futures[future] = province
+                manifest.append({
+                    '省区': province,
+                    '人数': len(positions),
+                    '中签人数': int(self.drawn_mask[positions].sum()),
+                    '文件': os.path.basename(file_path),
+                })
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if progress is not None:
+                    progress(done, len(futures), futures[future])
+
+        manifest = pd.DataFrame(manifest, columns=['省区', '人数', '中签人数', '文件']).sort_values('省区', ignore_index=True)
+        manifest.to_excel(os.path.join(directory, '汇总清单.xlsx'), index=False, engine='openpyxl')
+        return manifest
+
+
+def _set_bits(bits, positions, value):
+    """把压缩位图中 positions 各行的位置为 value（O(k)）"""
+    masks = (np.uint8(0x80) >> (positions & 7).astype(np.uint8))
+    if value:
+        np.bitwise_or.at(bits, positions >> 3, masks)
+    else:
+        np.bitwise_and.at(bits, positions >> 3, ~masks)
+
+
+def journal_path(export_path):
+    """导出文件对应的抽签记录路径"""
+    return os.path.splitext(export_path)[0] + '_抽签记录.json'
+
+
+def replay_session(df, journal):
+    """按抽签记录重新执行整场抽签
+
+    返回 [(轮次, 记录的中签 ID, 重放得到的中签 ID), ...]；名单指纹不符时抛出 DrawError。
+    """
+    fingerprint = roster_fingerprint(df)
+    if fingerprint != journal['fingerprint']:
+        raise DrawError('名单与抽签记录不一致（名单指纹不同），无法重放')
+
+    session = DrawSession(df, seed=journal['seed'])
+    session._fingerprint = fingerprint
+    results = []
+    for number, entry in enumerate(journal['rounds'], 1):
+        if 'excluded' in entry:
+            session.excluded = np.isin(session.keys, employee_keys(entry['excluded']))
+        if 'levels' in entry:
+            selected = list(zip(entry['provinces'], entry['levels']))
+        else:
+            selected = session.resolve(entry['provinces'])
+        constraints = DrawConstraints.from_dict(entry.get('constraints'))
+        rule = EligibilityRule.from_dict(entry.get('rule'))
+        positions = session.draw(selected, entry['count'], entry['serial'], constraints, rule)
+        results.append((number, list(entry['winners']), session.ids[positions].tolist()))
+    return results
+
+
+def reservoir_draw(file_path, k, provinces=None, excluded_ids=(), seed=None, progress=None):
+    """直读抽签：顺序读取一遍名单文件，不把名单整体载入内存
+
+    逐块按省区和往期排除名单筛选，每行分配一个随机键，每个省区只保留随机键最小的 k 人
+    （蓄水池抽样），内存占用只与 k 和省区数有关。
+    provinces 为省区名称（可用 * 通配），None 表示全部省区；excluded_ids 为要排除的员工 ID。
+    随机键按行序依次生成，同一文件、同一种子的结果相同。progress(已读行数) 在每块读完后调用。
+    返回 (中签人员 DataFrame（含“Excel行号”“省区”列）, {省区: 可抽人数}, 读取行数, 种子)。
+    """
+    if k < 1:
+        raise DrawError('抽取人数必须大于 0')
+    seed = seed if seed is not None else np.random.SeedSequence().entropy
+    rng = np.random.default_rng(seed)
+    excluded = np.unique(employee_keys(list(excluded_ids)))
+    patterns = list(provinces or [])
+    wanted = {}  # 省区名称 → 是否在所选范围（每个名称只匹配一次通配符）
+    pools = {}
+    reservoir = None
+    rows = 0
+
+    for chunk, _ in iter_roster_chunks(file_path):
+        keys = rng.random(len(chunk))
+        labels = province_labels(chunk)
+        names, inverse = np.unique(labels, return_inverse=True)
+        for name in names:
+            if name not in wanted:
+                wanted[name] = name != '未知' and (
+                    not patterns or any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)
+                )
+        selected = np.array([wanted[name] for name in names], dtype=bool)[inverse.ravel()]
+        selected &= ~np.isin(employee_keys(chunk['员工 ID']), excluded)
+
+        positions = np.flatnonzero(selected)
+        part = chunk.iloc[positions].copy()
+        part.insert(0, '省区', labels[positions])
+        part.insert(0, 'Excel行号', rows + positions + 2)
+        part['_key'] = keys[positions]
+        for name, count in part['省区'].value_counts().items():
+            pools[name] = pools.get(name, 0) + int(count)
+        reservoir = (
+            pd.concat([reservoir, part], ignore_index=True)
+            .sort_values('_key', kind='stable')
+            .groupby('省区', sort=False)
+            .head(k)
+        )
+        rows += len(chunk)
+        if progress is not None:
+            progress(rows)
+
+    if reservoir is None or reservoir.empty:
+        if patterns and not any(wanted.values()):
+            raise DrawError(f'没有匹配的省区：{", ".join(patterns)}')
+        raise DrawError('所选省区中没有可抽取的人员')
+    winners = (
+        reservoir.sort_values(['省区', '_key'], kind='stable')
+        .drop(columns='_key')
+        .reset_index(drop=True)
+    )
+    return winners, dict(sorted(pools.items())), rows, seed
+
+
+def read_winner_ids(file_path):
+    """从往期结果文件中读取中签人员 ID
+
+    有“是否被抽中”列时只取标记为“是”的行，否则视整个文件为中签名单。
+    """
+    df, _, _ = read_roster(file_path)
+
+    if '员工 ID' not in df.columns:
+        raise ValueError(f'文件中缺少“员工 ID”列：{file_path}')
+
+    if '是否被抽中' in df.columns:
+        df = df[df['是否被抽中'].astype(str).str.strip() == '是']
+
+    ids = normalize_ids(df['员工 ID'])
+    return ids[ids != '']
+
+
+def session_nbytes(session):
+    """估算会话占用的内存：名单表格（含字符串）加各按行数组"""
+    arrays = (session.keys, session.drawn_mask, session.drawn_round, session.excluded, session.tree.codes)
+    return int(session.df.memory_usage(deep=True).sum()) + sum(array.nbytes for array in arrays)
+
+
+class SessionCache:
+    """最近加载的名单及其抽签会话（LRU）
+
+    按文件路径缓存，文件修改时间或大小变化后视为失效；
+    总估算内存超过 max_bytes 或条数超过 max_entries 时淘汰最久未用的会话，
+    最近放入的会话总是保留。
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024, max_entries=4):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # 绝对路径 -> (文件签名, 会话, 估算字节数)
+
+    @staticmethod
+    def _signature(path):
+        stat = os.stat(path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self):
+        return sum(size for _, _, size in self._entries.values())
+
+    def get(self, file_path):
+        """取出缓存的会话（并标记为最近使用）；未缓存或文件已变化时返回 None"""
+        path = os.path.abspath(file_path)
+        entry = self._entries.get(path)
+        if entry is None:
+            return None
+        if entry[0] != self._signature(path):
+            del self._entries[path]
+            return None
+        self._entries.move_to_end(path)
+        return entry[1]
+
+    def put(self, session):
+        path = os.path.abspath(session.file_path)
+        self._entries[path] = (self._signature(path), session, session_nbytes(session))
+        self._entries.move_to_end(path)
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.nbytes > self.max_bytes
+        ):
+            self._entries.popitem(last=False)
+
+    def discard(self, file_path):
+        self._entries.pop(os.path.abspath(file_path), None)
+
+    def load(self, file_path, exclusion_index=None):
+        """加载名单：命中缓存时直接返回原会话（保留已抽轮次），否则读取文件建立新会话
+
+        返回 (会话, 是否命中缓存)。已结束的会话不再复用。
+        """
+        session = self.get(file_path)
+        if session is not None and not session.is_ended:
+            return session, True
+        session = DrawSession.from_file(file_path, exclusion_index)
+        self.put(session)
+        return session, False
+
+
+class HookRunner:
+    """插件钩子执行器：on_load / on_draw / on_end 事件的处理函数在后台线程中执行
+
+    emit 只把事件放入各处理函数的有界队列就返回，插件再慢也不会拖慢加载和抽签；队列已满时丢弃事件并计数。
+    同一处理函数按事件顺序逐个执行，不会同时占用多个工作线程；超过超时时间仍未结束时记为超时，
+    且在它结束前丢弃发给它的新事件（线程无法强行终止，卡住的插件最多占用一个工作线程）。
+    每个处理函数分别统计调用次数、失败、超时、丢弃次数和耗时。
+
+    插件为插件目录（默认“插件”）下的 .py 文件，定义同名函数即可，参数为事件内容 dict：
+        def on_draw(event):
+            for person in event['winners']:
+                ...
+    模块可定义 TIMEOUT（秒）覆盖默认超时。
+    """
+
+    EVENTS = ('on_load', 'on_draw', 'on_end')
+
+    def __init__(self, workers=2, timeout=30.0, queue_size=256):
+        self.workers = workers
+        self.timeout = timeout
+        self.errors = []  # 加载插件时的错误
+        self._handlers = {event: [] for event in self.EVENTS}
+        self.queue_size = queue_size
+        self._stats = {}  # 名称 → 统计
+        self._pending = {}  # 名称 → 待处理的事件内容
+        self._scheduled = set()  # 已排队或正在执行的处理函数
+        self._running = {}  # 名称 → (开始时间, 是否已计入超时)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()  # 待执行的处理函数（每个最多一项）
+        self._threads = []
+
+    def register(self, event, handler, name=None, timeout=None):
+        if event not in self._handlers:
+            raise ValueError(f'未知事件：{event}')
+        name = name or f'{getattr(handler, "__module__", "")}.{event}'
+        self._handlers[event].append((name, handler, timeout or self.timeout))
+        self._pending[name] = deque()
+        self._stats[name] = {
+            'name': name, 'event': event, 'calls': 0, 'ok': 0, 'failures': 0, 'timeouts': 0,
+            'dropped': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'last_error': None,
+        }
+
+    def load_plugins(self, directory='插件'):
+        """加载插件目录下的全部插件，返回注册的处理函数数；单个插件出错不影响其他插件"""
+        if not os.path.isdir(directory):
+            return 0
+        count = 0
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.py') or filename.startswith('_'):
+                continue
+            plugin = os.path.splitext(filename)[0]
+            try:
+                spec = importlib.util.spec_from_file_location(f'抽签插件_{plugin}', os.path.join(directory, filename))
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+            except Exception as e:
+                self.errors.append(f'{filename}：{e}')
+                continue
+            for event in self.EVENTS:
+                handler = getattr(module, event, None)
+                if callable(handler):
+                    self.register(event, handler, f'{plugin}.{event}', getattr(module, 'TIMEOUT', None))
+                    count += 1
+        return count
+
+    def __bool__(self):
+        return any(self._handlers.values())
+
+    def emit(self, event, payload):
+        """提交事件（不等待执行），返回实际排队的处理函数数"""
+        queued = 0
+        for name, handler, timeout in self._handlers[event]:
+            with self._lock:
+                pending = self._pending[name]
+                if self._overdue(name, timeout) or len(pending) >= self.queue_size:
+                    self._stats[name]['dropped'] += 1
+                    continue
+                pending.append(payload)
+                if name not in self._scheduled:
+                    self._scheduled.add(name)
+                    self._queue.put((name, handler, timeout))
+            queued += 1
+        if queued:
+            self._start_workers()
+        return queued
+
+    def _overdue(self, name, timeout):
+        """处理函数是否正在执行且已超时（调用方持有锁）；首次发现时计入超时"""
+        started = self._running.get(name)
+        if started is None or time.perf_counter() - started[0] <= timeout:
+            return False
+        if not started[1]:
+            self._stats[name]['timeouts'] += 1
+            self._stats[name]['last_error'] = f'超过 {timeout:g} 秒未结束'
+            self._running[name] = (started[0], True)
+        return True
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f'抽签插件-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            name, handler, timeout = self._queue.get()
+            start = time.perf_counter()
+            with self._lock:
+                payload = self._pending[name].popleft()
+                self._running[name] = (start, False)
+            error = None
+            try:
+                handler(payload)
+            except Exception as e:
+                error = f'{type(e).__name__}: {e}'
+            seconds = time.perf_counter() - start
+            with self._lock:
+                stats = self._stats[name]
+                counted = self._running.pop(name)[1]  # 已在 emit 时计入超时
+                stats['calls'] += 1
+                stats['total_seconds'] += seconds
+                stats['max_seconds'] = max(stats['max_seconds'], seconds)
+                if error:
+                    stats['failures'] += 1
+                    stats['last_error'] = error
+                elif seconds > timeout:
+                    if not counted:
+                        stats['timeouts'] += 1
+                    stats['last_error'] = f'耗时 {seconds:.1f} 秒，超过 {timeout:g} 秒'
+                else:
+                    stats['ok'] += 1
+                if self._pending[name]:
+                    self._queue.put((name, handler, timeout))
+                else:
+                    self._scheduled.discard(name)
+            self._queue.task_done()
+
+    def join(self):
+        """等待已排队的事件全部处理完（用于命令行工具退出前和测试）"""
+        if self._threads:
+            self._queue.join()
+
+    def stats(self):
+        """各处理函数的统计（含平均耗时），正在执行且已超时的会即时计入"""
+        with self._lock:
+            for entries in self._handlers.values():
+                for name, _, timeout in entries:
+                    self._overdue(name, timeout)
+            result = []
+            for stats in self._stats.values():
+                stats = dict(stats)
+                stats['pending'] = stats['name'] in self._running
+                stats['avg_seconds'] = stats['total_seconds'] / stats['calls'] if stats['calls'] else 0.0
+                result.append(stats)
+        return result
+
+    def summary(self):
+        """各处理函数统计的文字说明，每个一行"""
+        lines = []
+        for stats in self.stats():
+            line = (
+                f"{stats['name']}：{stats['calls']} 次，平均 {stats['avg_seconds'] * 1000:.0f} ms，"
+                f"最长 {stats['max_seconds'] * 1000:.0f} ms"
+            )
+            problems = [
+                f'{label} {stats[key]} 次'
+                for key, label in (('failures', '失败'), ('timeouts', '超时'), ('dropped', '丢弃'))
+                if stats[key]
+            ]
+            if problems:
+                line += f"（{'，'.join(problems)}；{stats['last_error'] or ''}）"
+            lines.append(line)
+        return '\n'.join(lines + [f'加载失败：{error}' for error in self.errors])
+
+
+class ChunkedRosterLoader:
+    """分块加载名单：每次 step() 读取一块并累计各省区人数，读完后建立抽签会话
+
+    界面可在两块之间刷新省区列表，让用户在加载过程中先勾选省区。
+    """
+
+    def __init__(self, file_path, chunk_rows=CHUNK_ROWS):
+        self.file_path = file_path
+        self.backend = None
+        self.rows = 0
+        self.done = False
+        self.counts = None  # 部门人数统计，见 department_counts
+        self._chunks = []
+        self._reader = iter_roster_chunks(file_path, chunk_rows)
+        self._start = time.perf_counter()
+
+    def step(self):
+        """读取下一块，返回本块行数；全部读完时返回 0 并置 done"""
+        chunk, self.backend = next(self._reader, (None, self.backend))
+        if chunk is None:
+            self.done = True
+            return 0
+        self._chunks.append(chunk)
+        self.counts = merge_department_counts(self.counts, department_counts(chunk))
+        self.rows += len(chunk)
+        return len(chunk)
+
+    @property
+    def provinces(self):
+        """已读部分的省区列表，格式同 detect_provinces"""
+        return provinces_from_counts(self.counts) if self.counts is not None else []
+
+    def close(self):
+        self._reader.close()
+
+    def session(self, exclusion_index=None):
+        """读完后合并各块，建立抽签会话（同 DrawSession.from_file）"""
+        while not self.done:
+            self.step()
+        if not self._chunks:
+            raise ValueError('名单文件为空')
+        df = pd.concat(self._chunks, ignore_index=True).infer_objects()
+        self._chunks = []
+        session = DrawSession(df, None, self.file_path, self.backend, time.perf_counter() - self._start)
+        if exclusion_index is not None:
+            session.excluded = exclusion_index.mask_for(session.keys)
+        return session
+
+
+class ExclusionIndex:
+    """往期中签人员排除索引
+
+    以 SQLite 文件持久保存被排除的员工 ID 及其到期日（员工 ID 为主键），
+    加载名单时一次性生成排除掩码，每次抽签只需做一次按位与。
+    可在多个线程中使用（如抽签服务的后台线程），同一时刻只有一个线程访问连接。
+    """
+
+    def __init__(self, path='抽签历史.db'):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self, create=False):
+        """返回共用的连接（调用方需持有 self._lock）"""
+        if self._conn is None:
+            if not create and not os.path.exists(self.path):
+                return None
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS exclusions (
+                    employee_id TEXT PRIMARY KEY,
+                    won_on TEXT NOT NULL,
+                    expires_on TEXT NOT NULL,
+                    source TEXT
+                )
+            """)
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_exclusions_expires ON exclusions (expires_on)'
+            )
+        return self._conn
+
+    def add(self, ids, won_on, months, source=''):
+        """记录一批中签人员，排除期为 won_on 起 months 个月
+
+        同一人多次记录时保留较晚的到期日。返回写入的人数。
+        """
+        won_on = pd.Timestamp(won_on).date()
+        expires_on = (pd.Timestamp(won_on) + pd.DateOffset(months=months)).date()
+        rows = [
+            (employee_id, won_on.isoformat(), expires_on.isoformat(), source)
+            for employee_id in dict.fromkeys(ids) if employee_id
+        ]
+
+        with self._lock:
+            conn = self._connect(create=True)
+            with conn:
+                conn.executemany("""
+                    INSERT INTO exclusions (employee_id, won_on, expires_on, source)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (employee_id) DO UPDATE SET
+                        won_on = excluded.won_on,
+                        expires_on = excluded.expires_on,
+                        source = excluded.source
+                    WHERE excluded.expires_on > exclusions.expires_on
+                """, rows)
+        return len(rows)
+
+    def import_result_file(self, file_path, months, won_on=None):
+        """导入往期结果文件，默认以文件修改日期作为中签日期"""
+        if won_on is None:
+            won_on = datetime.fromtimestamp(os.path.getmtime(file_path)).date()
+        ids = read_winner_ids(file_path)
+        return self.add(ids, won_on, months, source=os.path.basename(file_path))
+
+    def active_ids(self, today=None):
+        """返回仍在排除期内的员工 ID 数组"""
+        today = (today or date.today()).isoformat()
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return np.array([], dtype=object)
+            rows = conn.execute(
+                'SELECT employee_id FROM exclusions WHERE expires_on >= ?', (today,)
+            ).fetchall()
+        return np.array([row[0] for row in rows], dtype=object)
+
+    def purge_expired(self, today=None):
+        """删除已过排除期的记录，返回删除条数"""
+        today = (today or date.today()).isoformat()
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            with conn:
+                cursor = conn.execute('DELETE FROM exclusions WHERE expires_on < ?', (today,))
+        return cursor.rowcount
+
+    def mask_for(self, roster_keys, today=None):
+        """为名单生成排除掩码：True 表示该行人员处于排除期内
+
+        roster_keys 为名单的员工 ID 整数键（见 employee_keys），按 int64 数组比较。
+        """
+        return np.isin(roster_keys, employee_keys(self.active_ids(today)))
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,73 @@
+"""
+抽签重放核验工具
+按导出结果旁保存的抽签记录（*_抽签记录.json），用名单指纹、会话种子和各轮参数重新执行整场抽签，
+逐轮核对中签人员是否与记录一致，用于解答对抽签结果的质疑
+
+用法示例：
+    python 抽签重放.py 工作簿1.xlsx 抽签结果_20250101_120000_抽签记录.json
+
+说明：
+- 名单文件须与抽签时使用的名单内容一致（员工 ID、姓名、部门及行序相同），否则名单指纹不符
+- 全部一致时退出码为 0，存在不一致的轮次时为 2
+"""
+
+import sys
+import json
+import time
+import argparse
+
+from 抽签核心 import DrawError, read_roster, replay_session
+
+
+def main():
+    parser = argparse.ArgumentParser(description='抽签重放核验（按种子和各轮参数重新执行抽签）')
+    parser.add_argument('roster', help='抽签时使用的名单文件（Excel 或 CSV）')
+    parser.add_argument('journal', help='抽签记录文件（*_抽签记录.json）')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("   抽签重放核验")
+    print("=" * 60)
+
+    try:
+        df, _, _ = read_roster(args.roster)
+        with open(args.journal, encoding='utf-8') as f:
+            journal = json.load(f)
+    except Exception as e:
+        print(f"❌ 读取失败: {e}")
+        return 1
+
+    print(f"📄 名单：{args.roster}（{len(df)} 人）")
+    print(f"🔑 种子：{journal['seed']}")
+    print(f"🧾 名单指纹：{journal['fingerprint']}")
+
+    start = time.perf_counter()
+    try:
+        results = replay_session(df, journal)
+    except DrawError as e:
+        print(f"❌ 重放失败: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    mismatched = 0
+    for number, recorded, replayed in results:
+        entry = journal['rounds'][number - 1]
+        provinces = ', '.join(entry['provinces'])
+        if recorded == replayed:
+            print(f"✅ 第 {number} 轮：从 {provinces} 中抽取 {entry['count']} 人，结果一致")
+        else:
+            mismatched += 1
+            print(f"❌ 第 {number} 轮：从 {provinces} 中抽取 {entry['count']} 人，结果不一致")
+            print(f"   记录：{', '.join(recorded)}")
+            print(f"   重放：{', '.join(replayed)}")
+
+    print(f"\n⏱ 重放用时 {elapsed:.3f} 秒，共 {len(results)} 轮")
+    if mismatched:
+        print(f"⚠️  {mismatched} 轮结果与记录不一致")
+        return 2
+    print("✅ 全部轮次与记录一致")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
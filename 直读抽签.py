@@ -0,0 +1,82 @@
+"""
+直读抽签工具
+不加载整份名单，顺序读取一遍名单文件，按省区和往期排除名单逐行筛选，
+每个省区抽取 k 人（蓄水池抽样），适合对数百万行的大名单做一次性抽签
+
+用法示例：
+    python 直读抽签.py 集团名单.xlsx -k 5
+    python 直读抽签.py 集团名单.csv -k 3 -p "江苏省区" "浙江*" -o 直读结果.xlsx
+    python 直读抽签.py 集团名单.arrow -k 10 --seed 12345
+
+说明：
+- 每个省区各抽取 k 人，可抽人数不足 k 人的省区全部入选
+- 默认排除往期中签库（抽签历史.db）中仍在排除期内的人员，--no-history 不排除
+- 同一文件使用相同种子（--seed）时结果相同，便于复核
+"""
+
+import os
+import sys
+import time
+import argparse
+from datetime import datetime
+
+from 抽签核心 import DrawError, ExclusionIndex, reservoir_draw, write_frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description='直读抽签（顺序读取名单文件，每个省区抽取 k 人）')
+    parser.add_argument('roster', help='名单文件（Excel、CSV 或 Arrow）')
+    parser.add_argument('-k', '--count', type=int, required=True, help='每个省区抽取人数')
+    parser.add_argument('-p', '--provinces', nargs='*', default=None, help='省区名称，可用 * 通配（默认全部省区）')
+    parser.add_argument('-o', '--output', default=None, help='中签结果文件（xlsx / csv / arrow）')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子（默认随机生成）')
+    parser.add_argument('--history', default=None, help='往期中签排除库（默认 抽签历史.db）')
+    parser.add_argument('--no-history', action='store_true', help='不排除往期中签人员')
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("   直读抽签")
+    print("=" * 60)
+
+    excluded_ids = ()
+    if not args.no_history:
+        index = ExclusionIndex(args.history) if args.history else ExclusionIndex()
+        excluded_ids = index.active_ids()
+        index.close()
+        print(f"🚫 往期排除：{len(excluded_ids)} 人")
+
+    def on_progress(rows):
+        print(f"\r📖 已读取 {rows} 行", end='', flush=True)
+
+    start = time.perf_counter()
+    try:
+        winners, pools, rows, seed = reservoir_draw(
+            args.roster, args.count, args.provinces, excluded_ids, args.seed, on_progress
+        )
+    except DrawError as e:
+        print(f"\n❌ {e}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ 读取失败: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+    print()
+
+    for province, pool in pools.items():
+        drawn = winners[winners['省区'] == province]
+        note = '' if len(drawn) == args.count else f'（可抽人数不足 {args.count} 人，全部入选）'
+        print(f"🎯 {province}：从 {pool} 人中抽取 {len(drawn)} 人{note}")
+        for _, row in drawn.iterrows():
+            print(f"     第 {row['Excel行号']} 行  {row['员工 ID']}  {row['姓名']}")
+
+    output = args.output or f"抽签结果_直读_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    write_frame(output, winners)
+
+    print(f"\n⏱ 读取 {rows} 行，用时 {elapsed:.2f} 秒")
+    print(f"🔑 种子：{seed}（同一文件使用 --seed {seed} 可复现本次结果）")
+    print(f"📁 结果已保存：{os.path.abspath(output)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())